@@ -0,0 +1,171 @@
+"""Reproducible scan benchmarks on a synthetic tree with a stub ffprobe.
+
+Usage: python benchmarks/bench.py [--depth 3] [--fanout 4] [--files 10]
+                                  [--latency-ms 20] [--jobs N] [--repeat 3]
+                                  [--output results.json]
+
+A tree of synthetic MP4/MKV/TS/WMV files is generated in a temporary folder
+and a stub ffprobe with the given latency is put first on PATH. Each phase
+(traversal, probe, scan, rename, revert) runs in a fresh child process so
+its peak RSS is measured in isolation. Results are printed and written as
+JSON so runs from different releases can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import synth  # noqa: E402
+
+PHASES = ('traversal', 'probe', 'scan', 'rename', 'revert')
+EXTENSIONS = list(synth.KINDS)
+
+
+def _peak_rss_kb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _null_logger(text, tag=None):
+    pass
+
+
+def run_phase(phase: str, root: str, jobs: int) -> dict:
+    """Run one phase in this process and return its measurements."""
+    from calculator import core, renamer, traversal
+
+    result = {}
+    start = time.perf_counter()
+
+    if phase == 'traversal':
+        matcher = traversal.ExtensionMatcher(EXTENSIONS)
+        files = sum(len(videos) for _, videos in traversal.iter_video_folders(root, matcher))
+
+    elif phase == 'probe':
+        files = 0
+        first = None
+        for event in core.iter_scan(root, EXTENSIONS, jobs=jobs):
+            if isinstance(event, core.FileProbed):
+                files += 1
+                if first is None:
+                    first = time.perf_counter() - start
+        result['first_result_s'] = first
+
+    elif phase == 'scan':
+        _, _, files = core.traverse_and_calculate(root, EXTENSIONS, logger=_null_logger, jobs=jobs)
+
+    else:
+        # Both phases rename and then revert so the tree is left unchanged;
+        # only the named step is timed.
+        summaries, _, _ = core.traverse_and_calculate(root, EXTENSIONS, logger=_null_logger, jobs=jobs)
+        files = len(summaries)
+        start = time.perf_counter()
+        history, summary = renamer.rename_folders_with_duration(summaries, logger=_null_logger)
+        rename_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        reverted = renamer.revert_renames(history, logger=_null_logger)
+        revert_seconds = time.perf_counter() - start
+        result.update({'renamed': summary['renamed'], 'rename_errors': summary['errors'],
+                       'reverted': reverted['reverted'], 'revert_errors': reverted['errors']})
+        seconds = rename_seconds if phase == 'rename' else revert_seconds
+
+    if phase not in ('rename', 'revert'):
+        seconds = time.perf_counter() - start
+    result.update({'seconds': seconds, 'items': files, 'peak_rss_kb': _peak_rss_kb()})
+    return result
+
+
+def _run_child(phase: str, root: str, jobs: int) -> dict:
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', phase, root, str(jobs)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--fanout', type=int, default=4)
+    parser.add_argument('--files', type=int, default=10, help='videos per folder')
+    parser.add_argument('--latency-ms', type=float, default=20, help='stub ffprobe latency')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--phases', default=','.join(PHASES))
+    parser.add_argument('--output', help='write the JSON results to this file')
+    parser.add_argument('--child', nargs=3, metavar=('PHASE', 'ROOT', 'JOBS'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        phase, root, jobs = args.child
+        print(json.dumps(run_phase(phase, root, int(jobs))))
+        return
+
+    phases = [phase.strip() for phase in args.phases.split(',') if phase.strip()]
+    unknown = set(phases) - set(PHASES)
+    if unknown:
+        parser.error(f"unknown phases: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix='vdc-bench-')
+    try:
+        synth.install_stub_ffprobe(os.path.join(workdir, 'bin'), args.latency_ms / 1000)
+        root = os.path.join(workdir, 'library')
+        tree = synth.make_tree(root, args.depth, args.fanout, args.files, seed=args.seed)
+
+        results = {
+            'meta': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'params': {k: getattr(args, k) for k in ('depth', 'fanout', 'files', 'latency_ms', 'jobs',
+                                                     'repeat', 'seed')},
+            'tree': tree,
+            'phases': {},
+        }
+
+        print(f"tree: {tree['folders']} folders, {tree['files']} files; "
+              f"stub latency {args.latency_ms:g} ms; jobs {args.jobs}")
+        print(f"{'phase':<12}{'median s':>10}{'min s':>10}{'items/s':>12}{'peak RSS MB':>13}")
+        for phase in phases:
+            runs = [_run_child(phase, root, args.jobs) for _ in range(args.repeat)]
+            seconds = [run['seconds'] for run in runs]
+            median = statistics.median(seconds)
+            items = runs[0]['items']
+            rss = max((run['peak_rss_kb'] or 0) for run in runs)
+            summary = {
+                'median_s': median,
+                'min_s': min(seconds),
+                'items': items,
+                'items_per_s': items / median if median else None,
+                'peak_rss_kb': rss or None,
+                'runs': runs,
+            }
+            results['phases'][phase] = summary
+            print(f"{phase:<12}{median:>10.3f}{min(seconds):>10.3f}{summary['items_per_s'] or 0:>12,.0f}"
+                  f"{rss / 1024:>13.1f}")
+
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"results written to {args.output}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
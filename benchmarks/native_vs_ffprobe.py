@@ -0,0 +1,72 @@
+"""Compare native container readers with ffprobe on real files.
+
+Usage: python benchmarks/native_vs_ffprobe.py FILE_OR_FOLDER [...] [--repeat N]
+
+For every file with a native reader, both paths are timed and their
+durations compared; files where the native reader falls back are counted.
+TS durations are estimates, so expect small differences there.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calculator import core  # noqa: E402
+
+
+def iter_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                for filename in sorted(filenames):
+                    yield os.path.join(dirpath, filename)
+        else:
+            yield path
+
+
+def time_call(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    by_ext = {}
+    for file_path in iter_files(args.paths):
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext not in core._NATIVE_READERS:
+            continue
+
+        native, native_time = time_call(lambda: core.read_native_duration(file_path), args.repeat)
+        probed, probe_time = time_call(
+            lambda: core.get_video_duration(file_path, logger=lambda *a: None, native=False), args.repeat)
+
+        stats = by_ext.setdefault(ext, {'files': 0, 'fallbacks': 0, 'native_s': 0.0,
+                                        'ffprobe_s': 0.0, 'max_diff_s': 0.0})
+        stats['files'] += 1
+        stats['native_s'] += native_time
+        stats['ffprobe_s'] += probe_time
+        if native is None:
+            stats['fallbacks'] += 1
+        else:
+            stats['max_diff_s'] = max(stats['max_diff_s'], abs(native[0] - probed))
+
+    print(f"{'ext':<8}{'files':>8}{'fallback':>10}{'native ms':>12}{'ffprobe ms':>12}{'speedup':>10}{'max diff s':>12}")
+    for ext, stats in sorted(by_ext.items()):
+        native_ms = stats['native_s'] / stats['files'] * 1000
+        probe_ms = stats['ffprobe_s'] / stats['files'] * 1000
+        speedup = probe_ms / native_ms if native_ms else float('inf')
+        print(f"{ext:<8}{stats['files']:>8}{stats['fallbacks']:>10}{native_ms:>12.3f}{probe_ms:>12.2f}"
+              f"{speedup:>9.0f}x{stats['max_diff_s']:>12.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Synthetic media trees and a stub ffprobe for reproducible benchmarks.
+
+The generated files carry minimal but valid container headers (MP4 moov/mvhd,
+Matroska Segment/Info, MPEG-TS packets with PCR), so the native readers parse
+them; '.wmv' files have no native reader and always go through ffprobe.
+"""
+import os
+import random
+import stat
+import struct
+import sys
+import textwrap
+
+KINDS = ('.mp4', '.mkv', '.ts', '.wmv')
+
+
+def mp4_bytes(seconds: float) -> bytes:
+    def box(box_type, payload):
+        return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+    timescale = 1000
+    mvhd = box(b'mvhd', bytes(4) + struct.pack('>IIII', 0, 0, timescale, int(seconds * timescale)) + bytes(80))
+    return box(b'ftyp', b'isom\0\0\2\0isomiso2mp41') + box(b'moov', mvhd) + box(b'mdat', bytes(64))
+
+
+def mkv_bytes(seconds: float) -> bytes:
+    def element(element_id, payload):
+        size = bytes([0x01]) + len(payload).to_bytes(7, 'big')
+        return element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big') + size + payload
+
+    ebml = element(0x1A45DFA3, element(0x4282, b'matroska'))
+    info = element(0x1549A966, element(0x2AD7B1, (1_000_000).to_bytes(3, 'big')) +
+                   element(0x4489, struct.pack('>d', seconds * 1000)))
+    cluster = element(0x1F43B675, bytes(64))
+    return ebml + element(0x18538067, info + cluster)
+
+
+def ts_bytes(seconds: float, packets: int = 64) -> bytes:
+    def packet(pcr):
+        b = bytes([(pcr >> 25) & 0xFF, (pcr >> 17) & 0xFF, (pcr >> 9) & 0xFF, (pcr >> 1) & 0xFF,
+                   ((pcr & 1) << 7) | 0x7E, 0])
+        data = bytes([0x47, 0x01, 0x00, 0x20, 183, 0x10]) + b
+        return data + b'\xff' * (188 - len(data))
+
+    step = int(seconds * 90_000) // (packets - 1)
+    return b''.join(packet(i * step) for i in range(packets))
+
+
+def media_bytes(ext: str, seconds: float) -> bytes:
+    if ext == '.mp4':
+        return mp4_bytes(seconds)
+    if ext == '.mkv':
+        return mkv_bytes(seconds)
+    if ext == '.ts':
+        return ts_bytes(seconds)
+    return bytes(256)
+
+
+def make_tree(root: str, depth: int, fanout: int, files_per_folder: int, seed: int = 0,
+              kinds=KINDS) -> dict:
+    """Create a tree `depth` levels deep with `fanout` subfolders per folder.
+
+    Every folder gets files_per_folder videos cycling through kinds, with
+    durations drawn from a seeded RNG. Returns counts of what was created.
+    """
+    rng = random.Random(seed)
+    folders = 0
+    files = 0
+    level = [root]
+    os.makedirs(root, exist_ok=True)
+    for current_depth in range(depth + 1):
+        next_level = []
+        for folder in level:
+            folders += 1
+            for i in range(files_per_folder):
+                ext = kinds[(files + i) % len(kinds)]
+                with open(os.path.join(folder, f"{i + 1:03d} lesson{ext}"), 'wb') as f:
+                    f.write(media_bytes(ext, rng.uniform(60, 3600)))
+            files += files_per_folder
+            if current_depth < depth:
+                for j in range(fanout):
+                    child = os.path.join(folder, f"{j + 1:02d} Section")
+                    os.mkdir(child)
+                    next_level.append(child)
+        level = next_level
+    return {'folders': folders, 'files': files}
+
+
+STUB_SOURCE = '''\
+import os, sys, time
+time.sleep({latency!r})
+path = sys.argv[-1]
+entries = sys.argv[sys.argv.index('-show_entries') + 1]
+duration = 60.0 + (sum(path.encode()) % 3540)
+if entries.startswith('packet='):
+    print('0.000000,0.040000')
+    print(f'{{duration - 0.04:.6f}},0.040000')
+else:
+    print(duration)
+'''
+
+
+def install_stub_ffprobe(directory: str, latency: float) -> str:
+    """Write a stub ffprobe into directory, prepend it to PATH and return its path.
+
+    The stub sleeps for `latency` seconds and prints a deterministic duration
+    derived from the file path, in the CSV shape the real ffprobe prints for
+    each probing tier.
+    """
+    os.makedirs(directory, exist_ok=True)
+    script = os.path.join(directory, 'ffprobe_stub.py')
+    with open(script, 'w') as f:
+        f.write(STUB_SOURCE.format(latency=latency))
+
+    if os.name == 'nt':
+        launcher = os.path.join(directory, 'ffprobe.bat')
+        with open(launcher, 'w') as f:
+            f.write(f'@"{sys.executable}" "{script}" %*\n')
+    else:
+        launcher = os.path.join(directory, 'ffprobe')
+        with open(launcher, 'w') as f:
+            f.write(textwrap.dedent(f'''\
+                #!/bin/sh
+                exec "{sys.executable}" "{script}" "$@"
+            '''))
+        os.chmod(launcher, os.stat(launcher).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+    os.environ['PATH'] = directory + os.pathsep + os.environ.get('PATH', '')
+    return launcher
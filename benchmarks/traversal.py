@@ -0,0 +1,82 @@
+"""Measure directory traversal throughput (files/sec) without probing.
+
+Usage: python benchmarks/traversal.py [ROOT] [--dirs N] [--files N] [--repeat N]
+
+Without ROOT a temporary tree of --dirs folders with --files entries each
+(two thirds videos) is generated. The os.walk + os.listdir baseline that
+traverse_and_calculate used before is timed against calculator.traversal.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calculator import traversal  # noqa: E402
+
+EXTENSIONS = ['.mp4', '.m4v', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.webm', '.ts']
+
+
+def make_tree(root, dirs, files):
+    for d in range(dirs):
+        folder = os.path.join(root, f"course {d // 50:03d}", f"chapter {d:05d}")
+        os.makedirs(folder, exist_ok=True)
+        for i in range(files):
+            ext = '.srt' if i % 3 == 2 else EXTENSIONS[i % len(EXTENSIONS)]
+            open(os.path.join(folder, f"lesson {i:04d}{ext}"), 'wb').close()
+
+
+def walk_baseline(root):
+    count = 0
+    for dirpath, _, filenames in os.walk(root):
+        if not any(f.lower().endswith(tuple(EXTENSIONS)) for f in filenames):
+            continue
+        for filename in os.listdir(dirpath):
+            file_path = os.path.join(dirpath, filename)
+            if os.path.isfile(file_path) and any(filename.lower().endswith(ext) for ext in EXTENSIONS):
+                count += 1
+    return count
+
+
+def scandir_engine(root):
+    matcher = traversal.ExtensionMatcher(EXTENSIONS)
+    return sum(len(videos) for _, videos in traversal.iter_video_folders(root, matcher))
+
+
+def best_of(func, root, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = func(root)
+        best = min(best, time.perf_counter() - start)
+    return count, best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('root', nargs='?')
+    parser.add_argument('--dirs', type=int, default=2000)
+    parser.add_argument('--files', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    root = args.root
+    tmp = None
+    if root is None:
+        tmp = root = tempfile.mkdtemp(prefix='vdc-traversal-')
+        make_tree(root, args.dirs, args.files)
+
+    try:
+        for label, func in (('os.walk + listdir', walk_baseline), ('scandir engine', scandir_engine)):
+            count, seconds = best_of(func, root, args.repeat)
+            print(f"{label:<20}{count:>10} videos {seconds:>9.3f} s {count / seconds:>12,.0f} files/sec")
+    finally:
+        if tmp:
+            shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from calculator import core
+from calculator import scheduler
+from calculator import timeouts
+from calculator import traversal
+
+
+async def _run_ffprobe(file_path: str, timeout: float, stats=None, adaptive=None,
+                       size: Optional[int] = None) -> Tuple[float, str, Optional[str]]:
+    """Run the ffprobe tiers (see core.FFPROBE_SOURCES) as asyncio child processes.
+
+    Each one is killed on timeout ('timeout' is returned as the source) or
+    cancellation. With adaptive, deadlines come from there as in core._probe.
+    """
+    for tier, source in enumerate(core.FFPROBE_SOURCES):
+        if adaptive is not None:
+            timeout = adaptive.deadline(size, tier)
+            run_start = time.monotonic()
+        try:
+            returncode, stdout = await _run_ffprobe_tier(file_path, tier, timeout, stats)
+        except asyncio.TimeoutError:
+            if stats is not None:
+                stats.count('timeouts')
+            return 0.0, 'timeout', f"Timeout processing {os.path.basename(file_path)}"
+        if adaptive is not None:
+            adaptive.observe(size, time.monotonic() - run_start, tier)
+
+        if returncode != 0:
+            return 0.0, 'error', f"Error processing {os.path.basename(file_path)}"
+        try:
+            start = time.perf_counter() if stats is not None else 0.0
+            duration = core._parse_ffprobe_output(stdout.decode(), tier)
+            if stats is not None:
+                stats.add('parse', start, file_path)
+        except Exception as e:
+            return 0.0, 'error', f"Error processing {os.path.basename(file_path)}: {e}"
+        if duration is not None:
+            if stats is not None:
+                stats.count(source)
+            return duration, source, None
+    return 0.0, 'error', f"Error processing {os.path.basename(file_path)}: no duration found"
+
+
+async def _run_ffprobe_tier(file_path: str, tier: int, timeout: float, stats=None) -> Tuple[int, bytes]:
+    """Run one ffprobe tier and return (returncode, stdout); raises asyncio.TimeoutError."""
+    creationflags, startupinfo = core._is_windows_no_window()
+    platform_args = {'startupinfo': startupinfo} if startupinfo else {'creationflags': creationflags}
+
+    start = time.perf_counter() if stats is not None else 0.0
+    try:
+        proc = await asyncio.create_subprocess_exec(*core._ffprobe_command(file_path, tier),
+                                                    stdout=asyncio.subprocess.PIPE,
+                                                    stderr=asyncio.subprocess.PIPE,
+                                                    **platform_args)
+    except FileNotFoundError as e:
+        raise core.FFprobeNotFoundError(*e.args) from e
+    if stats is not None:
+        start = stats.add('spawn', start, file_path)
+        stats.count('ffprobe_runs')
+
+    try:
+        stdout, _ = await asyncio.wait_for(proc.communicate(), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        await _kill(proc)
+        raise
+    finally:
+        if stats is not None:
+            stats.add('ffprobe', start, file_path)
+    return proc.returncode, stdout
+
+
+async def _kill(proc: asyncio.subprocess.Process):
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+    await proc.wait()
+
+
+async def probe_video_async(file_path: str, timeout: float = 10, cache=None, native: bool = True,
+                            st: os.stat_result = None, stats=None) -> Tuple[float, str, Optional[str]]:
+    """Return (duration_seconds, source, error_message) for a single video.
+
+    Same lookup order as core.probe_video. Cache and native reads run in the
+    default executor; ffprobe runs as an asyncio subprocess that is killed as
+    soon as the awaiting task is cancelled or its deadline passes.
+    """
+    duration, source, error = await _probe_async(file_path, timeout, cache, native, st, stats)
+    return duration, 'error' if source == 'timeout' else source, error
+
+
+async def _probe_async(file_path: str, timeout: float, cache=None, native: bool = True,
+                       st: os.stat_result = None, stats=None, adaptive=None) -> Tuple[float, str, Optional[str]]:
+    """probe_video_async, but source is 'timeout' if an ffprobe run timed out (see core._probe)."""
+    loop = asyncio.get_running_loop()
+    in_process = await loop.run_in_executor(None, lambda: core._probe_in_process(
+        file_path, cache=cache, native=native, st=st, stats=stats))
+    if in_process is not None:
+        return in_process + (None,)
+
+    duration, source, error = await _run_ffprobe(file_path, timeout, stats, adaptive,
+                                                 st.st_size if st is not None else None)
+    if error is None and cache is not None:
+        await loop.run_in_executor(None, cache.put, file_path, duration, st)
+    return duration, source, error
+
+
+async def aiter_scan(root_folder: str,
+                     video_extensions: List[str],
+                     cancel_check: Callable[[], bool] = lambda: False,
+                     jobs: int = None,
+                     cache=None,
+                     follow_symlinks: bool = False,
+                     timeout: float = 10,
+                     stats=None,
+                     rotational_jobs: int = None,
+                     duplicates=None,
+                     checkpoint=None,
+                     adaptive_timeout=None,
+                     filters=None):
+    """Async counterpart of core.iter_scan yielding the same event records.
+
+    At most `jobs` probes per storage device run at once, or `rotational_jobs`
+    on spinning disks (one asyncio.Semaphore per st_dev, limits as in
+    scheduler.DeviceScheduler), and each ffprobe child gets its own deadline
+    from adaptive_timeout (default: a timeouts.AdaptiveTimeout for `timeout`);
+    files that time out are retried after the main pass, as in iter_scan.
+    When cancel_check fires, or the
+    consuming task is cancelled, every in-flight ffprobe process is killed
+    immediately instead of being allowed to finish. stats is an optional
+    instrument.ScanStats, duplicates an optional duplicates.DuplicateIndex
+    and checkpoint an optional checkpoint.ScanCheckpoint, and filters an
+    optional filters.ScanFilter, as for iter_scan.
+    """
+    loop = asyncio.get_running_loop()
+    devices = scheduler.DeviceScheduler(jobs or core.default_jobs(), rotational_jobs or scheduler.ROTATIONAL_JOBS)
+    semaphores: Dict[Optional[int], asyncio.Semaphore] = {}
+    device_workers = 0
+    if adaptive_timeout is None:
+        adaptive_timeout = timeouts.AdaptiveTimeout(timeout)
+
+    def semaphore_for(dev: Optional[int]) -> asyncio.Semaphore:
+        nonlocal device_workers
+        semaphore = semaphores.get(dev)
+        if semaphore is None:
+            limit = devices.limit(dev)
+            semaphore = semaphores[dev] = asyncio.Semaphore(limit)
+            device_workers += limit
+        return semaphore
+
+    def next_folder():
+        """Return the next (dirpath, videos, st_dev, originals) from the traversal, or None.
+
+        originals is as from core._find_duplicates. Runs in the executor.
+        """
+        folder = next(folders, None)
+        if folder is None:
+            return None
+        if checkpoint is not None:
+            checkpoint.listed(list(stack))
+        dev = devices.device_of(folder[0])
+        devices.rotational(dev)
+        return folder + (dev, core._find_duplicates(folder[1], dev, duplicates, stats))
+
+    errors: List[core.ScanError] = []
+
+    def onerror(e: OSError):
+        errors.append(core.ScanError(e.filename or root_folder, f"Error scanning folder {e.filename}: {e}"))
+
+    matcher = traversal.ExtensionMatcher(video_extensions)
+    stack = None
+    if checkpoint is not None:
+        if duplicates is not None:
+            await loop.run_in_executor(None, core._replay_duplicates, duplicates, checkpoint.resumed, matcher,
+                                       filters, root_folder)
+        stack = [root_folder] if checkpoint.pending is None else list(checkpoint.pending)
+    folders = traversal.iter_video_folders(root_folder, matcher, follow_symlinks=follow_symlinks,
+                                           onerror=onerror, stack=stack, filters=filters)
+
+    async def probe(entry: os.DirEntry, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            start = time.perf_counter() if stats is not None else 0.0
+            try:
+                st = await loop.run_in_executor(None, entry.stat)
+            except OSError:
+                st = None
+            result = await _probe_async(entry.path, timeout, cache=cache, st=st, stats=stats,
+                                        adaptive=adaptive_timeout)
+            if stats is not None:
+                stats.observe_file(time.perf_counter() - start)
+                stats.count('files')
+                if result[2]:
+                    stats.count('errors')
+            return result + (st.st_size if st is not None else None,)
+
+    async def retry_probe(dirpath: str, path: str):
+        """Probe a file that timed out again, with the retry deadline (see core._retry_pass)."""
+        dev = await loop.run_in_executor(None, devices.device_of, dirpath)
+        async with semaphore_for(dev):
+            try:
+                st = await loop.run_in_executor(None, os.stat, path)
+            except OSError:
+                st = None
+            duration, source, error = await _probe_async(path, adaptive_timeout.retry_timeout, cache=cache, st=st,
+                                                         stats=stats)
+        return duration, 'error' if source == 'timeout' else source, error, st.st_size if st is not None else None
+
+    tally = core._ScanTally(cache, duplicates, checkpoint, adaptive_timeout, stats)
+    # Path -> probe task of every file probed so far, for duplicates to share.
+    probed: Dict[str, asyncio.Future] = {}
+    retry_tasks: Dict[str, asyncio.Future] = {}
+    for event in tally.resumed():
+        yield event
+
+    # Folders (and traversal errors) not yet reported, oldest first.
+    pending = deque()
+    queued = 0
+
+    async def ready(step: core._Wait) -> bool:
+        """Wait as a step of core._folder_steps or core._retry_steps says; returns False if cancelled."""
+        if step.future is None:
+            return not cancel_check()
+        while not step.future.done():
+            if cancel_check():
+                return False
+            await asyncio.wait({step.future}, timeout=core._CANCEL_POLL_INTERVAL)
+        return True
+
+    try:
+        while True:
+            if cancel_check():
+                yield tally.finished(True)
+                return
+
+            if stats is not None:
+                start = time.perf_counter()
+                folder = await loop.run_in_executor(None, next_folder)
+                stats.add('list', start, folder[0] if folder else None)
+            else:
+                folder = await loop.run_in_executor(None, next_folder)
+            pending.extend((error, None) for error in errors)
+            errors.clear()
+            if folder is not None:
+                dirpath, videos, dev, originals = folder
+                semaphore = semaphore_for(dev)
+                # Tasks start in the device's read order but are reported in listing order.
+                tasks = core._start_probes(videos, originals, devices.order(dev, videos),
+                                           lambda entry: asyncio.ensure_future(probe(entry, semaphore)), probed)
+                pending.append((dirpath, tasks))
+                queued += len(tasks)
+
+            while pending and (folder is None or queued > 2 * max(devices.jobs, device_workers) or pending[0][1] is None
+                               or all(task.done() for _, task, _ in pending[0][1])):
+                item, tasks = pending[0]
+                if tasks is None:
+                    yield item
+                    pending.popleft()
+                    continue
+
+                for step in core._folder_steps(tally, item, tasks):
+                    if not isinstance(step, core._Wait):
+                        yield step
+                    elif not await ready(step):
+                        yield tally.finished(True)
+                        return
+                queued -= len(tasks)
+                pending.popleft()
+
+            if folder is None:
+                break
+
+        for step in core._retry_steps(tally, lambda dirpath, path: asyncio.ensure_future(retry_probe(dirpath, path)),
+                                      retry_tasks):
+            if not isinstance(step, core._Wait):
+                yield step
+            elif not await ready(step):
+                yield tally.finished(True)
+                return
+    finally:
+        # Cancelling the tasks kills their ffprobe children (see _run_ffprobe).
+        leftover = [task for _, tasks in pending if tasks is not None for _, task, _ in tasks]
+        leftover.extend(task for task in retry_tasks.values() if not task.done())
+        for task in leftover:
+            task.cancel()
+        if leftover:
+            await asyncio.gather(*leftover, return_exceptions=True)
+        if cache is not None:
+            await loop.run_in_executor(None, cache.flush)
+        if checkpoint is not None:
+            await loop.run_in_executor(None, checkpoint.flush)
+
+    cancelled = cancel_check()
+    if checkpoint is not None and not cancelled:
+        await loop.run_in_executor(None, checkpoint.finish)
+    yield tally.finished(cancelled)
+
+
+async def traverse_and_calculate_async(root_folder: str,
+                                       video_extensions: List[str],
+                                       cancel_check: Callable[[], bool] = lambda: False,
+                                       logger: Callable = None,
+                                       jobs: int = None,
+                                       cache=None,
+                                       follow_symlinks: bool = False,
+                                       timeout: float = 10,
+                                       stats=None,
+                                       rotational_jobs: int = None,
+                                       tree=None,
+                                       results=None,
+                                       duplicates=None,
+                                       checkpoint=None,
+                                       adaptive_timeout=None,
+                                       filters=None) -> Tuple[List[Dict], float, int]:
+    """Async counterpart of core.traverse_and_calculate built on aiter_scan.
+
+    Returns: (folder_summaries, grand_total_seconds, total_videos)
+    """
+    logger = logger or core._default_logger
+    report = core.ScanReport(tree, results)
+
+    core.log_scan_header(logger)
+
+    try:
+        async for event in aiter_scan(root_folder, video_extensions, cancel_check=cancel_check, jobs=jobs,
+                                      cache=cache, follow_symlinks=follow_symlinks, timeout=timeout,
+                                      stats=stats, rotational_jobs=rotational_jobs, duplicates=duplicates,
+                                      checkpoint=checkpoint, adaptive_timeout=adaptive_timeout,
+                                      filters=filters):
+            if stats is not None:
+                start = time.perf_counter()
+                core.log_event(event, logger)
+                stats.add('log', start)
+            else:
+                core.log_event(event, logger)
+            report.add(event)
+    except core.FFprobeNotFoundError:
+        core.log_ffprobe_missing(logger)
+        raise
+
+    report.log_final_report(logger, stats, duplicates)
+    return report.folder_summaries, report.finished.total_duration, report.finished.total_videos
@@ -0,0 +1,109 @@
+import struct
+from typing import BinaryIO, Optional, Tuple
+
+from calculator import rangeio
+
+
+EXTENSIONS = ('.avi',)
+
+# The hdrl list sits at the start of the file and is normally a few KB.
+SCAN_BUDGET = 256 * 1024
+
+
+def _iter_chunks(data: bytes, start: int, end: int):
+    """Yield (fourcc, list_type, payload_start, payload_end) for RIFF chunks in data."""
+    pos = start
+    end = min(end, len(data))
+    while pos + 8 <= end:
+        fourcc, size = struct.unpack_from('<4sI', data, pos)
+        payload_start = pos + 8
+        payload_end = payload_start + size
+        list_type = None
+        if fourcc in (b'LIST', b'RIFF') and size >= 4:
+            list_type = data[payload_start:payload_start + 4]
+        yield fourcc, list_type, payload_start, payload_end
+        pos = payload_end + (size & 1)
+
+
+def _find_list(data: bytes, list_type: bytes, start: int, end: int) -> Optional[Tuple[int, int]]:
+    for fourcc, found_type, payload_start, payload_end in _iter_chunks(data, start, end):
+        if fourcc == b'LIST' and found_type == list_type:
+            return payload_start + 4, payload_end
+    return None
+
+
+def _has_riff_extension(f: BinaryIO, riff_end: int, file_size: int) -> bool:
+    """Return True if an OpenDML 'AVIX' RIFF chunk follows the first one."""
+    if riff_end + 12 > file_size:
+        return False
+    f.seek(riff_end)
+    header = f.read(12)
+    return len(header) == 12 and header[:4] == b'RIFF' and header[8:12] == b'AVIX'
+
+
+def parse_duration(f: rangeio.RangeReader) -> Optional[Tuple[float, bool]]:
+    """Like read_duration, reading through an open RangeReader."""
+    try:
+        header = f.pread(0, 24)
+        if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'AVI ':
+            return None
+        riff_end = 8 + struct.unpack_from('<I', header, 4)[0]
+        # Read just the hdrl list when it comes first, as it normally does.
+        if len(header) == 24 and header[12:16] == b'LIST' and header[20:24] == b'hdrl':
+            data = f.pread(0, min(20 + struct.unpack_from('<I', header, 16)[0], SCAN_BUDGET))
+        else:
+            data = f.pread(0, SCAN_BUDGET)
+        multi_riff = _has_riff_extension(f, riff_end + (riff_end & 1), f.size)
+    except (OSError, struct.error):
+        return None
+
+    hdrl = _find_list(data, b'hdrl', 12, riff_end)
+    if hdrl is None:
+        return None
+
+    usec_per_frame = avih_frames = None
+    video_header = None
+    grand_frames = None
+
+    for fourcc, list_type, payload_start, payload_end in _iter_chunks(data, *hdrl):
+        if fourcc == b'avih' and payload_end - payload_start >= 20:
+            usec_per_frame, _, _, _, avih_frames = struct.unpack_from('<5I', data, payload_start)
+        elif fourcc == b'LIST' and list_type == b'strl' and video_header is None:
+            for child, _, child_start, child_end in _iter_chunks(data, payload_start + 4, payload_end):
+                if child == b'strh' and child_end - child_start >= 36 and data[child_start:child_start + 4] == b'vids':
+                    scale, rate, start, length = struct.unpack_from('<4I', data, child_start + 20)
+                    video_header = (scale, rate, length)
+        elif fourcc == b'LIST' and list_type == b'odml':
+            for child, _, child_start, child_end in _iter_chunks(data, payload_start + 4, payload_end):
+                if child == b'dmlh' and child_end - child_start >= 4:
+                    grand_frames = struct.unpack_from('<I', data, child_start)[0]
+
+    if video_header is not None:
+        scale, rate, length = video_header
+        if grand_frames:
+            length = grand_frames
+        elif multi_riff:
+            # Without dmlh the stream length only covers the first RIFF chunk.
+            return None
+        if scale and rate and length:
+            return length * scale / rate, True
+
+    frames = grand_frames or (None if multi_riff else avih_frames)
+    if usec_per_frame and frames:
+        return frames * usec_per_frame / 1e6, False
+    return None
+
+
+def read_duration(file_path: str) -> Optional[Tuple[float, bool]]:
+    """Return the duration computed from the AVI headers.
+
+    Uses the video stream's strh rate/scale and frame count, with the OpenDML
+    dmlh total for files larger than one RIFF chunk; the result is exact.
+    Falls back to avih frame count times frame period, which is an estimate.
+    Returns (seconds, exact) or None.
+    """
+    try:
+        with rangeio.RangeReader(file_path) as f:
+            return parse_duration(f)
+    except OSError:
+        return None
@@ -0,0 +1,249 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+DEFAULT_MAX_ENTRIES = 500_000
+_COMMIT_EVERY = 500
+
+
+def default_cache_path() -> str:
+    """Return the per-user location of the duration cache database."""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+        return os.path.join(base, 'VideoDurationCalculator', 'durations.sqlite3')
+    if sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'video-duration-calculator', 'durations.sqlite3')
+
+
+class DurationCache:
+    """Persistent path -> duration cache, validated by size, mtime_ns and inode.
+
+    Entries whose file identity changed are dropped on lookup. When the cache
+    holds more than max_entries rows, the least recently used ones are evicted.
+    Safe to share between probing threads.
+    """
+
+    def __init__(self, path: str = None, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path or default_cache_path()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS durations ('
+            ' path TEXT PRIMARY KEY,'
+            ' size INTEGER NOT NULL,'
+            ' mtime_ns INTEGER NOT NULL,'
+            ' inode INTEGER NOT NULL,'
+            ' duration REAL NOT NULL,'
+            ' last_used INTEGER NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS durations_last_used ON durations(last_used)')
+        self._conn.commit()
+        self._count = self._conn.execute('SELECT COUNT(*) FROM durations').fetchone()[0]
+
+        # Hits only bump last_used; those writes are batched until the next flush.
+        self._touched = {}
+        self._dirty = 0
+
+    def get(self, file_path: str, st: os.stat_result = None) -> Optional[float]:
+        """Return the cached duration for file_path, or None if absent or stale."""
+        try:
+            st = st or os.stat(file_path)
+        except OSError:
+            return None
+
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, mtime_ns, inode, duration FROM durations WHERE path = ?',
+                (file_path,)
+            ).fetchone()
+
+            if row is not None and row[:3] == (st.st_size, st.st_mtime_ns, st.st_ino):
+                self.hits += 1
+                self._touched[file_path] = time.time_ns()
+                if len(self._touched) >= _COMMIT_EVERY:
+                    self._flush_locked()
+                return row[3]
+
+            if row is not None:
+                self._conn.execute('DELETE FROM durations WHERE path = ?', (file_path,))
+                self._count -= 1
+                self._dirty += 1
+            self.misses += 1
+            return None
+
+    def put(self, file_path: str, duration: float, st: os.stat_result = None):
+        """Store the duration probed for file_path."""
+        try:
+            st = st or os.stat(file_path)
+        except OSError:
+            return
+
+        with self._lock:
+            exists = self._conn.execute('SELECT 1 FROM durations WHERE path = ?', (file_path,)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO durations (path, size, mtime_ns, inode, duration, last_used) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (file_path, st.st_size, st.st_mtime_ns, st.st_ino, duration, time.time_ns())
+            )
+            if not exists:
+                self._count += 1
+            self._touched.pop(file_path, None)
+            self._dirty += 1
+
+            if self._count > self.max_entries:
+                self._evict_locked()
+            if self._dirty >= _COMMIT_EVERY:
+                self._flush_locked()
+
+    def _evict_locked(self):
+        # Evict a tenth of the budget at once so eviction doesn't run on every put.
+        self._flush_locked()
+        target = self.max_entries - max(1, self.max_entries // 10)
+        self._conn.execute(
+            'DELETE FROM durations WHERE path IN '
+            '(SELECT path FROM durations ORDER BY last_used LIMIT ?)',
+            (max(0, self._count - target),)
+        )
+        self._count = self._conn.execute('SELECT COUNT(*) FROM durations').fetchone()[0]
+
+    def _flush_locked(self):
+        if self._touched:
+            self._conn.executemany(
+                'UPDATE durations SET last_used = ? WHERE path = ?',
+                [(used, path) for path, used in self._touched.items()]
+            )
+            self._touched.clear()
+        self._conn.commit()
+        self._dirty = 0
+
+    def flush(self):
+        """Write pending updates to disk."""
+        with self._lock:
+            self._flush_locked()
+
+    def clear(self):
+        """Remove every cached entry."""
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute('DELETE FROM durations')
+            self._conn.commit()
+            self._count = 0
+            self._dirty = 0
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MemoryCache:
+    """In-memory path -> duration cache with the DurationCache interface, optionally in front of one.
+
+    Lookups that miss here fall through to backing (a DurationCache) and are
+    remembered; durations put here are written to both. Validated by size,
+    mtime_ns and inode like DurationCache, and safe to share between
+    probing threads. For long-running processes that probe the same files
+    again and again; the least recently used entries beyond max_entries
+    are dropped.
+    """
+
+    def __init__(self, backing: DurationCache = None, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.backing = backing
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_path: str, st: os.stat_result = None) -> Optional[float]:
+        """Return the cached duration for file_path, or None if absent or stale."""
+        try:
+            st = st or os.stat(file_path)
+        except OSError:
+            return None
+
+        identity = (st.st_size, st.st_mtime_ns, st.st_ino)
+        with self._lock:
+            entry = self._entries.get(file_path)
+            if entry is not None and entry[0] == identity:
+                self._entries.move_to_end(file_path)
+                self.hits += 1
+                return entry[1]
+
+        duration = self.backing.get(file_path, st) if self.backing is not None else None
+        with self._lock:
+            if duration is None:
+                self._entries.pop(file_path, None)
+                self.misses += 1
+            else:
+                self._store_locked(file_path, identity, duration)
+                self.hits += 1
+        return duration
+
+    def put(self, file_path: str, duration: float, st: os.stat_result = None):
+        """Store the duration probed for file_path."""
+        try:
+            st = st or os.stat(file_path)
+        except OSError:
+            return
+        with self._lock:
+            self._store_locked(file_path, (st.st_size, st.st_mtime_ns, st.st_ino), duration)
+        if self.backing is not None:
+            self.backing.put(file_path, duration, st)
+
+    def _store_locked(self, file_path: str, identity, duration: float):
+        self._entries[file_path] = (identity, duration)
+        self._entries.move_to_end(file_path)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def flush(self):
+        """Write pending updates of the backing cache to disk."""
+        if self.backing is not None:
+            self.backing.flush()
+
+    def clear(self):
+        """Remove every cached entry, here and in the backing cache."""
+        with self._lock:
+            self._entries.clear()
+        if self.backing is not None:
+            self.backing.clear()
+
+    def close(self):
+        if self.backing is not None:
+            self.backing.close()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,292 @@
+"""Append-only checkpoint file for resuming an interrupted scan.
+
+One JSON object per line:
+  {"type": "scan", "version": 1, "created": <unix time>, "root": "/a",
+   "extensions": [".mp4"], "follow_symlinks": false, "filters": null}
+  {"type": "folder", "path": "/a/b", "seconds": 60.0, "videos": 1, "unreadable": 0, "duplicates": 0}
+  {"type": "folder", ..., "retrying": ["slow.ts"]}
+  {"type": "frontier", "pending": ["/a/d", "/a/c"]}
+  {"type": "end"}
+
+Finished folders are written in batches, each closed by a frontier record
+holding the traversal stack (see traversal.iter_video_folders) as it was
+right after the batch's last folder was listed; every batch is written,
+flushed and fsynced in one go. On load, folder records are only trusted up
+to the last frontier, and anything after it (a batch torn by a crash) is
+cut off, so a resumed scan continues exactly where the last complete batch
+left off. A folder's files that timed out are listed in "retrying" and
+retried again by the resumed scan unless it finished. "filters" holds the
+scan's filters.ScanFilter rules (see ScanFilter.to_dict), if it had any.
+
+A scan holds an exclusive lock on the file next to the checkpoint with
+'.lock' appended for as long as the checkpoint is open, so a second scan of
+the same root fails with CheckpointInUse instead of overwriting it. The
+lock is the operating system's, so it goes away with a crashed scan.
+"""
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+CHECKPOINT_VERSION = 1
+
+# A batch is written when it is this old or this big, whichever comes first.
+CHECKPOINT_SECONDS = 5.0
+_BATCH_FOLDERS = 1000
+
+
+class CheckpointError(ValueError):
+    """The file isn't a checkpoint, or not one for this scan."""
+
+
+class CheckpointInUse(CheckpointError):
+    """Another scan has the checkpoint open."""
+
+
+class _CheckpointLock:
+    """An exclusive lock on path + '.lock', held until release(); raises CheckpointInUse if taken."""
+
+    def __init__(self, path: str):
+        self._fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(self._fd)
+            raise CheckpointInUse(f"{path} is in use by another scan") from None
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+def default_checkpoint_path(root_folder: str) -> str:
+    """Return the per-user checkpoint file for scans of root_folder (next to the duration cache)."""
+    from calculator import cache
+    directory = os.path.join(os.path.dirname(cache.default_cache_path()), 'checkpoints')
+    os.makedirs(directory, exist_ok=True)
+    key = hashlib.sha1(os.path.abspath(root_folder).encode('utf-8', 'surrogateescape')).hexdigest()
+    return os.path.join(directory, key + '.jsonl')
+
+
+class ScanCheckpoint:
+    """An open checkpoint: the folders finished by earlier runs, where to go on, and an append handle.
+
+    resumed holds (path, seconds, videos, unreadable, duplicates, retrying)
+    for every folder finished before this run, in report order; pending is the
+    traversal stack to resume from (None to start at the root). finished is
+    True once a scan ran to completion.
+
+    The scan calls listed() with a copy of the traversal stack for every
+    folder it lists and folder_finished() for every folder it reports, in
+    the same order; flush() and finish() are called when it stops. The
+    checkpoint is locked against other scans until close().
+    """
+
+    def __init__(self, path: str, root_folder: str, extensions: List[str], follow_symlinks: bool,
+                 resumed: List[Tuple], pending: Optional[List[str]], finished: bool,
+                 filters: Optional[Dict] = None, lock: Optional[_CheckpointLock] = None):
+        self.path = path
+        self.root_folder = root_folder
+        self.extensions = extensions
+        self.follow_symlinks = follow_symlinks
+        self.filters = filters
+        self.resumed = resumed
+        self.pending = pending
+        self.finished = finished
+        self._lock = lock
+        self._file = open(path, 'a', encoding='utf-8')
+        self._stacks = deque()
+        self._batch: List[str] = []
+        self._frontier: Optional[List[str]] = None
+        self._batch_started = 0.0
+
+    @classmethod
+    def create(cls, path: str, root_folder: str, extensions: List[str],
+               follow_symlinks: bool = False, filters=None, lock: _CheckpointLock = None) -> 'ScanCheckpoint':
+        """Start a new checkpoint at path, replacing any earlier one.
+
+        filters is the scan's filters.ScanFilter, if it has one. Raises
+        CheckpointInUse if another scan has the checkpoint open.
+        """
+        rules = None if filters is None else filters.to_dict()
+        if lock is None:
+            lock = _CheckpointLock(path)
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({'type': 'scan', 'version': CHECKPOINT_VERSION, 'created': time.time(),
+                                    'root': root_folder, 'extensions': list(extensions),
+                                    'follow_symlinks': follow_symlinks, 'filters': rules},
+                                   ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            return cls(path, root_folder, list(extensions), follow_symlinks, [], None, finished=False,
+                       filters=rules, lock=lock)
+        except BaseException:
+            lock.release()
+            raise
+
+    @classmethod
+    def load(cls, path: str, lock: _CheckpointLock = None) -> 'ScanCheckpoint':
+        """Read the checkpoint at path, dropping any batch that wasn't completely written.
+
+        Raises CheckpointInUse if another scan has it open.
+        """
+        if lock is None:
+            lock = _CheckpointLock(path)
+        try:
+            return cls._load(path, lock)
+        except BaseException:
+            lock.release()
+            raise
+
+    @classmethod
+    def _load(cls, path: str, lock: _CheckpointLock) -> 'ScanCheckpoint':
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        header = None
+        resumed: List[Tuple] = []
+        batch: List[Tuple] = []
+        pending = None
+        finished = False
+        committed = 0
+        offset = 0
+        for raw in data.split(b'\n'):
+            line_end = offset + len(raw) + 1
+            if line_end > len(data):
+                break  # no newline: torn by a crash
+            offset = line_end
+            try:
+                record = json.loads(raw.decode('utf-8'))
+                kind = record['type']
+            except (ValueError, KeyError, TypeError):
+                if header is None:
+                    raise CheckpointError(f"{path}: not a scan checkpoint")
+                break
+
+            if header is None:
+                if kind != 'scan' or record.get('version') != CHECKPOINT_VERSION:
+                    raise CheckpointError(f"{path}: not a version {CHECKPOINT_VERSION} scan checkpoint")
+                header = record
+                committed = offset
+            elif kind == 'folder':
+                batch.append((record['path'], record['seconds'], record['videos'], record['unreadable'],
+                              record['duplicates'], tuple(record.get('retrying', ()))))
+            elif kind in ('frontier', 'end'):
+                resumed.extend(batch)
+                batch.clear()
+                if kind == 'frontier':
+                    pending = record['pending']
+                else:
+                    pending, finished = [], True
+                committed = offset
+
+        if header is None:
+            raise CheckpointError(f"{path}: not a scan checkpoint")
+        if committed < len(data):
+            os.truncate(path, committed)
+        return cls(path, header['root'], header['extensions'], header['follow_symlinks'], resumed, pending,
+                   finished, header.get('filters'), lock)
+
+    @classmethod
+    def open(cls, path: str, root_folder: str, extensions: List[str], follow_symlinks: bool = False,
+             resume: bool = True, filters=None) -> 'ScanCheckpoint':
+        """Resume the checkpoint at path if resume is set and it holds an unfinished scan, else start a new one.
+
+        Raises CheckpointError if the file at path is for a different scan,
+        and CheckpointInUse if another scan has it open.
+        """
+        lock = _CheckpointLock(path)
+        if resume and os.path.exists(path):
+            checkpoint = cls.load(path, lock)
+            if not checkpoint.finished:
+                if (os.path.abspath(checkpoint.root_folder) != os.path.abspath(root_folder)
+                        or checkpoint.extensions != list(extensions)
+                        or checkpoint.follow_symlinks != follow_symlinks
+                        or checkpoint.filters != (None if filters is None else filters.to_dict())):
+                    checkpoint.close()
+                    raise CheckpointError(f"{path} is a checkpoint for a different scan of {checkpoint.root_folder}")
+                return checkpoint
+            checkpoint.close(keep_lock=True)
+        return cls.create(path, root_folder, extensions, follow_symlinks, filters, lock)
+
+    def restart(self, filters=None) -> 'ScanCheckpoint':
+        """Close this checkpoint and start a new one for the same scan in its place, keeping the lock.
+
+        filters is the scan's filters.ScanFilter, if it has one.
+        """
+        self.close(keep_lock=True)
+        return self.create(self.path, self.root_folder, self.extensions, self.follow_symlinks, filters, self._lock)
+
+    def listed(self, stack: List[str]):
+        """Record the traversal stack as it was right after the next folder was listed."""
+        self._stacks.append(stack)
+
+    def folder_finished(self, event):
+        """Queue a core.FolderFinished for the next batch; writes the batch when it is due."""
+        self._frontier = self._stacks.popleft()
+        record = {'type': 'folder', 'path': event.path, 'seconds': event.duration, 'videos': event.video_count,
+                  'unreadable': event.unreadable, 'duplicates': event.duplicates}
+        if event.retrying:
+            record['retrying'] = list(event.retrying)
+        self._batch.append(json.dumps(record, ensure_ascii=False))
+        now = time.monotonic()
+        if len(self._batch) == 1:
+            self._batch_started = now
+        if len(self._batch) >= _BATCH_FOLDERS or now - self._batch_started >= CHECKPOINT_SECONDS:
+            self.flush()
+
+    def _write(self, lines: List[str]):
+        self._file.write('\n'.join(lines) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def flush(self):
+        """Write the queued folders and the frontier after them as one batch."""
+        if not self._batch:
+            return
+        self._batch.append(json.dumps({'type': 'frontier', 'pending': self._frontier}, ensure_ascii=False))
+        self._write(self._batch)
+        self.pending = self._frontier
+        self._batch = []
+
+    def finish(self):
+        """Write the remaining folders and mark the scan complete."""
+        self._batch.append('{"type": "end"}')
+        self._write(self._batch)
+        self._batch = []
+        self.pending, self.finished = [], True
+
+    def close(self, keep_lock: bool = False):
+        """Close the file and, unless keep_lock is set, let other scans open the checkpoint."""
+        if not self._file.closed:
+            self._file.close()
+        if self._lock is not None and not keep_lock:
+            self._lock.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,648 @@
+"""Headless command-line interface: python -m calculator scan|rename|revert|replay|coordinate|worker|serve ...
+
+Reuses calculator.core without importing tkinter. Exit codes:
+  0  completed without errors
+  1  completed, but some files or folders couldn't be read or renamed
+  2  invalid arguments, root folder or journal
+  3  ffprobe not found
+  130  interrupted (Ctrl+C)
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from typing import Callable, List, TextIO
+
+from calculator import core
+
+
+EXIT_OK = 0
+EXIT_SCAN_ERRORS = 1
+EXIT_USAGE = 2
+EXIT_FFPROBE_MISSING = 3
+EXIT_INTERRUPTED = 130
+
+DEFAULT_EXTENSIONS = ['.mp4', '.m4v', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.webm', '.ts']
+
+FOLDER_FIELDS = ['path', 'name', 'videos', 'seconds', 'minutes']
+FILE_FIELDS = ['path', 'folder', 'name', 'size', 'seconds', 'source', 'duplicate_of']
+
+
+def parse_extensions(text: str) -> List[str]:
+    """Parse a comma-separated extension list the same way the GUI does."""
+    extensions = []
+    for ext in text.split(','):
+        ext = ext.strip()
+        if ext:
+            if not ext.startswith('.'):
+                ext = '.' + ext
+            extensions.append(ext.lower())
+    return extensions
+
+
+def _stderr_logger(text: str, tag=None):
+    sys.stderr.write(text)
+
+
+def _text_logger(out: TextIO) -> Callable:
+    def logger(text: str, tag=None):
+        out.write(text)
+    return logger
+
+
+def event_record(event: core.ScanEvent) -> dict:
+    """Return a JSON-serialisable record for a scan event."""
+    if isinstance(event, core.FileProbed):
+        return {'type': 'file', 'path': event.path, 'folder': event.folder, 'name': event.name,
+                'size': event.size, 'seconds': event.duration, 'source': event.source,
+                'duplicate_of': event.duplicate_of}
+    if isinstance(event, core.FolderFinished):
+        return {'type': 'folder', 'path': event.path, 'name': event.name, 'videos': event.video_count,
+                'unreadable': event.unreadable, 'duplicates': event.duplicates, 'retried': len(event.retrying),
+                'seconds': event.duration, 'minutes': event.duration / 60}
+    if isinstance(event, core.FileRetried):
+        return {'type': 'retry', 'path': event.path, 'folder': event.folder, 'name': event.name,
+                'size': event.size, 'seconds': event.duration, 'source': event.source,
+                'duplicate_of': event.duplicate_of}
+    if isinstance(event, core.ScanError):
+        return {'type': 'error', 'path': event.path, 'message': event.message}
+    if isinstance(event, core.ScanFinished):
+        record = {'type': 'summary', 'folders': event.folder_count, 'videos': event.total_videos,
+                  'unreadable': event.unreadable, 'duplicates': event.duplicates, 'retried': event.retried,
+                  'retry_failed': event.retry_failed, 'seconds': event.total_duration,
+                  'minutes': event.total_duration / 60, 'cancelled': event.cancelled}
+        if event.cache_hits is not None:
+            record['cache_hits'] = event.cache_hits
+            record['cache_misses'] = event.cache_misses
+        return record
+    return {'type': 'folder_started', 'path': event.path}
+
+
+def _add_retry(folder: dict, retry: dict):
+    """Fold a 'retry' record into the 'folder' record of its folder."""
+    if retry['source'] == 'error':
+        folder['unreadable'] += 1
+    else:
+        folder['videos'] += 1
+        folder['seconds'] += retry['seconds']
+        folder['minutes'] = folder['seconds'] / 60
+
+
+class _JsonWriter:
+    """Collects folder (and optionally file) records into one JSON document.
+
+    Folders include the files that succeeded on retry; the retries
+    themselves are listed under "retries".
+    """
+
+    def __init__(self, out: TextIO, root: str, include_files: bool):
+        self.out = out
+        self.document = {'root': root, 'folders': [], 'errors': [], 'retries': []}
+        if include_files:
+            self.document['files'] = []
+        self.retrying = {}
+
+    def write(self, record: dict):
+        kind = record.pop('type')
+        if kind == 'folder':
+            self.document['folders'].append(record)
+            if record['retried']:
+                self.retrying[record['path']] = record
+        elif kind == 'file' and 'files' in self.document:
+            self.document['files'].append(record)
+        elif kind == 'retry':
+            self.document['retries'].append(record)
+            _add_retry(self.retrying[record['folder']], record)
+        elif kind == 'error':
+            self.document['errors'].append(record)
+        elif kind == 'summary':
+            self.document['summary'] = record
+
+    def close(self):
+        json.dump(self.document, self.out, indent=2, ensure_ascii=False)
+        self.out.write('\n')
+
+
+class _NdjsonWriter:
+    """Streams one JSON object per event as soon as it arrives.
+
+    A folder's record doesn't include the files it retried; their "retry"
+    records follow after the last folder.
+    """
+
+    def __init__(self, out: TextIO, include_files: bool):
+        self.out = out
+        self.include_files = include_files
+
+    def write(self, record: dict):
+        if record['type'] == 'folder_started' or (record['type'] == 'file' and not self.include_files):
+            return
+        self.out.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.out.flush()
+
+    def close(self):
+        pass
+
+
+class _CsvWriter:
+    """Writes one row per folder, or one row per file with --files.
+
+    Files retried after timing out are written as they are retried; the row
+    of a folder that retried files is held back until they all were.
+    """
+
+    def __init__(self, out: TextIO, include_files: bool):
+        self.kind = 'file' if include_files else 'folder'
+        self.writer = csv.DictWriter(out, fieldnames=FILE_FIELDS if include_files else FOLDER_FIELDS,
+                                     extrasaction='ignore')
+        self.writer.writeheader()
+        self.retrying = {}
+
+    def write(self, record: dict):
+        kind = record['type']
+        if kind == 'retry':
+            if self.kind == 'file':
+                self.writer.writerow(record)
+                return
+            folder = self.retrying[record['folder']]
+            _add_retry(folder, record)
+            folder['retried'] -= 1
+            if not folder['retried']:
+                self.writer.writerow(self.retrying.pop(record['folder']))
+        elif kind == 'folder' and self.kind == 'folder' and record['retried']:
+            self.retrying[record['path']] = record
+        elif kind == 'summary':
+            # Folders whose retries were cancelled.
+            self.writer.writerows(self.retrying.values())
+            self.retrying.clear()
+        elif kind == self.kind:
+            self.writer.writerow(record)
+
+    def close(self):
+        pass
+
+
+def _make_writer(fmt: str, out: TextIO, root: str, include_files: bool):
+    if fmt == 'json':
+        return _JsonWriter(out, root, include_files)
+    if fmt == 'ndjson':
+        return _NdjsonWriter(out, include_files)
+    return _CsvWriter(out, include_files)
+
+
+def _open_cache(args):
+    if args.no_cache:
+        return None
+    import sqlite3
+    from calculator import cache
+    try:
+        return cache.DurationCache(args.cache_path)
+    except (sqlite3.Error, OSError) as e:
+        sys.stderr.write(f"⚠ Duration cache unavailable ({e}); continuing without it\n")
+        return None
+
+
+def _scan_extensions(args) -> List[str]:
+    """Validate the root and extensions shared by scan and rename; returns [] if invalid."""
+    if not os.path.isdir(args.root):
+        sys.stderr.write(f"❌ Not a folder: {args.root}\n")
+        return []
+    extensions = parse_extensions(args.extensions)
+    if not extensions:
+        sys.stderr.write("❌ No video extensions given\n")
+    return extensions
+
+
+def _duplicate_index(args):
+    """Return the duplicates.DuplicateIndex asked for by --duplicates, or None."""
+    if not args.duplicates:
+        return None
+    from calculator import duplicates
+    return duplicates.DuplicateIndex(match_content=args.match_content, exclude=args.duplicates == 'exclude')
+
+
+def _adaptive_timeout(args):
+    """Return the timeouts.AdaptiveTimeout for --timeout and --retry-timeout."""
+    from calculator import timeouts
+    return timeouts.AdaptiveTimeout(args.timeout, retry_timeout=args.retry_timeout)
+
+
+def _size_argument(text: str) -> int:
+    from calculator import filters
+    try:
+        return filters.parse_size(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _scan_filter(args):
+    """Return the filters.ScanFilter for the filter options, or None if none are given; raises ValueError."""
+    from calculator import filters
+    exclude = list(filters.COMMON_EXCLUDES) if args.exclude_common else []
+    return filters.ScanFilter.from_dict({'include': args.include, 'exclude': exclude + (args.exclude or []),
+                                         'min_size': args.min_size, 'max_size': args.max_size,
+                                         'skip_hidden': args.skip_hidden, 'max_depth': args.max_depth})
+
+
+def _open_checkpoint(args, extensions: List[str]):
+    """Return the checkpoint.ScanCheckpoint for this scan, None if not asked for or unavailable, or False if invalid.
+
+    Only scans run with --resume or --checkpoint are checkpointed.
+    """
+    if not args.resume and not args.checkpoint:
+        return None
+    from calculator import checkpoint
+    try:
+        path = args.checkpoint or checkpoint.default_checkpoint_path(args.root)
+        return checkpoint.ScanCheckpoint.open(path, args.root, extensions, args.follow_symlinks,
+                                              resume=args.resume, filters=args.filters)
+    except checkpoint.CheckpointInUse as e:
+        sys.stderr.write(f"⚠ {e}; continuing without a checkpoint (pass --checkpoint FILE to keep one)\n")
+        return None
+    except checkpoint.CheckpointError as e:
+        sys.stderr.write(f"❌ {e}\n")
+        return False
+    except OSError as e:
+        sys.stderr.write(f"⚠ Checkpoint unavailable ({e}); continuing without it\n")
+        return None
+
+
+def run_scan(args, out: TextIO, logger: Callable = None) -> int:
+    root = args.root
+    extensions = _scan_extensions(args)
+    if not extensions:
+        return EXIT_USAGE
+    scan_checkpoint = _open_checkpoint(args, extensions)
+    if scan_checkpoint is False:
+        return EXIT_USAGE
+
+    stats = None
+    if args.stats or args.trace:
+        from calculator import instrument
+        stats = instrument.ScanStats(trace=bool(args.trace))
+
+    store = None
+    if args.save_results:
+        from calculator import results
+        store = results.ResultStore()
+
+    duration_cache = _open_cache(args)
+    writer = _make_writer(args.format, out, root, args.files)
+    had_errors = False
+    try:
+        if logger:
+            core.log_scan_header(logger)
+        for event in core.iter_scan(root, extensions, jobs=args.jobs, cache=duration_cache,
+                                    follow_symlinks=args.follow_symlinks, timeout=args.timeout,
+                                    stats=stats, rotational_jobs=args.hdd_jobs,
+                                    duplicates=_duplicate_index(args), checkpoint=scan_checkpoint,
+                                    adaptive_timeout=_adaptive_timeout(args), filters=args.filters):
+            if logger:
+                core.log_event(event, logger)
+            if isinstance(event, core.ScanError):
+                had_errors = True
+            elif store is not None and isinstance(event, (core.FileProbed, core.FileRetried)):
+                store.add_event(event)
+            writer.write(event_record(event))
+    except core.FFprobeNotFoundError:
+        core.log_ffprobe_missing(_stderr_logger)
+        return EXIT_FFPROBE_MISSING
+    finally:
+        writer.close()
+        if duration_cache is not None:
+            duration_cache.close()
+        if scan_checkpoint is not None:
+            scan_checkpoint.close()
+        if stats is not None:
+            if args.stats:
+                stats.log_summary(_stderr_logger)
+            if args.trace:
+                stats.write_chrome_trace(args.trace)
+        if store is not None:
+            store.save(args.save_results)
+
+    return EXIT_SCAN_ERRORS if had_errors else EXIT_OK
+
+
+def run_rename(args, out: TextIO, logger: Callable = None) -> int:
+    """Scan root, then append "(NN min)" to every folder with videos, journaling the renames."""
+    from calculator import journal, renamer
+
+    extensions = _scan_extensions(args)
+    if not extensions:
+        return EXIT_USAGE
+
+    from calculator import tree
+
+    scan_checkpoint = _open_checkpoint(args, extensions)
+    if scan_checkpoint is False:
+        return EXIT_USAGE
+    duration_cache = _open_cache(args)
+    folder_tree = tree.FolderTree(args.root)
+    report = core.ScanReport(folder_tree)
+    try:
+        if logger:
+            core.log_scan_header(logger)
+        for event in core.iter_scan(args.root, extensions, jobs=args.jobs, cache=duration_cache,
+                                    follow_symlinks=args.follow_symlinks, timeout=args.timeout,
+                                    rotational_jobs=args.hdd_jobs, duplicates=_duplicate_index(args),
+                                    checkpoint=scan_checkpoint, adaptive_timeout=_adaptive_timeout(args),
+                                    filters=args.filters):
+            if logger:
+                core.log_event(event, logger)
+            report.add(event)
+    except core.FFprobeNotFoundError:
+        core.log_ffprobe_missing(_stderr_logger)
+        return EXIT_FFPROBE_MISSING
+    finally:
+        if duration_cache is not None:
+            duration_cache.close()
+        if scan_checkpoint is not None:
+            scan_checkpoint.close()
+
+    folder_summaries = report.folder_summaries
+    if args.recursive:
+        folder_summaries = folder_tree.summaries(recursive=True)
+
+    journal_path = None
+    if not args.dry_run:
+        journal_path = args.journal or journal.new_journal_path()
+    _, summary = renamer.rename_folders_with_duration(folder_summaries, logger=_text_logger(out),
+                                                      journal_path=journal_path, dry_run=args.dry_run)
+    if 'journal' in summary:
+        sys.stderr.write(f"Journal: {summary['journal']}\n"
+                         f"Undo with: python -m calculator revert \"{summary['journal']}\"\n")
+    return EXIT_SCAN_ERRORS if report.errors or summary['errors'] else EXIT_OK
+
+
+def run_coordinate(args, out: TextIO, logger: Callable = None) -> int:
+    """Hand the shards of root to the workers connecting to --listen and write the merged results."""
+    from calculator import distributed
+
+    extensions = _scan_extensions(args)
+    if not extensions:
+        return EXIT_USAGE
+    try:
+        coordinator = distributed.Coordinator(args.root, extensions, args.listen,
+                                              follow_symlinks=args.follow_symlinks, timeout=args.timeout,
+                                              retry_timeout=args.retry_timeout, filters=args.filters,
+                                              min_shards=args.min_shards or distributed.MIN_SHARDS)
+    except (ValueError, OSError) as e:
+        sys.stderr.write(f"❌ Can't listen on {args.listen}: {e}\n")
+        return EXIT_USAGE
+
+    writer = _make_writer(args.format, out, args.root, include_files=False)
+    had_errors = False
+    try:
+        sys.stderr.write(f"Waiting for workers on {coordinator.address}\n")
+        if logger:
+            core.log_scan_header(logger)
+        for event in coordinator.iter_scan():
+            if logger:
+                core.log_event(event, logger)
+            if isinstance(event, core.ScanError):
+                had_errors = True
+            writer.write(event_record(event))
+    finally:
+        coordinator.close()
+        writer.close()
+    return EXIT_SCAN_ERRORS if had_errors else EXIT_OK
+
+
+def run_worker(args, out: TextIO, logger: Callable = None) -> int:
+    """Scan the shards sent by the coordinator at address until it has none left."""
+    from calculator import distributed
+
+    duration_cache = _open_cache(args)
+    try:
+        shards = distributed.run_worker(args.address, args.root, jobs=args.jobs, cache=duration_cache,
+                                        rotational_jobs=args.hdd_jobs, connect_timeout=args.connect_timeout,
+                                        logger=logger)
+    except ValueError as e:
+        sys.stderr.write(f"❌ {e}\n")
+        return EXIT_USAGE
+    except OSError as e:
+        sys.stderr.write(f"❌ Lost the coordinator at {args.address}: {e}\n")
+        return EXIT_SCAN_ERRORS
+    finally:
+        if duration_cache is not None:
+            duration_cache.close()
+    sys.stderr.write(f"Scanned {shards} shards\n")
+    return EXIT_OK
+
+
+def run_serve(args, out: TextIO, logger: Callable = None) -> int:
+    """Serve the scan daemon's HTTP API on --listen until interrupted."""
+    from calculator import daemon
+
+    duration_cache = _open_cache(args)
+    scan_daemon = daemon.ScanDaemon(duration_cache, jobs=args.jobs, rotational_jobs=args.hdd_jobs,
+                                    flights=args.flights)
+    try:
+        server = daemon.make_server(scan_daemon, args.listen, logger=logger)
+    except (ValueError, OSError) as e:
+        sys.stderr.write(f"❌ Can't listen on {args.listen}: {e}\n")
+        scan_daemon.close()
+        if duration_cache is not None:
+            duration_cache.close()
+        return EXIT_USAGE
+
+    host, port = server.server_address[:2]
+    sys.stderr.write(f"Serving the scan API on http://{host}:{port}/scans\n")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        scan_daemon.close()
+        if duration_cache is not None:
+            duration_cache.close()
+    return EXIT_OK
+
+
+def _run_journal(args, out: TextIO, action: Callable) -> int:
+    from calculator import journal
+    try:
+        result = action(args.journal, logger=_text_logger(out))
+    except (journal.JournalError, OSError) as e:
+        sys.stderr.write(f"❌ Can't read journal: {e}\n")
+        return EXIT_USAGE
+    return EXIT_SCAN_ERRORS if result['errors'] else EXIT_OK
+
+
+def run_revert(args, out: TextIO, logger: Callable = None) -> int:
+    from calculator import renamer
+    return _run_journal(args, out, renamer.revert_journal)
+
+
+def run_replay(args, out: TextIO, logger: Callable = None) -> int:
+    from calculator import renamer
+    return _run_journal(args, out, renamer.replay_journal)
+
+
+def _add_scan_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('root', help='folder to scan recursively')
+    parser.add_argument('-e', '--extensions', default=', '.join(DEFAULT_EXTENSIONS),
+                        help='comma-separated video extensions (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='files to probe concurrently per storage device (default: CPU count)')
+    parser.add_argument('--hdd-jobs', type=int, default=None,
+                        help='files to probe concurrently per spinning disk (default: 2)')
+    parser.add_argument('-t', '--timeout', type=float, default=10,
+                        help='longest ffprobe timeout per file in seconds; small files get less once the '
+                             'scan has measured the probe speed (default: %(default)s)')
+    parser.add_argument('--retry-timeout', type=float, default=None,
+                        help='ffprobe timeout for retrying the files that timed out, after the main pass; '
+                             '0 disables retries (default: 6 x --timeout)')
+    parser.add_argument('--follow-symlinks', action='store_true', help='descend into directory symlinks')
+    _add_filter_arguments(parser)
+    parser.add_argument('--duplicates', choices=('count', 'exclude'),
+                        help='probe hardlinked files once and count them in the totals or exclude them')
+    parser.add_argument('--match-content', action='store_true',
+                        help='with --duplicates, also match copies by size and a partial content hash')
+    parser.add_argument('--resume', action='store_true',
+                        help='checkpoint this scan, continuing the interrupted one saved in the checkpoint if any')
+    parser.add_argument('--checkpoint', metavar='FILE',
+                        help='checkpoint this scan in FILE, starting over unless --resume is given (default with '
+                             '--resume: one per root folder in the per-user cache dir)')
+    parser.add_argument('--no-cache', action='store_true', help="don't use the persistent duration cache")
+    parser.add_argument('--cache-path', help='duration cache database (default: per-user cache dir)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='print the text report to stderr')
+
+
+def _add_filter_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--include', action='append', metavar='PATTERN',
+                        help='only scan files matching this glob (or re:REGEX); may be repeated')
+    parser.add_argument('--exclude', action='append', metavar='PATTERN',
+                        help='skip files and folders matching this glob (or re:REGEX), relative to the root; '
+                             'a trailing / matches folders only, which are then never listed; may be repeated')
+    parser.add_argument('--exclude-common', action='store_true',
+                        help='skip VCS, trash, snapshot and thumbnail folders (.git, $RECYCLE.BIN, @eaDir, ...)')
+    parser.add_argument('--min-size', type=_size_argument, metavar='SIZE',
+                        help='skip files smaller than SIZE bytes (K, M, G suffixes allowed)')
+    parser.add_argument('--max-size', type=_size_argument, metavar='SIZE',
+                        help='skip files larger than SIZE bytes (K, M, G suffixes allowed)')
+    parser.add_argument('--skip-hidden', action='store_true', help='skip hidden files and folders')
+    parser.add_argument('--max-depth', type=int, metavar='N',
+                        help="don't descend more than N folder levels below the root (0: the root only)")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m calculator',
+                                     description='Calculate total video durations per folder.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    scan = subparsers.add_parser('scan', help='scan a folder tree and write per-folder durations')
+    _add_scan_arguments(scan)
+    scan.add_argument('-f', '--format', choices=('json', 'ndjson', 'csv'), default='json',
+                      help='output format (default: %(default)s)')
+    scan.add_argument('-o', '--output', help='write results to this file instead of stdout')
+    scan.add_argument('--files', action='store_true', help='include one record per file')
+    scan.add_argument('--stats', action='store_true',
+                      help='print phase timings, counters and a latency histogram to stderr')
+    scan.add_argument('--trace', metavar='FILE', help='write a Chrome trace-event JSON file of the scan')
+    scan.add_argument('--save-results', metavar='FILE',
+                      help='save per-file results in the binary format of calculator.results.ResultStore')
+    scan.set_defaults(handler=run_scan)
+
+    rename = subparsers.add_parser('rename', help='scan a folder tree and append "(NN min)" to folder names')
+    _add_scan_arguments(rename)
+    rename.add_argument('-n', '--dry-run', action='store_true', help='only print the planned renames')
+    rename.add_argument('-r', '--recursive', action='store_true',
+                        help='name every folder after the total of its whole subtree, not just its own videos')
+    rename.add_argument('--journal', help='rename journal to write (default: new file in the per-user cache dir)')
+    rename.set_defaults(handler=run_rename)
+
+    revert = subparsers.add_parser('revert', help='undo the renames recorded in a rename journal')
+    revert.add_argument('journal', help='journal written by the rename command or the GUI')
+    revert.set_defaults(handler=run_revert)
+
+    replay = subparsers.add_parser('replay', help='finish an interrupted rename from its journal')
+    replay.add_argument('journal', help='journal written by the rename command or the GUI')
+    replay.set_defaults(handler=run_replay)
+
+    coordinate = subparsers.add_parser('coordinate',
+                                       help='split a scan into subtrees for `worker` processes and merge their results')
+    coordinate.add_argument('root', help='folder to scan recursively')
+    coordinate.add_argument('--listen', default='127.0.0.1:8765', metavar='ADDRESS',
+                            help='HOST:PORT or unix:PATH to accept workers on (default: %(default)s)')
+    coordinate.add_argument('-e', '--extensions', default=', '.join(DEFAULT_EXTENSIONS),
+                            help='comma-separated video extensions (default: %(default)s)')
+    coordinate.add_argument('-t', '--timeout', type=float, default=10,
+                            help='longest ffprobe timeout per file in seconds, on the workers (default: %(default)s)')
+    coordinate.add_argument('--retry-timeout', type=float, default=None,
+                            help='ffprobe timeout for retrying the files that timed out; 0 disables retries '
+                                 '(default: 6 x --timeout)')
+    coordinate.add_argument('--follow-symlinks', action='store_true', help='descend into directory symlinks')
+    coordinate.add_argument('--min-shards', type=int, default=None,
+                            help='split subfolders into smaller shards, up to 4 levels deep, until there are '
+                                 'this many, so one big folder is still shared out (default: 64)')
+    _add_filter_arguments(coordinate)
+    coordinate.add_argument('-f', '--format', choices=('json', 'ndjson', 'csv'), default='json',
+                            help='output format (default: %(default)s)')
+    coordinate.add_argument('-o', '--output', help='write results to this file instead of stdout')
+    coordinate.add_argument('-v', '--verbose', action='store_true', help='print the text report to stderr')
+    coordinate.set_defaults(handler=run_coordinate)
+
+    worker = subparsers.add_parser('worker', help='scan subtrees handed out by a `coordinate` process')
+    worker.add_argument('address', help='HOST:PORT or unix:PATH of the coordinator')
+    worker.add_argument('--root', help="this machine's path to the coordinator's root folder (default: the same)")
+    worker.add_argument('-j', '--jobs', type=int, default=None,
+                        help='files to probe concurrently per storage device (default: CPU count)')
+    worker.add_argument('--hdd-jobs', type=int, default=None,
+                        help='files to probe concurrently per spinning disk (default: 2)')
+    worker.add_argument('--connect-timeout', type=float, default=30,
+                        help='seconds to keep retrying the connection (default: %(default)s)')
+    worker.add_argument('--no-cache', action='store_true', help="don't use the persistent duration cache")
+    worker.add_argument('--cache-path', help='duration cache database (default: per-user cache dir)')
+    worker.add_argument('-v', '--verbose', action='store_true', help='print each shard to stderr')
+    worker.set_defaults(handler=run_worker)
+
+    serve = subparsers.add_parser('serve', help='run a scan daemon with an HTTP/JSON API and warm caches')
+    serve.add_argument('--listen', default='127.0.0.1:8770',
+                       help='HOST:PORT to serve on; there is no authentication (default: %(default)s)')
+    serve.add_argument('-j', '--jobs', type=int, default=None,
+                       help='files to probe concurrently per storage device, per subtree (default: CPU count)')
+    serve.add_argument('--hdd-jobs', type=int, default=None,
+                       help='files to probe concurrently per spinning disk, per subtree (default: 2)')
+    serve.add_argument('--flights', type=int, default=2,
+                       help='subtrees to scan at once across all jobs (default: %(default)s)')
+    serve.add_argument('--no-cache', action='store_true',
+                       help="don't use the persistent duration cache behind the in-memory one")
+    serve.add_argument('--cache-path', help='duration cache database (default: per-user cache dir)')
+    serve.add_argument('-v', '--verbose', action='store_true', help='log each request to stderr')
+    serve.set_defaults(handler=run_serve)
+    return parser
+
+
+def main(argv: List[str] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, 'jobs', None) is not None and args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+    if getattr(args, 'hdd_jobs', None) is not None and args.hdd_jobs < 1:
+        parser.error('--hdd-jobs must be at least 1')
+    if getattr(args, 'flights', 1) < 1:
+        parser.error('--flights must be at least 1')
+    if getattr(args, 'match_content', False) and not args.duplicates:
+        parser.error('--match-content needs --duplicates')
+    if hasattr(args, 'exclude'):
+        try:
+            args.filters = _scan_filter(args)
+        except ValueError as e:
+            parser.error(str(e))
+
+    logger = _stderr_logger if getattr(args, 'verbose', False) else None
+    try:
+        if getattr(args, 'output', None):
+            newline = '' if args.format == 'csv' else None
+            with open(args.output, 'w', encoding='utf-8', newline=newline) as out:
+                return args.handler(args, out, logger)
+        return args.handler(args, sys.stdout, logger)
+    except KeyboardInterrupt:
+        sys.stderr.write("\n⚠ Interrupted\n")
+        return EXIT_INTERRUPTED
+    except BrokenPipeError:
+        # The reader (e.g. `| head`) went away; silence the flush at exit.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return EXIT_SCAN_ERRORS
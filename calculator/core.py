@@ -1,7 +1,27 @@
 import os
 import subprocess
-import json
-from typing import Callable, List, Dict, Tuple
+import time
+from collections import deque
+from concurrent.futures import Future, wait
+from typing import Callable, List, Dict, Optional, Tuple
+
+from calculator import avi
+from calculator import flv
+from calculator import matroska
+from calculator import mp4
+from calculator import mpegts
+from calculator import rangeio
+from calculator import scheduler
+from calculator import timeouts
+from calculator import traversal
+
+
+_CANCEL_POLL_INTERVAL = 0.1
+
+# Containers whose duration can be read in-process instead of spawning ffprobe.
+_NATIVE_READERS = {}
+for _module in (mp4, matroska, mpegts, avi, flv):
+    _NATIVE_READERS.update(dict.fromkeys(_module.EXTENSIONS, _module.parse_duration))
 
 
 def _default_logger(text: str, tag=None):
@@ -22,136 +42,1089 @@ def _is_windows_no_window():
     return creationflags, startupinfo
 
 
-def get_video_duration(file_path: str, logger: Callable = None, timeout: int = 10) -> float:
-    """Return duration in seconds for a single video using ffprobe."""
-    logger = logger or _default_logger
+def default_jobs() -> int:
+    """Return the default number of concurrent ffprobe workers."""
+    return min(32, os.cpu_count() or 1)
+
+
+def read_native_duration(file_path: str, stats=None) -> Optional[Tuple[float, bool]]:
+    """Return (seconds, exact) read in-process from the container, or None.
+
+    exact is False for estimates (e.g. MPEG-TS first/last PCR). None means
+    the format has no native reader or the file couldn't be parsed; callers
+    should fall back to ffprobe. Reads go through a rangeio.RangeReader, so
+    at most rangeio.DEFAULT_BUDGET bytes are read per file; with stats, the
+    bytes and read calls are added to its native_bytes/native_reads counters.
+    """
+    parse = _NATIVE_READERS.get(os.path.splitext(file_path)[1].lower())
+    if parse is None:
+        return None
     try:
-        cmd = [
-            'ffprobe',
-            '-v', 'error',
-            '-show_entries', 'format=duration',
-            '-of', 'json',
-            file_path
-        ]
+        with rangeio.RangeReader(file_path) as reader:
+            try:
+                return parse(reader)
+            finally:
+                if stats is not None:
+                    stats.count('native_bytes', reader.bytes_read)
+                    stats.count('native_reads', reader.syscalls)
+    except OSError:
+        return None
+
+
+class FFprobeNotFoundError(FileNotFoundError):
+    """Raised when the ffprobe executable can't be found on PATH."""
+
+
+def log_ffprobe_missing(logger: Callable = None):
+    logger = logger or _default_logger
+    logger("\n❌ ERROR: ffprobe not found. Please install FFmpeg:\n")
+    logger("   Windows: Download from https://ffmpeg.org/download.html\n")
+    logger("   Mac: brew install ffmpeg\n")
+    logger("   Linux: sudo apt install ffmpeg\n\n")
+
+
+def _probe_in_process(file_path: str, cache=None, native: bool = True,
+                      st: os.stat_result = None, stats=None) -> Optional[Tuple[float, str]]:
+    """Return (duration_seconds, source) from the cache or a native reader, or None."""
+    if cache is not None:
+        start = time.perf_counter() if stats is not None else 0.0
+        cached = cache.get(file_path, st)
+        if stats is not None:
+            stats.add('cache', start, file_path)
+            stats.count('cache_hits' if cached is not None else 'cache_misses')
+        if cached is not None:
+            return cached, 'cache'
+
+    if native:
+        start = time.perf_counter() if stats is not None else 0.0
+        native_result = read_native_duration(file_path, stats)
+        if stats is not None:
+            stats.add('native', start, file_path)
+        if native_result is not None:
+            duration, exact = native_result
+            if stats is not None:
+                stats.count('native' if exact else 'estimates')
+            # Estimates aren't cached: they would come back as exact 'cache'
+            # hits, and reading them again costs only a few bounded reads.
+            if exact and cache is not None:
+                cache.put(file_path, duration, st)
+            return duration, 'native' if exact else 'estimate'
+    return None
+
+
+# ffprobe tiers, cheapest first, as (source, arguments). The first only
+# looks at the container header and answers for almost every file; stream
+# durations and, last, demuxing every packet of the first video stream are
+# tried only when the tier before found no duration.
+_FFPROBE_TIERS = (
+    ('ffprobe', ['-probesize', '1000000', '-analyzeduration', '1000000', '-show_entries', 'format=duration']),
+    ('ffprobe-streams', ['-show_entries', 'stream=duration']),
+    ('ffprobe-packets', ['-select_streams', 'v:0', '-show_entries', 'packet=pts_time,duration_time']),
+)
+FFPROBE_SOURCES = tuple(source for source, _ in _FFPROBE_TIERS)
+
+
+def _ffprobe_command(file_path: str, tier: int = 0) -> List[str]:
+    return [
+        'ffprobe',
+        '-v', 'error',
+        *_FFPROBE_TIERS[tier][1],
+        '-of', 'csv=p=0',
+        file_path
+    ]
+
+
+def _parse_ffprobe_output(stdout: str, tier: int = 0) -> Optional[float]:
+    """Return the duration in one tier's output, or None if it reported none."""
+    rows = []
+    for line in stdout.split():
+        try:
+            rows.append([float(field) for field in line.split(',')])
+        except ValueError:
+            continue  # N/A
+
+    if tier < 2:
+        durations = [row[0] for row in rows if len(row) == 1]
+        duration = max(durations) if durations else None
+    else:
+        # Span from the first packet to the end of the last one.
+        packets = [row for row in rows if len(row) == 2]
+        duration = (max(pts + length for pts, length in packets) - min(pts for pts, _ in packets)
+                    if packets else None)
+    return duration if duration is not None and duration > 0 else None
+
+
+def _run_ffprobe_timed(cmd: List[str], timeout: float, creationflags: int, startupinfo, stats,
+                       file_path: str) -> subprocess.CompletedProcess:
+    """subprocess.run() that records process spawn and runtime as separate phases."""
+    start = time.perf_counter()
+    if startupinfo:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                startupinfo=startupinfo)
+    else:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                creationflags=creationflags)
+    start = stats.add('spawn', start, file_path)
+    stats.count('ffprobe_runs')
+    with proc:
+        try:
+            stdout, stderr = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            raise
+        finally:
+            stats.add('ffprobe', start, file_path)
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
+def _probe(file_path: str, timeout: int = 10, cache=None, native: bool = True,
+           st: os.stat_result = None, stats=None, adaptive=None) -> Tuple[float, str, Optional[str]]:
+    """Return (duration_seconds, source, error_message); see probe_video.
 
+    source is 'timeout' if an ffprobe run timed out. With adaptive (a
+    timeouts.AdaptiveTimeout), each run gets its deadline from there
+    instead of timeout and reports how long it took.
+    """
+    in_process = _probe_in_process(file_path, cache=cache, native=native, st=st, stats=stats)
+    if in_process is not None:
+        return in_process + (None,)
+
+    size = st.st_size if st is not None else None
+    try:
         creationflags, startupinfo = _is_windows_no_window()
-        if startupinfo:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout, startupinfo=startupinfo)
-        else:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout, creationflags=creationflags)
+        for tier, source in enumerate(FFPROBE_SOURCES):
+            cmd = _ffprobe_command(file_path, tier)
+            if adaptive is not None:
+                timeout = adaptive.deadline(size, tier)
+                run_start = time.monotonic()
+            if stats is not None:
+                result = _run_ffprobe_timed(cmd, timeout, creationflags, startupinfo, stats, file_path)
+            elif startupinfo:
+                result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout, startupinfo=startupinfo)
+            else:
+                result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout, creationflags=creationflags)
+            if adaptive is not None:
+                adaptive.observe(size, time.monotonic() - run_start, tier)
 
-        if result.returncode == 0:
-            data = json.loads(result.stdout)
-            duration = float(data['format']['duration'])
-            return duration
-        else:
-            logger(f"  ⚠ Error processing {os.path.basename(file_path)}\n")
-            return 0.0
+            # A file ffprobe can't open at all won't do better in a later tier.
+            if result.returncode != 0:
+                return 0.0, 'error', f"Error processing {os.path.basename(file_path)}"
+
+            start = time.perf_counter() if stats is not None else 0.0
+            duration = _parse_ffprobe_output(result.stdout, tier)
+            if stats is not None:
+                stats.add('parse', start, file_path)
+            if duration is not None:
+                if stats is not None:
+                    stats.count(source)
+                if cache is not None:
+                    cache.put(file_path, duration, st)
+                return duration, source, None
+        return 0.0, 'error', f"Error processing {os.path.basename(file_path)}: no duration found"
 
     except subprocess.TimeoutExpired:
-        logger(f"  ⚠ Timeout processing {os.path.basename(file_path)}\n")
-        return 0.0
-    except FileNotFoundError:
-        logger("\n❌ ERROR: ffprobe not found. Please install FFmpeg:\n")
-        logger("   Windows: Download from https://ffmpeg.org/download.html\n")
-        logger("   Mac: brew install ffmpeg\n")
-        logger("   Linux: sudo apt install ffmpeg\n\n")
-        raise
+        if stats is not None:
+            stats.count('timeouts')
+        return 0.0, 'timeout', f"Timeout processing {os.path.basename(file_path)}"
+    except FileNotFoundError as e:
+        raise FFprobeNotFoundError(*e.args) from e
     except Exception as e:
-        logger(f"  ⚠ Error processing {os.path.basename(file_path)}: {e}\n")
-        return 0.0
+        return 0.0, 'error', f"Error processing {os.path.basename(file_path)}: {e}"
 
 
-def calculate_total_duration_in_folder(folder_path: str,
-                                       video_extensions: List[str],
-                                       cancel_check: Callable[[], bool] = lambda: False,
-                                       logger: Callable = None) -> Tuple[float, int]:
-    """Return (total_duration_seconds, video_count) in the folder."""
+def probe_video(file_path: str, logger: Callable = None, timeout: int = 10, cache=None,
+                native: bool = True, st: os.stat_result = None) -> Tuple[float, str]:
+    """Return (duration_seconds, source) for a single video.
+
+    source is one of 'cache', 'native', 'estimate', 'error' or, for files
+    that went through ffprobe, the tier that found the duration: 'ffprobe'
+    (container header), 'ffprobe-streams' or 'ffprobe-packets'; see
+    FFPROBE_SOURCES. 'error' means the file is unreadable and its duration
+    (0.0) isn't one. If a DurationCache is given, it is consulted first and
+    updated after a successful probe (st, if given, saves the cache a stat
+    call). Containers with a native reader (see read_native_duration) are
+    parsed in-process unless native is False; everything else goes through
+    ffprobe.
+    """
     logger = logger or _default_logger
-    total_duration = 0.0
-    video_count = 0
+    try:
+        duration, source, error = _probe(file_path, timeout=timeout, cache=cache, native=native, st=st)
+    except FFprobeNotFoundError:
+        log_ffprobe_missing(logger)
+        raise
+    if error:
+        logger(f"  ⚠ {error}\n")
+    return duration, 'error' if source == 'timeout' else source
 
+
+def get_video_duration(file_path: str, logger: Callable = None, timeout: int = 10, cache=None,
+                       native: bool = True) -> float:
+    """Return duration in seconds for a single video (see probe_video)."""
+    return probe_video(file_path, logger=logger, timeout=timeout, cache=cache, native=native)[0]
+
+
+def _probe_entry(entry: os.DirEntry, cache, timeout: float, stats=None,
+                 adaptive=None) -> Tuple[float, str, Optional[str], Optional[int]]:
+    """Return (duration, source, error_message, size_bytes) for one listed file."""
+    # The stat runs on the worker thread; DirEntry caches it for reuse by the cache.
+    start = time.perf_counter() if stats is not None else 0.0
     try:
-        for filename in os.listdir(folder_path):
-            if cancel_check():
-                return total_duration, video_count
-
-            file_path = os.path.join(folder_path, filename)
-            if os.path.isfile(file_path) and any(filename.lower().endswith(ext) for ext in video_extensions):
-                duration = get_video_duration(file_path, logger=logger)
-                total_duration += duration
-                video_count += 1
-                logger(f"  ✓ {filename}: {duration/60:.2f} min\n")
-    except Exception as e:
-        logger(f"  ⚠ Error scanning folder {folder_path}: {e}\n")
+        st = entry.stat()
+    except OSError:
+        st = None
+    result = _probe(entry.path, timeout=timeout, cache=cache, st=st, stats=stats, adaptive=adaptive)
+    if stats is not None:
+        stats.observe_file(time.perf_counter() - start)
+        stats.count('files')
+        if result[2]:
+            stats.count('errors')
+    return result + (st.st_size if st is not None else None,)
 
-    return total_duration, video_count
 
+class ScanEvent:
+    """Base class for the records yielded by iter_scan."""
 
-def traverse_and_calculate(root_folder: str,
-                           video_extensions: List[str],
-                           cancel_check: Callable[[], bool] = lambda: False,
-                           logger: Callable = None) -> Tuple[List[Dict], float, int]:
-    """Traverse root_folder, calculate durations per folder and return summaries.
+    __slots__ = ()
 
-    Returns: (folder_summaries, grand_total_seconds, total_videos)
-    folder_summaries: list of dicts with keys: path, name, minutes
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class FolderStarted(ScanEvent):
+    """Probing results for the files in path follow."""
+
+    __slots__ = ('path',)
+
+    def __init__(self, path: str):
+        self.path = path
+
+
+class FileProbed(ScanEvent):
+    """One video was probed; source is as returned by probe_video, size in bytes (None if unknown).
+
+    duplicate_of is the path of an earlier identical file whose result was
+    reused instead of probing this one (see duplicates.DuplicateIndex).
+    """
+
+    __slots__ = ('folder', 'name', 'duration', 'source', 'size', 'duplicate_of')
+
+    def __init__(self, folder: str, name: str, duration: float, source: str, size: Optional[int] = None,
+                 duplicate_of: Optional[str] = None):
+        self.folder = folder
+        self.name = name
+        self.duration = duration
+        self.source = source
+        self.size = size
+        self.duplicate_of = duplicate_of
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.folder, self.name)
+
+
+class FolderFinished(ScanEvent):
+    """All videos directly inside path were probed.
+
+    video_count counts the videos with a duration; unreadable ones are
+    counted separately and add nothing to duration. duplicates counts the
+    files that duplicate an earlier one; they are left out of video_count
+    and duration when the scan excludes duplicates. retrying names the
+    files whose probe timed out; they are in none of the counts yet and
+    are reported by a FileRetried each after the main pass.
+    """
+
+    __slots__ = ('path', 'duration', 'video_count', 'unreadable', 'duplicates', 'retrying')
+
+    def __init__(self, path: str, duration: float, video_count: int, unreadable: int = 0, duplicates: int = 0,
+                 retrying: Tuple[str, ...] = ()):
+        self.path = path
+        self.duration = duration
+        self.video_count = video_count
+        self.unreadable = unreadable
+        self.duplicates = duplicates
+        self.retrying = tuple(retrying)
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path) or self.path
+
+    def summary(self) -> Dict:
+        """Return the folder_summaries entry used by traverse_and_calculate and the renamer."""
+        return {'path': self.path, 'name': self.name, 'minutes': self.duration / 60}
+
+
+class FileRetried(ScanEvent):
+    """A file that timed out in the main pass was probed again with a longer deadline.
+
+    Fields as for FileProbed. If source isn't 'error' the file succeeded
+    late: its duration and one video belong to folder's totals, on top of
+    what its FolderFinished reported; otherwise it counts as unreadable.
+    """
+
+    __slots__ = ('folder', 'name', 'duration', 'source', 'size', 'duplicate_of')
+
+    def __init__(self, folder: str, name: str, duration: float, source: str, size: Optional[int] = None,
+                 duplicate_of: Optional[str] = None):
+        self.folder = folder
+        self.name = name
+        self.duration = duration
+        self.source = source
+        self.size = size
+        self.duplicate_of = duplicate_of
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.folder, self.name)
+
+    @property
+    def succeeded(self) -> bool:
+        return self.source != 'error'
+
+
+class ScanError(ScanEvent):
+    """A file or folder couldn't be read; the scan continues."""
+
+    __slots__ = ('path', 'message')
+
+    def __init__(self, path: str, message: str):
+        self.path = path
+        self.message = message
+
+
+class ScanFinished(ScanEvent):
+    """Last event of a scan, with totals; cancelled is True if cancel_check fired.
+
+    total_videos excludes the unreadable files, which are counted in
+    unreadable; duplicates is as for FolderFinished. The totals include
+    the retry pass: retried files were retried after timing out, and
+    retry_failed of them timed out or failed again.
+    """
+
+    __slots__ = ('folder_count', 'total_duration', 'total_videos', 'cancelled', 'cache_hits', 'cache_misses',
+                 'unreadable', 'duplicates', 'retried', 'retry_failed')
+
+    def __init__(self, folder_count: int, total_duration: float, total_videos: int, cancelled: bool,
+                 cache_hits: Optional[int] = None, cache_misses: Optional[int] = None, unreadable: int = 0,
+                 duplicates: int = 0, retried: int = 0, retry_failed: int = 0):
+        self.folder_count = folder_count
+        self.total_duration = total_duration
+        self.total_videos = total_videos
+        self.cancelled = cancelled
+        self.cache_hits = cache_hits
+        self.cache_misses = cache_misses
+        self.unreadable = unreadable
+        self.duplicates = duplicates
+        self.retried = retried
+        self.retry_failed = retry_failed
+
+
+class _ScanTally:
+    """Turns probe results into events and keeps the running totals of one scan.
+
+    Shared by the thread-pool (_run_scan) and asyncio (aio.aiter_scan) back
+    ends, which only differ in how probes run and are waited for. Per folder
+    they call begin_folder(), file_done() for each probe in report order and
+    end_folder(); after the main pass, retry_done() for each probe listed
+    by retry_probes(). resumed() reports the folders of a resumed checkpoint.
+
+    With a timeouts.AdaptiveTimeout whose retry_timeout isn't 0, files whose
+    probe timed out are left out of their folder's events and counts and
+    queued in retries as (dirpath, name, duplicate_of); otherwise they are
+    unreadable.
+    """
+
+    def __init__(self, cache=None, duplicates=None, checkpoint=None, adaptive=None, stats=None):
+        self.cache = cache
+        self.checkpoint = checkpoint
+        self.stats = stats
+        self.exclude_duplicates = duplicates is not None and duplicates.exclude
+        self.retries: Optional[List[Tuple]] = [] if adaptive is not None and adaptive.retry_timeout > 0 else None
+        self.folder_count = 0
+        self.total_duration = 0.0
+        self.total_videos = 0
+        self.unreadable = 0
+        self.duplicates = 0
+        self.retried = 0
+        self.retry_failed = 0
+        if cache is not None:
+            self._cache_hits, self._cache_misses = cache.hits, cache.misses
+        self._folder: Optional[FolderFinished] = None
+
+    def _add_folder(self, folder: FolderFinished):
+        self.folder_count += 1
+        self.total_videos += folder.video_count
+        self.total_duration += folder.duration
+        self.unreadable += folder.unreadable
+        self.duplicates += folder.duplicates
+
+    def resumed(self) -> List[ScanEvent]:
+        """Return the events for the folders finished before a resumed checkpoint, counting them."""
+        events = []
+        for record in self.checkpoint.resumed if self.checkpoint is not None else ():
+            folder = FolderFinished(*record)
+            events.append(FolderStarted(folder.path))
+            events.append(folder)
+            self._add_folder(folder)
+            if folder.retrying:
+                if self.retries is None:
+                    self.unreadable += len(folder.retrying)
+                else:
+                    self.retries.extend((folder.path, name, None) for name in folder.retrying)
+        return events
+
+    def begin_folder(self, dirpath: str) -> FolderStarted:
+        self._folder = FolderFinished(dirpath, 0.0, 0)
+        self._retrying = []
+        return FolderStarted(dirpath)
+
+    def file_done(self, filename: str, result: Tuple, duplicate_of: Optional[str]) -> List[ScanEvent]:
+        """Return the events for one file of the current folder; result is as from _probe_entry."""
+        folder = self._folder
+        duration, source, error, size = result
+        if duplicate_of is not None:
+            folder.duplicates += 1
+        excluded = duplicate_of is not None and self.exclude_duplicates
+        if source == 'timeout':
+            if self.retries is not None and not excluded:
+                self.retries.append((folder.path, filename, duplicate_of))
+                self._retrying.append(filename)
+                return []
+            source = 'error'
+        events = [ScanError(os.path.join(folder.path, filename), error)] if error else []
+        if excluded:
+            pass
+        elif source == 'error':
+            folder.unreadable += 1
+        else:
+            folder.duration += duration
+            folder.video_count += 1
+        events.append(FileProbed(folder.path, filename, duration, source, size, duplicate_of))
+        return events
+
+    def end_folder(self) -> FolderFinished:
+        """Return the FolderFinished for the current folder, counting it and saving it to the checkpoint."""
+        folder = self._folder
+        folder.retrying = tuple(self._retrying)
+        self._folder = None
+        self._add_folder(folder)
+        if self.checkpoint is not None:
+            self.checkpoint.folder_finished(folder)
+        return folder
+
+    def retry_probes(self) -> List[Tuple[str, str, Optional[str], str]]:
+        """Return (dirpath, name, duplicate_of, key) for the retry pass, in report order.
+
+        Files with the same key share one probe: a duplicate shares its
+        original's when that is retried too.
+        """
+        keys = set()
+        probes = []
+        for dirpath, name, duplicate_of in self.retries or ():
+            key = duplicate_of if duplicate_of in keys else os.path.join(dirpath, name)
+            keys.add(key)
+            probes.append((dirpath, name, duplicate_of, key))
+        return probes
+
+    def retry_done(self, dirpath: str, name: str, duplicate_of: Optional[str], result: Tuple) -> List[ScanEvent]:
+        """Return the events for one retried file; result is as from _retry_probe."""
+        duration, source, error, size = result
+        events = [ScanError(os.path.join(dirpath, name), error)] if error else []
+        self.retried += 1
+        if self.stats is not None:
+            self.stats.count('retried')
+        if source == 'error':
+            self.retry_failed += 1
+            self.unreadable += 1
+            if self.stats is not None:
+                self.stats.count('retry_failed')
+        else:
+            self.total_videos += 1
+            self.total_duration += duration
+        events.append(FileRetried(dirpath, name, duration, source, size, duplicate_of))
+        return events
+
+    def finished(self, cancelled: bool) -> ScanFinished:
+        cache_hits = cache_misses = None
+        if self.cache is not None:
+            cache_hits = self.cache.hits - self._cache_hits
+            cache_misses = self.cache.misses - self._cache_misses
+        return ScanFinished(self.folder_count, self.total_duration, self.total_videos, cancelled, cache_hits,
+                            cache_misses, self.unreadable, self.duplicates, self.retried, self.retry_failed)
+
+
+def _find_duplicates(entries: List[os.DirEntry], dev: Optional[int], duplicates=None,
+                     stats=None) -> Dict[int, str]:
+    """Return {id(entry): original path} for the entries that duplicate an earlier file.
+
+    May read file contents (see duplicates.DuplicateIndex), so the asyncio
+    back end runs it in an executor.
     """
+    originals = {}
+    if duplicates is not None:
+        for entry in entries:
+            original = duplicates.check(entry, dev)
+            if original is not None:
+                originals[id(entry)] = original
+        if stats is not None and originals:
+            stats.count('duplicates', len(originals))
+    return originals
+
+
+def _start_probes(entries: List[os.DirEntry], originals: Dict[int, str], order: List[os.DirEntry],
+                  start: Callable[[os.DirEntry], object], probed: Dict[str, object] = None) -> List[Tuple]:
+    """Start the probes for one folder's entries; return [(name, future, duplicate_of)] in entries order.
+
+    start(entry) starts a probe and returns its future (or asyncio task);
+    probes are started in the order given by order, the device's preferred
+    read order. A file identical to an earlier one (see _find_duplicates)
+    isn't probed but shares its future; probed maps the path of every
+    probed file to its future for that.
+    """
+    shared = set()
+    if originals:
+        # Originals reported before a resumed checkpoint have no future;
+        # the first duplicate is probed in their place.
+        seen = set()
+        for entry in entries:
+            original = originals.get(id(entry))
+            if original is not None:
+                if original in probed or original in seen:
+                    shared.add(id(entry))
+                seen.add(original)
+            seen.add(entry.path)
+
+    futures = {id(entry): start(entry) for entry in order if id(entry) not in shared}
+    if probed is not None:
+        for entry in entries:
+            if id(entry) in futures:
+                probed[entry.path] = futures[id(entry)]
+                if id(entry) in originals:
+                    probed.setdefault(originals[id(entry)], futures[id(entry)])
+
+    probes = []
+    for entry in entries:
+        original = originals.get(id(entry))
+        future = probed[original] if id(entry) in shared else futures[id(entry)]
+        probes.append((entry.name, future, original))
+    return probes
+
+
+def _timed_listing(folders, stats):
+    """Yield from folders, recording the time spent producing each item as the 'list' phase."""
+    folders = iter(folders)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(folders)
+        except StopIteration:
+            stats.add('list', start)
+            return
+        stats.add('list', start, item[0])
+        yield item
+
+
+def _cancel_probes(probes: List[Tuple]):
+    for _, future, _ in probes:
+        future.cancel()
+
+
+def _wait(future: Future, cancel_check: Callable[[], bool]) -> bool:
+    """Wait for future while polling cancel_check; returns False if it fired first."""
+    while not future.done():
+        if cancel_check():
+            return False
+        wait([future], timeout=_CANCEL_POLL_INTERVAL)
+    return True
+
+
+class _Wait:
+    """A step of _folder_steps or _retry_steps: wait for future before going on.
+
+    future is a concurrent.futures.Future or an asyncio task; None only asks
+    for a cancellation check. The steps are shared by _run_scan and
+    aio.aiter_scan, which differ only in how they wait.
+    """
+
+    __slots__ = ('future',)
+
+    def __init__(self, future=None):
+        self.future = future
+
+
+def _folder_steps(tally: _ScanTally, dirpath: str, probes: List[Tuple]):
+    """Yield the events for one folder, and a _Wait for each probe before its result is used."""
+    yield tally.begin_folder(dirpath)
+    for filename, future, duplicate_of in probes:
+        yield _Wait(future)
+        yield from tally.file_done(filename, future.result(), duplicate_of)
+    yield _Wait()
+    yield tally.end_folder()
+
+
+def _retry_steps(tally: _ScanTally, start: Callable[[str, str], object], started: Dict[str, object]):
+    """Yield the events for the retry pass, and a _Wait for each probe before its result is used.
+
+    start(dirpath, path) starts a retry probe and returns its future; every
+    one started is added to started (by key, see _ScanTally.retry_probes)
+    up front, for the engine to cancel if it stops early.
+    """
+    probes = []
+    for dirpath, name, duplicate_of, key in tally.retry_probes():
+        if key not in started:
+            started[key] = start(dirpath, os.path.join(dirpath, name))
+        probes.append((dirpath, name, duplicate_of, started[key]))
+    for dirpath, name, duplicate_of, future in probes:
+        yield _Wait(future)
+        yield from tally.retry_done(dirpath, name, duplicate_of, future.result())
+
+
+def _drive(steps, cancel_check: Callable[[], bool]):
+    """Yield the events from _folder_steps or _retry_steps, waiting where they say.
+
+    Returns True (via StopIteration) if cancel_check fired first.
+    """
+    for step in steps:
+        if not isinstance(step, _Wait):
+            yield step
+        elif cancel_check() if step.future is None else not _wait(step.future, cancel_check):
+            return True
+    return False
+
+
+def _retry_probe(file_path: str, cache, timeout: float,
+                 stats=None) -> Tuple[float, str, Optional[str], Optional[int]]:
+    """Probe a file again for the retry pass, with a fixed timeout; returns as _probe_entry."""
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        st = None
+    duration, source, error = _probe(file_path, timeout=timeout, cache=cache, st=st, stats=stats)
+    return duration, 'error' if source == 'timeout' else source, error, st.st_size if st is not None else None
+
+
+def _retry_pass(devices: scheduler.DeviceScheduler, tally: _ScanTally, cancel_check: Callable[[], bool],
+                cache, timeout: float, stats=None):
+    """Probe the files that timed out in the main pass again and yield events in order.
+
+    Each file gets timeout seconds. Yields ScanError (for files that fail
+    again) and FileRetried; returns True (via StopIteration) if cancel_check
+    fired while waiting.
+    """
+    futures: Dict[str, Future] = {}
+    try:
+        return (yield from _drive(_retry_steps(
+            tally, lambda dirpath, path: devices.submit(devices.device_of(dirpath), _retry_probe, path, cache,
+                                                        timeout, stats),
+            futures), cancel_check))
+    finally:
+        for future in futures.values():
+            future.cancel()
+
+
+def _run_scan(folders, errors: List[ScanError], cancel_check: Callable[[], bool], jobs: int, cache,
+              timeout: float, stats=None, rotational_jobs: int = None, duplicates=None, checkpoint=None,
+              adaptive=None):
+    """Probe the (dirpath, entries) pairs from folders and yield events in order.
+
+    Probes run on one pool per storage device (see scheduler.DeviceScheduler).
+    Probes for upcoming folders are queued while earlier ones finish, keeping
+    roughly two probes per worker in flight. errors is filled by the traversal
+    and reported in traversal order. The folders finished before a resumed
+    checkpoint are reported (and counted) first; see iter_scan. With a
+    timeouts.AdaptiveTimeout, deadlines come from there and files that time
+    out are retried after the main pass, unless its retry_timeout is 0.
+    Events and totals come from a _ScanTally.
+    """
+    if stats is not None:
+        folders = _timed_listing(folders, stats)
+    tally = _ScanTally(cache, duplicates, checkpoint, adaptive, stats)
+    probed = {} if duplicates is not None else None
+
+    # Folders (and traversal errors) not yet reported, oldest first.
+    pending = deque()
+    queued = 0
+
+    yield from tally.resumed()
+
+    def report_head():
+        """Yield the events for the head of pending; returns True if cancelled."""
+        nonlocal queued
+        item, probes = pending[0]
+        if probes is None:
+            yield item
+        else:
+            if (yield from _drive(_folder_steps(tally, item, probes), cancel_check)):
+                return True
+            queued -= len(probes)
+        pending.popleft()
+        return False
+
+    with scheduler.DeviceScheduler(jobs, rotational_jobs or scheduler.ROTATIONAL_JOBS) as devices:
+        try:
+            for dirpath, videos in folders:
+                if cancel_check():
+                    yield tally.finished(True)
+                    return
+
+                pending.extend((error, None) for error in errors)
+                errors.clear()
+                dev = devices.device_of(dirpath)
+                originals = _find_duplicates(videos, dev, duplicates, stats)
+                probes = _start_probes(videos, originals, devices.order(dev, videos),
+                                       lambda entry: devices.submit(dev, _probe_entry, entry, cache, timeout,
+                                                                    stats, adaptive),
+                                       probed)
+                pending.append((dirpath, probes))
+                queued += len(probes)
+
+                while pending and (queued > 2 * devices.capacity() or pending[0][1] is None
+                                   or all(future.done() for _, future, _ in pending[0][1])):
+                    if (yield from report_head()):
+                        yield tally.finished(True)
+                        return
+
+            pending.extend((error, None) for error in errors)
+            errors.clear()
+            while pending:
+                if (yield from report_head()):
+                    yield tally.finished(True)
+                    return
+
+            if tally.retries:
+                if (yield from _retry_pass(devices, tally, cancel_check, cache, adaptive.retry_timeout, stats)):
+                    yield tally.finished(True)
+                    return
+        finally:
+            for _, probes in pending:
+                if probes is not None:
+                    _cancel_probes(probes)
+            if cache is not None:
+                cache.flush()
+            if checkpoint is not None:
+                checkpoint.flush()
+
+    cancelled = cancel_check()
+    if checkpoint is not None and not cancelled:
+        checkpoint.finish()
+    yield tally.finished(cancelled)
+
+
+def iter_scan(root_folder: str,
+              video_extensions: List[str],
+              cancel_check: Callable[[], bool] = lambda: False,
+              jobs: int = None,
+              cache=None,
+              follow_symlinks: bool = False,
+              timeout: float = 10,
+              stats=None,
+              rotational_jobs: int = None,
+              duplicates=None,
+              checkpoint=None,
+              adaptive_timeout=None,
+              filters=None):
+    """Scan root_folder and yield ScanEvent records as results arrive.
+
+    For every folder with videos, in os.walk top-down order: FolderStarted,
+    then FileProbed per file (preceded by ScanError if it couldn't be read),
+    then FolderFinished. Unreadable folders produce a ScanError. The last
+    event is always ScanFinished, including after cancel_check fires. Up to
+    `jobs` files per storage device are probed concurrently (default:
+    default_jobs()), or `rotational_jobs` on spinning disks (default:
+    scheduler.ROTATIONAL_JOBS), each ffprobe run limited to `timeout`
+    seconds; the optional DurationCache
+    skips unchanged files.
+
+    Small files get shorter deadlines once the scan has seen how fast
+    ffprobe runs (see timeouts.AdaptiveTimeout; pass adaptive_timeout to
+    tune it). Files that time out aren't in their folder's events or totals
+    but listed in FolderFinished.retrying; after the last folder they are
+    probed again with a longer deadline, each reported by a FileRetried
+    (preceded by ScanError if it failed again), before ScanFinished. Nothing is accumulated
+    between events, so memory use doesn't grow with the size of the tree.
+    An optional instrument.ScanStats records phase timings and counters.
+    With a duplicates.DuplicateIndex, hardlinks (and, if it matches
+    content, copies) of a file already seen reuse its result instead of
+    being probed again and are marked in FileProbed.duplicate_of; memory
+    use then grows with the number of files.
+
+    With a checkpoint.ScanCheckpoint, finished folders are saved to it in
+    batches. If it was resumed, the folders it finished are reported first
+    (FolderStarted and FolderFinished only, no FileProbed) and counted in
+    ScanFinished, and the traversal picks up where it stopped, so the
+    folders and totals match those of an uninterrupted scan.
+
+    With a filters.ScanFilter, only the folders and files it keeps are
+    scanned; excluded folders are pruned without being listed.
+
+    Raises FFprobeNotFoundError if a file needs ffprobe and it isn't installed.
+    """
+    errors: List[ScanError] = []
+
+    def onerror(e: OSError):
+        errors.append(ScanError(e.filename or root_folder, f"Error scanning folder {e.filename}: {e}"))
+
+    matcher = traversal.ExtensionMatcher(video_extensions)
+    stack = None
+    if checkpoint is not None:
+        if duplicates is not None:
+            _replay_duplicates(duplicates, checkpoint.resumed, matcher, filters, root_folder)
+        stack = [root_folder] if checkpoint.pending is None else list(checkpoint.pending)
+    folders = traversal.iter_video_folders(root_folder, matcher, follow_symlinks=follow_symlinks,
+                                           onerror=onerror, stack=stack, filters=filters)
+    if checkpoint is not None:
+        folders = _checkpointed_listing(folders, stack, checkpoint)
+    if adaptive_timeout is None:
+        adaptive_timeout = timeouts.AdaptiveTimeout(timeout)
+    yield from _run_scan(folders, errors, cancel_check, jobs or default_jobs(), cache, timeout, stats,
+                         rotational_jobs, duplicates, checkpoint, adaptive_timeout)
+
+
+def _checkpointed_listing(folders, stack: List[str], checkpoint):
+    """Yield from folders, handing checkpoint a copy of the traversal stack after each one."""
+    for folder in folders:
+        checkpoint.listed(list(stack))
+        yield folder
+
+
+def _replay_duplicates(duplicates, resumed: List[Tuple], matches: Callable[[str], bool],
+                       filters=None, root_folder: str = None):
+    """Register the files of folders finished before a resumed checkpoint with duplicates.
+
+    They are only listed, not probed, so later copies are still recognised.
+    """
+    for record in resumed:
+        try:
+            dev = os.stat(record[0]).st_dev
+            entries = traversal.list_videos(record[0], matches, filters, root_folder)
+        except OSError:
+            continue
+        for entry in entries:
+            duplicates.check(entry, dev)
+
+
+def log_event(event: ScanEvent, logger: Callable = None):
+    """Write the report lines for one scan event."""
     logger = logger or _default_logger
+    if isinstance(event, FileProbed):
+        note = " (estimated)" if event.source == 'estimate' else ""
+        if event.duplicate_of is not None:
+            note += f" (duplicate of {event.duplicate_of})"
+        logger(f"  ✓ {event.name}: {event.duration/60:.2f} min{note}\n")
+    elif isinstance(event, FileRetried):
+        if event.succeeded:
+            logger(f"  ↻ {event.path}: {event.duration/60:.2f} min (succeeded on retry)\n")
+        else:
+            logger(f"  ↻ {event.path}: failed after retry\n")
+    elif isinstance(event, ScanError):
+        logger(f"  ⚠ {event.message}\n")
+    elif isinstance(event, FolderStarted):
+        logger(f"\n📁 {event.path}\n", None)
+        logger("-" * 80 + "\n", None)
+    elif isinstance(event, FolderFinished):
+        total_duration = event.duration
+        logger(f"\n  Folder Summary:\n", None)
+        logger(f"  • Videos: {event.video_count}\n", None)
+        if event.unreadable:
+            logger(f"  • Unreadable: {event.unreadable} (not counted)\n", None)
+        if event.duplicates:
+            logger(f"  • Duplicates: {event.duplicates}\n", None)
+        if event.retrying:
+            logger(f"  • Retrying after the main pass: {len(event.retrying)}\n", None)
+        logger(f"  • Duration: {total_duration:.2f} sec | {total_duration / 60:.2f} min | {total_duration / 3600:.2f} hrs\n", None)
+    elif isinstance(event, ScanFinished) and event.cancelled:
+        logger("\n⚠ Processing stopped by user\n", None)
 
-    grand_total_duration = 0.0
-    total_videos = 0
-    folder_summaries: List[Dict] = []
 
+def log_scan_header(logger: Callable = None):
+    logger = logger or _default_logger
     logger("=" * 80 + "\n", None)
     logger("VIDEO DURATION ANALYSIS\n", None)
     logger("=" * 80 + "\n\n", None)
 
-    for dirpath, dirnames, filenames in os.walk(root_folder):
-        if cancel_check():
-            logger("\n⚠ Processing stopped by user\n", None)
-            return folder_summaries, grand_total_duration, total_videos
 
-        has_videos = any(f.lower().endswith(tuple(video_extensions)) for f in filenames)
-        if has_videos:
-            logger(f"\n📁 {dirpath}\n", None)
-            logger("-" * 80 + "\n", None)
+def log_final_report(folder_summaries: List[Dict], finished: ScanFinished, logger: Callable = None,
+                     stats=None, duplicates=None, retries: List[FileRetried] = None):
+    """Write the FINAL REPORT block for a completed scan, with the stats summary if given.
+
+    duplicates is the scan's duplicates.DuplicateIndex, if it had one;
+    retries are its FileRetried events, listed if given.
+    """
+    logger = logger or _default_logger
+    grand_total_minutes = finished.total_duration / 60
+    grand_total_hours = finished.total_duration / 3600
+
+    logger("\n" + "=" * 80 + "\n", None)
+    logger("FINAL REPORT\n", None)
+    logger("=" * 80 + "\n\n", None)
+
+    for folder in folder_summaries:
+        logger(f"{folder['name']}: {folder['minutes']:.2f} min\n", None)
+
+    logger("\n" + "-" * 80 + "\n", None)
+    logger(f"TOTAL: {grand_total_minutes:.2f} min ({grand_total_hours:.2f} hours)\n", None)
+    if finished.unreadable:
+        logger(f"Unreadable: {finished.unreadable} files, not included in the total\n", None)
+    if finished.duplicates:
+        counted = "not included in" if duplicates is not None and duplicates.exclude else "included in"
+        logger(f"Duplicates: {finished.duplicates} files, probed once and {counted} the total\n", None)
+    if finished.retried:
+        late = finished.retried - finished.retry_failed
+        logger(f"Retried after timing out: {finished.retried} files, {late} succeeded late, "
+               f"{finished.retry_failed} failed\n", None)
+        for event in retries or ():
+            outcome = f"{event.duration/60:.2f} min" if event.succeeded else "failed"
+            logger(f"  ↻ {event.path}: {outcome}\n", None)
+    if finished.cache_hits is not None:
+        logger(f"Cache: {finished.cache_hits} hits, {finished.cache_misses} misses\n", None)
+    if stats is not None:
+        stats.log_summary(logger)
+    logger("=" * 80 + "\n", None)
+
+
+class ScanReport:
+    """Folds the events of one scan into the folder summaries and totals of its FINAL REPORT.
 
-            total_duration, video_count = calculate_total_duration_in_folder(dirpath, video_extensions, cancel_check=cancel_check, logger=logger)
+    Every consumer of iter_scan, aio.aiter_scan or a distributed.Coordinator
+    passes each event to add(). folder_summaries gets one summary per
+    FolderFinished, and the minutes of files that succeed on retry are added
+    to their folder's summary; retries holds the FileRetried events,
+    finished the ScanFinished and errors counts the ScanErrors. Folders and
+    late successes also go to tree (a tree.FolderTree, or anything with its
+    add_folder), and files to results (a results.ResultStore), if given.
+    """
+
+    def __init__(self, tree=None, results=None):
+        self.tree = tree
+        self.results = results
+        self.folder_summaries: List[Dict] = []
+        self.retries: List[FileRetried] = []
+        self.finished = ScanFinished(0, 0.0, 0, cancelled=False)
+        self.errors = 0
+        self._retrying: Dict[str, Dict] = {}
 
-            if cancel_check():
-                logger("\n⚠ Processing stopped by user\n", None)
-                return folder_summaries, grand_total_duration, total_videos
+    def add(self, event: ScanEvent):
+        if isinstance(event, FolderFinished):
+            summary = event.summary()
+            self.folder_summaries.append(summary)
+            if event.retrying:
+                self._retrying[event.path] = summary
+            if self.tree is not None:
+                self.tree.add_folder(event.path, event.duration, event.video_count)
+        elif isinstance(event, FileProbed):
+            if self.results is not None:
+                self.results.add_event(event)
+        elif isinstance(event, FileRetried):
+            self.retries.append(event)
+            if event.succeeded:
+                self._retrying[event.folder]['minutes'] += event.duration / 60
+                if self.tree is not None:
+                    self.tree.add_folder(event.folder, event.duration, 1)
+            if self.results is not None:
+                self.results.add_event(event)
+        elif isinstance(event, ScanError):
+            self.errors += 1
+        elif isinstance(event, ScanFinished):
+            self.finished = event
 
-            total_videos += video_count
-            total_duration_minutes = total_duration / 60
-            total_duration_hours = total_duration / 3600
+    def log_final_report(self, logger: Callable = None, stats=None, duplicates=None):
+        """Write the FINAL REPORT (see log_final_report), unless the scan was cancelled."""
+        if not self.finished.cancelled:
+            log_final_report(self.folder_summaries, self.finished, logger, stats, duplicates, self.retries)
 
-            logger(f"\n  Folder Summary:\n", None)
-            logger(f"  • Videos: {video_count}\n", None)
-            logger(f"  • Duration: {total_duration:.2f} sec | {total_duration_minutes:.2f} min | {total_duration_hours:.2f} hrs\n", None)
 
-            grand_total_duration += total_duration
+def calculate_total_duration_in_folder(folder_path: str,
+                                       video_extensions: List[str],
+                                       cancel_check: Callable[[], bool] = lambda: False,
+                                       logger: Callable = None,
+                                       jobs: int = None,
+                                       cache=None,
+                                       timeout: float = 10,
+                                       filters=None) -> Tuple[float, int]:
+    """Return (total_duration_seconds, video_count) in the folder.
+
+    Up to `jobs` files are probed concurrently (default: default_jobs()).
+    Only files kept by filters (a filters.ScanFilter), if given, are counted.
+    Unreadable files aren't counted; files that time out are retried after
+    the others, as by iter_scan, and counted if they succeed then.
+    """
+    logger = logger or _default_logger
 
-            folder_summaries.append({
-                'path': dirpath,
-                'name': os.path.basename(dirpath) or dirpath,
-                'minutes': total_duration_minutes
-            })
+    try:
+        entries = traversal.list_videos(folder_path, traversal.ExtensionMatcher(video_extensions), filters)
+    except Exception as e:
+        logger(f"  ⚠ Error scanning folder {folder_path}: {e}\n")
+        return 0.0, 0
 
-    if not cancel_check():
-        grand_total_minutes = grand_total_duration / 60
-        grand_total_hours = grand_total_duration / 3600
+    finished = ScanFinished(0, 0.0, 0, cancelled=False)
+    try:
+        for event in _run_scan([(folder_path, entries)], [], cancel_check, jobs or default_jobs(), cache, timeout,
+                               adaptive=timeouts.AdaptiveTimeout(timeout)):
+            if isinstance(event, (FileProbed, FileRetried, ScanError)):
+                log_event(event, logger)
+            elif isinstance(event, ScanFinished):
+                finished = event
+    except FFprobeNotFoundError:
+        log_ffprobe_missing(logger)
+        raise
 
-        logger("\n" + "=" * 80 + "\n", None)
-        logger("FINAL REPORT\n", None)
-        logger("=" * 80 + "\n\n", None)
+    return finished.total_duration, finished.total_videos
 
-        for i, folder in enumerate(folder_summaries, 1):
-            logger(f"{folder['name']}: {folder['minutes']:.2f} min\n", None)
 
-        logger("\n" + "-" * 80 + "\n", None)
-        logger(f"TOTAL: {grand_total_minutes:.2f} min ({grand_total_hours:.2f} hours)\n", None)
-        logger("=" * 80 + "\n", None)
+def traverse_and_calculate(root_folder: str,
+                           video_extensions: List[str],
+                           cancel_check: Callable[[], bool] = lambda: False,
+                           logger: Callable = None,
+                           jobs: int = None,
+                           cache=None,
+                           follow_symlinks: bool = False,
+                           timeout: float = 10,
+                           stats=None,
+                           rotational_jobs: int = None,
+                           tree=None,
+                           results=None,
+                           duplicates=None,
+                           checkpoint=None,
+                           adaptive_timeout=None,
+                           filters=None) -> Tuple[List[Dict], float, int]:
+    """Traverse root_folder, calculate durations per folder and return summaries.
+
+    Built on iter_scan (see there for jobs, rotational_jobs, cache,
+    follow_symlinks, timeout, duplicates, checkpoint, adaptive_timeout and
+    filters);
+    files that succeed on retry are added to their folder's summary. The events are
+    written to logger as a report. If a cache is given, its hit/miss counts for this
+    run are added to the final report, and so is the summary of an
+    instrument.ScanStats passed as stats. Every finished
+    folder is also added to tree (a tree.FolderTree for root_folder), if
+    given, for recursive totals, and every file to results (a
+    results.ResultStore), if given, for queries after the scan.
+
+    Returns: (folder_summaries, grand_total_seconds, total_videos)
+    folder_summaries: list of dicts with keys: path, name, minutes
+    """
+    logger = logger or _default_logger
+    report = ScanReport(tree, results)
+
+    log_scan_header(logger)
+
+    try:
+        for event in iter_scan(root_folder, video_extensions, cancel_check=cancel_check,
+                               jobs=jobs, cache=cache, follow_symlinks=follow_symlinks,
+                               timeout=timeout, stats=stats, rotational_jobs=rotational_jobs,
+                               duplicates=duplicates, checkpoint=checkpoint,
+                               adaptive_timeout=adaptive_timeout, filters=filters):
+            if stats is not None:
+                start = time.perf_counter()
+                log_event(event, logger)
+                stats.add('log', start)
+            else:
+                log_event(event, logger)
+            report.add(event)
+    except FFprobeNotFoundError:
+        log_ffprobe_missing(logger)
+        raise
 
-    return folder_summaries, grand_total_duration, total_videos
+    report.log_final_report(logger, stats, duplicates)
+    return report.folder_summaries, report.finished.total_duration, report.finished.total_videos
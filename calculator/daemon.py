@@ -0,0 +1,566 @@
+"""Long-running scan daemon with a local HTTP/JSON API and warm shared state.
+
+Tools that need durations for the same library submit scans to one
+daemon instead of each starting a fresh scan. Between requests it keeps
+probed durations (cache.MemoryCache, in front of the persistent cache if
+given) and directory listings (traversal.ListingCache), so a rescan of
+an unchanged tree costs a stat per folder and a dictionary lookup per file.
+
+Endpoints (JSON bodies; records are those of `python -m calculator scan -f ndjson`):
+
+  POST   /scans                 {"root": "/a", "extensions": [".mp4"], "follow_symlinks": false,
+                                 "timeout": 10, "exclude": [".git/"], ...} -> 202 and the job's status
+  GET    /scans                 status of every job
+  GET    /scans/<id>            status and progress of one job
+  GET    /scans/<id>/results?since=N
+                                {"records": [...], "next": M, "state": ...}: records N.. so far
+  GET    /scans/<id>/stream?since=N
+                                NDJSON, one record per line as they arrive, until the summary
+  DELETE /scans/<id>            cancel the job
+
+A job is made of flights: scans of one subtree, shared by every job that
+needs it. A job whose root lies inside a subtree being scanned for
+another job follows that flight, keeping only its own folders; a job
+whose root contains such subtrees scans the rest of its tree itself and
+takes their folders from the flights already running. Either way, each
+subtree is scanned once however many overlapping jobs ask for it, and every
+job's folders come out in the order of a local core.iter_scan. Finished
+flights aren't reused: a later job rescans, from the warm state.
+
+A scan may carry filter rules (include, exclude, min_size, max_size,
+skip_hidden, max_depth; see filters.ScanFilter). Only jobs with the same
+rules share flights, and jobs whose rules depend on the root (anchored
+patterns, regexes, max_depth) only with jobs for the same root.
+
+There is no authentication: listen on localhost only, or on a trusted
+network.
+"""
+import itertools
+import json
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from calculator import cache, cli, core, distributed, timeouts, traversal
+from calculator.filters import ScanFilter
+
+
+DEFAULT_ADDRESS = '127.0.0.1:8770'
+# Subtrees scanned at once; each has its own per-device probe pools.
+DEFAULT_FLIGHTS = 2
+# Finished jobs kept for polling; older ones are forgotten.
+MAX_FINISHED_JOBS = 100
+
+_STREAM_POLL_INTERVAL = 1.0
+
+
+def _is_under(path: str, folder: str) -> bool:
+    """Return True if path is folder or inside it."""
+    return path == folder or path.startswith(folder.rstrip(os.sep) + os.sep)
+
+
+def _pruned(filters: Optional[ScanFilter], root: str, folder: str) -> bool:
+    """Return True if filters leaves folder (root or a folder inside it) out of a scan of root."""
+    if filters is None or folder == root:
+        return False
+    names = os.path.relpath(folder, root).split(os.sep)
+    return any(not filters.keep_dir(name, '/'.join(names[:i + 1])) for i, name in enumerate(names))
+
+
+class _Flight:
+    """One scan of a subtree (recursive) or of a single folder's own videos, shared between jobs."""
+
+    def __init__(self, path: str, recursive: bool, config: Tuple):
+        self.path = path
+        self.recursive = recursive
+        self.config = config
+        # FolderFinished, ScanError and FileRetried events, in scan order. A
+        # ScanError is appended together with the event after it, so a retry's
+        # error and its FileRetried are always seen together.
+        self.events: List[core.ScanEvent] = []
+        self.done = False
+        self.cancelled = False
+        self.error: Optional[str] = None
+        self.users = 0
+        # From the flight's ScanFinished, once it has one.
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def key(self) -> Tuple:
+        return self.path, self.recursive, self.config
+
+
+class ScanJob:
+    """One submitted scan: its parts, the records produced so far and its progress.
+
+    parts are (flight, folder) pairs in traversal order; the job takes the
+    events of each flight that lie under folder. Attributes other than
+    records are safe to read at any time; read records via the daemon.
+    """
+
+    def __init__(self, job_id: str, root: str, config: Tuple):
+        self.id = job_id
+        self.root = root
+        self.config = config
+        self.parts: List[Tuple[_Flight, str]] = []
+        self.merged = False
+        self.state = 'running'
+        self.error: Optional[str] = None
+        self.cancelled = False
+        self.records: List[Dict] = []
+        self.folders = 0
+        self.videos = 0
+        self.seconds = 0.0
+        self.unreadable = 0
+        self.duplicates = 0
+        self.errors = 0
+        self.retried = 0
+        self.retry_failed = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.state != 'running'
+
+    def status(self) -> Dict:
+        extensions, follow_symlinks, timeout, filters, _ = self.config
+        return {'id': self.id, 'root': self.root, 'extensions': list(extensions),
+                'follow_symlinks': follow_symlinks, 'timeout': timeout,
+                'filters': None if filters is None else filters.to_dict(), 'state': self.state,
+                'error': self.error, 'merged': self.merged, 'parts': len(self.parts),
+                'parts_done': sum(flight.done for flight, _ in self.parts), 'folders': self.folders,
+                'videos': self.videos, 'seconds': self.seconds, 'minutes': self.seconds / 60,
+                'unreadable': self.unreadable, 'duplicates': self.duplicates, 'errors': self.errors,
+                'retried': self.retried,
+                'retry_failed': self.retry_failed, 'records': len(self.records)}
+
+
+class ScanDaemon:
+    """Runs scan jobs on shared flights and keeps the warm state between them.
+
+    duration_cache is an optional persistent cache.DurationCache behind the
+    in-memory one. jobs and rotational_jobs are as for core.iter_scan, per
+    flight; at most `flights` subtrees are scanned at once and the rest wait
+    their turn. Thread-safe; the HTTP server (see make_server) calls it from
+    one thread per request.
+    """
+
+    def __init__(self, duration_cache: cache.DurationCache = None, jobs: int = None,
+                 rotational_jobs: int = None, flights: int = DEFAULT_FLIGHTS):
+        self.cache = cache.MemoryCache(duration_cache)
+        self.listings = traversal.ListingCache()
+        self.jobs = jobs or core.default_jobs()
+        self.rotational_jobs = rotational_jobs
+        self._jobs: Dict[str, ScanJob] = {}
+        self._flights: Dict[Tuple, _Flight] = {}
+        # One per timeout, so what it learns about the probe speed carries over between jobs.
+        self._timeouts: Dict[float, timeouts.AdaptiveTimeout] = {}
+        self._ids = itertools.count(1)
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=flights, thread_name_prefix='daemon-flight')
+        self._closed = False
+
+    def submit(self, root: str, video_extensions: List[str], follow_symlinks: bool = False,
+               timeout: float = 10, filters: Optional[ScanFilter] = None) -> ScanJob:
+        """Start a job scanning root; raises ValueError if root isn't a folder or no extensions are given.
+
+        filters is an optional filters.ScanFilter for the job.
+        """
+        root = os.path.abspath(root)
+        if not os.path.isdir(root):
+            raise ValueError(f"not a folder: {root}")
+        extensions = tuple(sorted({ext.lower() for ext in video_extensions if ext}))
+        if not extensions:
+            raise ValueError("no video extensions given")
+        # Rules that depend on the root only apply as they are to scans of the same root.
+        config = (extensions, bool(follow_symlinks), float(timeout), filters,
+                  root if filters is not None and filters.anchored else None)
+
+        with self._condition:
+            if self._closed:
+                raise ValueError("the daemon is shutting down")
+            job = ScanJob(str(next(self._ids)), root, config)
+            job.parts = self._acquire(root, config, job)
+            self._jobs[job.id] = job
+            self._forget_finished_jobs()
+        threading.Thread(target=self._run_job, args=(job,), name=f'daemon-job-{job.id}', daemon=True).start()
+        return job
+
+    def _acquire(self, folder: str, config: Tuple, job: ScanJob) -> List[Tuple[_Flight, str]]:
+        """Return the (flight, folder) parts that cover folder's subtree, starting flights as needed.
+
+        Called with the condition held.
+        """
+        for flight in self._flights.values():
+            if (flight.recursive and flight.config == config and _is_under(folder, flight.path)
+                    and not _pruned(config[3], flight.path, folder)):
+                job.merged = True
+                flight.users += 1
+                return [(flight, folder)]
+
+        inside = any(flight.config == config and _is_under(flight.path, folder)
+                     for flight in self._flights.values())
+        if not inside:
+            return [(self._flight(folder, True, config), folder)]
+
+        # Some of the subtree is already being scanned: take the folder's own
+        # videos and each subfolder separately, in traversal order.
+        parts = [(self._flight(folder, False, config), folder)]
+        matcher = traversal.ExtensionMatcher(config[0])
+        try:
+            subdirs, _ = traversal.list_folder(folder, matcher, config[1], config[3], config[4], self.listings)
+        except OSError:
+            subdirs = []  # the flight for the folder's own videos reports the error
+        for entry in subdirs:
+            parts.extend(self._acquire(entry.path, config, job))
+        return parts
+
+    def _flight(self, path: str, recursive: bool, config: Tuple) -> _Flight:
+        """Return the running flight for (path, recursive, config), starting one if there is none."""
+        flight = self._flights.get((path, recursive, config))
+        if flight is None:
+            flight = _Flight(path, recursive, config)
+            self._flights[flight.key] = flight
+            self._executor.submit(self._run_flight, flight)
+        flight.users += 1
+        return flight
+
+    def _adaptive_timeout(self, timeout: float) -> timeouts.AdaptiveTimeout:
+        with self._condition:
+            adaptive = self._timeouts.get(timeout)
+            if adaptive is None:
+                adaptive = self._timeouts[timeout] = timeouts.AdaptiveTimeout(timeout)
+            return adaptive
+
+    def _run_flight(self, flight: _Flight):
+        extensions, follow_symlinks, timeout, filters, filter_root = flight.config
+        matcher = traversal.ExtensionMatcher(extensions)
+        errors: List[core.ScanError] = []
+
+        def onerror(e: OSError):
+            errors.append(core.ScanError(e.filename or flight.path, f"Error scanning folder {e.filename}: {e}"))
+
+        if flight.recursive:
+            folders = traversal.iter_video_folders(flight.path, matcher, follow_symlinks=follow_symlinks,
+                                                   onerror=onerror, listings=self.listings, filters=filters,
+                                                   filter_root=filter_root)
+        else:
+            folders = self._own_videos(flight.path, matcher, onerror, filters, filter_root)
+        held = []
+        try:
+            if not flight.cancelled:
+                for event in core._run_scan(folders, errors, lambda: flight.cancelled, self.jobs, self.cache,
+                                            timeout, rotational_jobs=self.rotational_jobs,
+                                            adaptive=self._adaptive_timeout(timeout)):
+                    if isinstance(event, core.ScanFinished):
+                        flight.cache_hits, flight.cache_misses = event.cache_hits or 0, event.cache_misses or 0
+                    if not isinstance(event, (core.FolderFinished, core.ScanError, core.FileRetried)):
+                        continue
+                    held.append(event)
+                    if not isinstance(event, core.ScanError):
+                        with self._condition:
+                            flight.events.extend(held)
+                            self._condition.notify_all()
+                        held.clear()
+        except core.FFprobeNotFoundError as e:
+            flight.error = f"ffprobe not found: {e}"
+        except Exception as e:
+            flight.error = f"scan of {flight.path} failed: {e}"
+        finally:
+            with self._condition:
+                flight.events.extend(held)
+                flight.done = True
+                if self._flights.get(flight.key) is flight:
+                    del self._flights[flight.key]
+                self._condition.notify_all()
+
+    def _own_videos(self, folder_path: str, matcher, onerror: Callable[[OSError], None],
+                    filters: Optional[ScanFilter], filter_root: Optional[str]):
+        try:
+            videos = traversal.list_videos(folder_path, matcher, filters, filter_root, self.listings)
+        except OSError as e:
+            onerror(e)
+            return
+        if videos:
+            yield folder_path, videos
+
+    def _run_job(self, job: ScanJob):
+        """Collect the events of the job's flights into its records, in order."""
+        # FileRetried events, each preceded by its ScanError if it failed again,
+        # reported after the last folder as by core.iter_scan.
+        retries: List[core.ScanEvent] = []
+        try:
+            for flight, folder in job.parts:
+                position = 0
+                while True:
+                    with self._condition:
+                        while position == len(flight.events) and not flight.done and not job.cancelled:
+                            self._condition.wait()
+                        if job.cancelled:
+                            return
+                        events = flight.events[position:]
+                        position += len(events)
+                        done = flight.done
+                    for i, event in enumerate(events):
+                        if not _is_under(event.folder if isinstance(event, core.FileRetried) else event.path,
+                                         folder):
+                            continue
+                        if isinstance(event, core.FileRetried) or (
+                                isinstance(event, core.ScanError) and i + 1 < len(events)
+                                and isinstance(events[i + 1], core.FileRetried) and events[i + 1].path == event.path):
+                            retries.append(event)
+                        else:
+                            self._add_event(job, event)
+                    if done:
+                        break
+                if flight.error or flight.cancelled:
+                    with self._condition:
+                        self._finish(job, 'failed', flight.error or "scan was cancelled")
+                    return
+            for event in retries:
+                self._add_event(job, event)
+            with self._condition:
+                self._finish(job, 'done')
+        finally:
+            self._release(job)
+
+    def _add_event(self, job: ScanJob, event: core.ScanEvent):
+        record = cli.event_record(event)
+        with self._condition:
+            if job.finished:
+                return  # cancelled meanwhile
+            if isinstance(event, core.FolderFinished):
+                job.folders += 1
+                job.videos += event.video_count
+                job.seconds += event.duration
+                job.unreadable += event.unreadable
+                job.duplicates += event.duplicates
+            elif isinstance(event, core.FileRetried):
+                job.retried += 1
+                if event.succeeded:
+                    job.videos += 1
+                    job.seconds += event.duration
+                else:
+                    job.retry_failed += 1
+                    job.unreadable += 1
+            elif isinstance(event, core.ScanError):
+                job.errors += 1
+            job.records.append(record)
+            self._condition.notify_all()
+
+    def _finish(self, job: ScanJob, state: str, error: str = None):
+        """End the job with its summary record; called with the condition held."""
+        if job.finished:
+            return
+        # Cache lookups are counted per flight, so a job that follows part of
+        # another job's flight reports those of the whole flight.
+        flights = {id(flight): flight for flight, _ in job.parts}.values()
+        job.records.append(cli.event_record(core.ScanFinished(
+            job.folders, job.seconds, job.videos, state == 'cancelled',
+            sum(flight.cache_hits for flight in flights), sum(flight.cache_misses for flight in flights),
+            job.unreadable, job.duplicates, job.retried, job.retry_failed)))
+        job.state = state
+        job.error = error
+        self._condition.notify_all()
+
+    def _release(self, job: ScanJob):
+        """Drop the job's claim on its flights; cancel the ones nobody needs any more."""
+        with self._condition:
+            for flight, _ in job.parts:
+                flight.users -= 1
+                if flight.users == 0 and not flight.done:
+                    flight.cancelled = True
+                    if self._flights.get(flight.key) is flight:
+                        del self._flights[flight.key]
+            self._condition.notify_all()
+
+    def cancel(self, job_id: str) -> Optional[ScanJob]:
+        """Cancel a job; returns it, or None if there is no such job."""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if not job.finished:
+                job.cancelled = True
+                self._finish(job, 'cancelled')
+            return job
+
+    def job(self, job_id: str) -> Optional[ScanJob]:
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[ScanJob]:
+        with self._condition:
+            return list(self._jobs.values())
+
+    def records(self, job: ScanJob, since: int = 0, wait: float = 0) -> Tuple[List[Dict], bool]:
+        """Return (records from position since on, whether the job has finished).
+
+        With wait, blocks up to that many seconds for a record to arrive.
+        """
+        with self._condition:
+            if wait and since >= len(job.records) and not job.finished:
+                self._condition.wait_for(lambda: since < len(job.records) or job.finished, timeout=wait)
+            return job.records[since:], job.finished
+
+    def _forget_finished_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def warm_state(self) -> Dict:
+        return {'durations': len(self.cache), 'listings': len(self.listings),
+                'cache_hits': self.cache.hits, 'cache_misses': self.cache.misses,
+                'listing_hits': self.listings.hits, 'listing_misses': self.listings.misses}
+
+    def close(self):
+        """Cancel every job and wait for the running flights to stop."""
+        with self._condition:
+            self._closed = True
+            jobs = [job.id for job in self._jobs.values() if not job.finished]
+        for job_id in jobs:
+            self.cancel(job_id)
+        with self._condition:
+            for flight in self._flights.values():
+                flight.cancelled = True
+        self._executor.shutdown(wait=True)
+        self.cache.flush()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'VideoDurationDaemon/1'
+
+    @property
+    def daemon(self) -> ScanDaemon:
+        return self.server.scan_daemon
+
+    def log_message(self, format, *args):
+        logger = self.server.logger
+        if logger:
+            logger(f"{self.address_string()} {format % args}\n")
+
+    def _send_json(self, status: int, body, headers: Dict[str, str] = None):
+        data = (json.dumps(body, ensure_ascii=False) + '\n').encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status: int, message: str):
+        self._send_json(status, {'error': message})
+
+    def _route(self) -> Tuple[List[str], Dict[str, List[str]]]:
+        url = urlsplit(self.path)
+        return [part for part in url.path.split('/') if part], parse_qs(url.query)
+
+    def _job(self, job_id: str) -> Optional[ScanJob]:
+        job = self.daemon.job(job_id)
+        if job is None:
+            self._error(404, f"no such job: {job_id}")
+        return job
+
+    def do_GET(self):
+        parts, query = self._route()
+        if parts == ['scans']:
+            self._send_json(200, {'jobs': [job.status() for job in self.daemon.list_jobs()],
+                                  'warm': self.daemon.warm_state()})
+            return
+        if len(parts) < 2 or parts[0] != 'scans' or len(parts) > 3:
+            self._error(404, f"no such endpoint: {self.path}")
+            return
+        job = self._job(parts[1])
+        if job is None:
+            return
+        try:
+            since = int(query.get('since', ['0'])[0])
+        except ValueError:
+            self._error(400, "since must be an integer")
+            return
+        if len(parts) == 2:
+            self._send_json(200, job.status())
+        elif parts[2] == 'results':
+            records, _ = self.daemon.records(job, since)
+            self._send_json(200, {'records': records, 'next': since + len(records), 'state': job.state})
+        elif parts[2] == 'stream':
+            self._stream(job, since)
+        else:
+            self._error(404, f"no such endpoint: {self.path}")
+
+    def _stream(self, job: ScanJob, since: int):
+        """Write the job's records as NDJSON until its summary, then close the connection."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.close_connection = True
+        try:
+            while True:
+                records, finished = self.daemon.records(job, since, wait=_STREAM_POLL_INTERVAL)
+                if records:
+                    self.wfile.write(''.join(json.dumps(record, ensure_ascii=False) + '\n'
+                                             for record in records).encode('utf-8'))
+                    self.wfile.flush()
+                    since += len(records)
+                elif finished:
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_POST(self):
+        parts, _ = self._route()
+        if parts != ['scans']:
+            self._error(404, f"no such endpoint: {self.path}")
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+            root = body['root']
+            extensions = body.get('extensions') or cli.DEFAULT_EXTENSIONS
+            if isinstance(extensions, str):
+                extensions = cli.parse_extensions(extensions)
+            timeout = float(body.get('timeout', 10))
+            if timeout <= 0:
+                raise ValueError("timeout must be positive")
+            job = self.daemon.submit(root, extensions, follow_symlinks=bool(body.get('follow_symlinks')),
+                                     timeout=timeout, filters=ScanFilter.from_dict(body))
+        except KeyError as e:
+            self._error(400, f"missing field: {e}")
+        except (ValueError, TypeError, AttributeError) as e:
+            self._error(400, str(e))
+        else:
+            self._send_json(202, job.status(), {'Location': f'/scans/{job.id}'})
+
+    def do_DELETE(self):
+        parts, _ = self._route()
+        if len(parts) != 2 or parts[0] != 'scans':
+            self._error(404, f"no such endpoint: {self.path}")
+            return
+        job = self.daemon.cancel(parts[1])
+        if job is None:
+            self._error(404, f"no such job: {parts[1]}")
+        else:
+            self._send_json(200, job.status())
+
+
+def make_server(scan_daemon: ScanDaemon, address: str = DEFAULT_ADDRESS,
+                logger: Callable = None) -> ThreadingHTTPServer:
+    """Return an HTTP server for scan_daemon bound to address ('HOST:PORT'); call serve_forever() on it."""
+    family, sockaddr = distributed.parse_address(address)
+    if family == getattr(socket, 'AF_UNIX', None):
+        raise ValueError("the daemon listens on TCP only")
+
+    class Server(ThreadingHTTPServer):
+        address_family = family
+        daemon_threads = True
+
+    server = Server(sockaddr, _Handler)
+    server.scan_daemon = scan_daemon
+    server.logger = logger
+    return server
@@ -0,0 +1,559 @@
+"""Distributed scans: a coordinator hands subtrees of a root to worker processes.
+
+Workers connect to the coordinator over TCP or a Unix socket and both sides
+speak newline-delimited JSON, one object per line:
+
+  worker -> coordinator  {"type": "hello", "version": 1, "name": "host:1234"}
+  coordinator -> worker  {"type": "scan", "root": "/a", "extensions": [".mp4"],
+                          "follow_symlinks": false, "timeout": 10, "retry_timeout": 60,
+                          "filters": {"exclude": [".git/"], ...}}
+  coordinator -> worker  {"type": "shard", "id": 3, "path": "c", "recursive": true}
+  worker -> coordinator  {"type": "folder", "shard": 3, "path": "c/d", "seconds": 60.0, "videos": 1,
+                          "unreadable": 0, "duplicates": 0, "retrying": ["slow.ts"]}
+                         {"type": "retry", "shard": 3, "path": "c/d/slow.ts", "seconds": 60.0,
+                          "source": "ffprobe", "size": 1024}
+                         {"type": "error", "shard": 3, "path": "c/e", "message": "..."}
+                         {"type": "done", "shard": 3, "cache_hits": 1, "cache_misses": 0}
+  coordinator -> worker  {"type": "exit"}
+
+Paths are relative to the root and '/'-separated ('.' is the root itself),
+so every worker can scan the tree through its own mount of it. The root's
+own videos are one shard and each top-level subfolder another; while there
+are fewer than MIN_SHARDS, every subfolder shard is split a level further
+into its own videos and one shard per subfolder (see make_shards), so a
+library whose videos sit in one big folder is still shared out. A worker
+scans one shard at a time with the core scan engine and sends every folder
+as it finishes; the results of a shard only count once its "done" arrives.
+If a worker disconnects before that, they are dropped and the shard goes
+back to the front of the queue for the next free worker. Shards are
+reported in traversal order, so the folders come out as in a local
+core.iter_scan. Files that time out are retried by the worker at the end of
+their shard; the coordinator reports all retries after the last folder.
+"filters" holds the scan's filters.ScanFilter rules (see
+ScanFilter.to_dict) or null; workers apply them relative to the root, and
+excluded top-level folders don't become shards at all.
+
+There is no authentication: listen on localhost, a Unix socket or a
+trusted network only.
+"""
+import json
+import os
+import queue
+import socket
+import stat
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from calculator import core, timeouts, traversal
+from calculator.filters import ScanFilter
+
+
+PROTOCOL_VERSION = 1
+DEFAULT_ADDRESS = '127.0.0.1:8765'
+# make_shards splits subtrees up to this many levels below the root until there are MIN_SHARDS shards.
+MIN_SHARDS = 64
+MAX_SPLIT_DEPTH = 4
+
+
+class ProtocolError(ValueError):
+    """The peer sent something that isn't part of the protocol."""
+
+
+def parse_address(text: str) -> Tuple[int, object]:
+    """Parse 'HOST:PORT', '[IPV6]:PORT' or 'unix:PATH' into (address family, socket address)."""
+    if text.startswith('unix:'):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ValueError("Unix sockets aren't supported on this platform")
+        return socket.AF_UNIX, text[len('unix:'):]
+    host, sep, port = text.rpartition(':')
+    if not sep or not port.isdigit():
+        raise ValueError(f"not a HOST:PORT or unix:PATH address: {text}")
+    if host.startswith('[') and host.endswith(']'):
+        return socket.AF_INET6, (host[1:-1], int(port))
+    return socket.AF_INET, (host or '127.0.0.1', int(port))
+
+
+def _relative(root_folder: str, path: str) -> str:
+    relative = os.path.relpath(path, root_folder)
+    return relative if relative == '.' else relative.replace(os.sep, '/')
+
+
+def _local(root_folder: str, relative: str) -> str:
+    return root_folder if relative == '.' else os.path.join(root_folder, *relative.split('/'))
+
+
+def _send(writer, record: Dict):
+    writer.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+    writer.flush()
+
+
+def _receive(reader) -> Optional[Dict]:
+    """Return the next record from reader, or None once the peer has closed the connection."""
+    line = reader.readline()
+    if not line:
+        return None
+    try:
+        record = json.loads(line.decode('utf-8'))
+        record['type']
+    except (ValueError, KeyError, TypeError):
+        raise ProtocolError(f"malformed record: {line[:80]!r}")
+    return record
+
+
+def _subfolders(root_folder: str, relative: str, follow_symlinks: bool,
+                filters: Optional[ScanFilter]) -> List[str]:
+    """Return the relative paths of the subfolders of relative that filters keeps; raises OSError."""
+    prefix = '' if relative == '.' else relative + '/'
+    subdirs = []
+    with os.scandir(_local(root_folder, relative)) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=follow_symlinks) and (
+                        filters is None or (filters.keep_dir(entry.name, prefix + entry.name)
+                                            and (not filters.stat_dirs or filters.keep_stat(entry, is_dir=True)))):
+                    subdirs.append(prefix + entry.name)
+            except OSError:
+                continue
+    return subdirs
+
+
+def make_shards(root_folder: str, follow_symlinks: bool = False,
+                onerror: Callable[[OSError], None] = None,
+                filters: Optional[ScanFilter] = None,
+                min_shards: int = MIN_SHARDS) -> List[Tuple[str, bool]]:
+    """Split root_folder into (relative path, recursive) shards, in traversal order.
+
+    The first shard is the root's own videos; every top-level subfolder that
+    filters (if given) keeps is a recursive shard of its own. While there
+    are fewer than min_shards, each recursive shard less than
+    MAX_SPLIT_DEPTH levels deep is replaced by its folder's own videos and
+    a recursive shard per subfolder, one level at a time. Subfolders that
+    can't be listed are left whole for their worker to report.
+    """
+    try:
+        subdirs = _subfolders(root_folder, '.', follow_symlinks, filters)
+    except OSError as e:
+        if onerror is not None:
+            onerror(e)
+        return []
+    shards = [('.', False)] + [(path, True) for path in subdirs]
+
+    for _ in range(1, MAX_SPLIT_DEPTH):
+        if len(shards) >= min_shards:
+            break
+        split = []
+        for path, recursive in shards:
+            if not recursive:
+                split.append((path, False))
+                continue
+            try:
+                subdirs = _subfolders(root_folder, path, follow_symlinks, filters)
+            except OSError:
+                split.append((path, True))
+                continue
+            split.append((path, False))
+            split.extend((subdir, True) for subdir in subdirs)
+        if len(split) == len(shards):
+            break
+        shards = split
+    return shards
+
+
+def _own_videos(folder_path: str, matches: Callable[[str], bool], onerror: Callable[[OSError], None],
+                filters: Optional[ScanFilter], root_folder: str):
+    try:
+        videos = traversal.list_videos(folder_path, matches, filters, root_folder)
+    except OSError as e:
+        onerror(e)
+        return
+    if videos:
+        yield folder_path, videos
+
+
+def scan_shard(root_folder: str, shard_path: str, recursive: bool, video_extensions: List[str],
+               cancel_check: Callable[[], bool] = lambda: False, jobs: int = None, cache=None,
+               follow_symlinks: bool = False, timeout: float = 10, rotational_jobs: int = None,
+               adaptive_timeout=None, filters: Optional[ScanFilter] = None):
+    """Scan one shard of root_folder locally and yield its ScanEvent records, as core.iter_scan does.
+
+    filters applies relative to root_folder, as in a scan of the whole root.
+    """
+    shard_folder = _local(root_folder, shard_path)
+    matcher = traversal.ExtensionMatcher(video_extensions)
+    errors: List[core.ScanError] = []
+
+    def onerror(e: OSError):
+        errors.append(core.ScanError(e.filename or shard_folder, f"Error scanning folder {e.filename}: {e}"))
+
+    if recursive:
+        folders = traversal.iter_video_folders(shard_folder, matcher, follow_symlinks=follow_symlinks,
+                                               onerror=onerror, filters=filters, filter_root=root_folder)
+    else:
+        folders = _own_videos(shard_folder, matcher, onerror, filters, root_folder)
+    if adaptive_timeout is None:
+        adaptive_timeout = timeouts.AdaptiveTimeout(timeout)
+    yield from core._run_scan(folders, errors, cancel_check, jobs or core.default_jobs(), cache, timeout,
+                              rotational_jobs=rotational_jobs, adaptive=adaptive_timeout)
+
+
+def _connect(address: str, connect_timeout: float) -> socket.socket:
+    """Connect to address, retrying until connect_timeout so workers may start before the coordinator."""
+    family, sockaddr = parse_address(address)
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.connect(sockaddr)
+            return sock
+        except OSError:
+            sock.close()
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.2)
+
+
+def run_worker(address: str, root_folder: str = None, jobs: int = None, cache=None,
+               rotational_jobs: int = None, connect_timeout: float = 10, name: str = None,
+               logger: Callable = None) -> int:
+    """Connect to the coordinator at address and scan the shards it sends until it says exit.
+
+    root_folder is where this machine sees the coordinator's root (default:
+    the same path). Raises OSError if the connection fails or is lost, and
+    ProtocolError if the coordinator speaks something else. Returns the
+    number of shards scanned.
+    """
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    shards = 0
+    with _connect(address, connect_timeout) as sock, sock.makefile('rb') as reader, \
+            sock.makefile('wb') as writer:
+        _send(writer, {'type': 'hello', 'version': PROTOCOL_VERSION, 'name': name})
+        config = _receive(reader)
+        if config is None:
+            return shards
+        if config['type'] != 'scan':
+            raise ProtocolError(f"expected a scan record, got {config['type']!r}")
+        root = root_folder or config['root']
+        # One for all shards, so what it learns about this machine's probe speed carries over.
+        adaptive = timeouts.AdaptiveTimeout(config['timeout'], retry_timeout=config.get('retry_timeout'))
+        try:
+            filters = ScanFilter.from_dict(config.get('filters'))
+        except ValueError as e:
+            raise ProtocolError(f"bad filters in scan record: {e}")
+
+        while True:
+            record = _receive(reader)
+            if record is None or record['type'] == 'exit':
+                return shards
+            if record['type'] != 'shard':
+                raise ProtocolError(f"expected a shard record, got {record['type']!r}")
+            shard_id, shard_path = record['id'], record['path']
+            if logger:
+                logger(f"▶ Shard {shard_id}: {shard_path}\n")
+
+            done = {'type': 'done', 'shard': shard_id, 'cache_hits': None, 'cache_misses': None}
+            events = scan_shard(root, shard_path, record['recursive'], config['extensions'], jobs=jobs,
+                                cache=cache, follow_symlinks=config['follow_symlinks'],
+                                timeout=config['timeout'], rotational_jobs=rotational_jobs,
+                                adaptive_timeout=adaptive, filters=filters)
+            try:
+                for event in events:
+                    if isinstance(event, core.FolderFinished):
+                        _send(writer, {'type': 'folder', 'shard': shard_id, 'path': _relative(root, event.path),
+                                       'seconds': event.duration, 'videos': event.video_count,
+                                       'unreadable': event.unreadable, 'duplicates': event.duplicates,
+                                       'retrying': list(event.retrying)})
+                    elif isinstance(event, core.FileRetried):
+                        _send(writer, {'type': 'retry', 'shard': shard_id, 'path': _relative(root, event.path),
+                                       'seconds': event.duration, 'source': event.source, 'size': event.size})
+                    elif isinstance(event, core.ScanError):
+                        _send(writer, {'type': 'error', 'shard': shard_id, 'path': _relative(root, event.path),
+                                       'message': event.message})
+                    elif isinstance(event, core.ScanFinished):
+                        done['cache_hits'], done['cache_misses'] = event.cache_hits, event.cache_misses
+            except core.FFprobeNotFoundError as e:
+                _send(writer, {'type': 'error', 'shard': shard_id, 'path': shard_path,
+                               'message': f"ffprobe not found on worker {name}: {e}"})
+            finally:
+                events.close()
+            _send(writer, done)
+            shards += 1
+            if logger:
+                logger(f"✓ Shard {shard_id} done\n")
+
+
+class Coordinator:
+    """Splits one scan into shards, hands them to the workers that connect and merges their results.
+
+    The listening socket is opened on construction, so workers may connect
+    before iter_scan() is called; address is the bound address (useful with
+    port 0). min_shards is passed to make_shards. Workers are served on one thread each. Use as a context
+    manager, or call close().
+    """
+
+    def __init__(self, root_folder: str, video_extensions: List[str], address: str = DEFAULT_ADDRESS,
+                 follow_symlinks: bool = False, timeout: float = 10, retry_timeout: float = None,
+                 filters: Optional[ScanFilter] = None, min_shards: int = MIN_SHARDS):
+        self.root_folder = root_folder
+        self.video_extensions = list(video_extensions)
+        self.follow_symlinks = follow_symlinks
+        self.filters = filters
+        self.min_shards = min_shards
+        self.timeout = timeout
+        self.retry_timeout = retry_timeout
+        self.reassigned = 0
+        self._shards: List[Tuple[str, bool]] = []
+        self._queue = deque()
+        self._completed = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._results = queue.Queue()
+        self._connections = set()
+
+        family, sockaddr = parse_address(address)
+        self._unix_path = sockaddr if family == getattr(socket, 'AF_UNIX', None) else None
+        if self._unix_path and os.path.exists(self._unix_path) and stat.S_ISSOCK(os.stat(self._unix_path).st_mode):
+            os.unlink(self._unix_path)  # left over from an earlier coordinator
+        self._listener = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            if family != getattr(socket, 'AF_UNIX', None):
+                self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._listener.bind(sockaddr)
+            self._listener.listen()
+        except OSError:
+            self._listener.close()
+            raise
+        if self._unix_path:
+            self.address = 'unix:' + self._unix_path
+        else:
+            host, port = self._listener.getsockname()[:2]
+            self.address = f"[{host}]:{port}" if family == socket.AF_INET6 else f"{host}:{port}"
+        self._accepter = threading.Thread(target=self._accept, name='coordinator-accept', daemon=True)
+        self._accepter.start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                return  # listener closed
+            if conn.family != getattr(socket, 'AF_UNIX', None):
+                conn.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            with self._condition:
+                if self._closed:
+                    conn.close()
+                    return
+                self._connections.add(conn)
+            threading.Thread(target=self._serve, args=(conn,), name='coordinator-worker', daemon=True).start()
+
+    def _next_shard(self) -> Optional[int]:
+        """Return the next shard to hand out, waiting while others are in flight; None once all are done."""
+        with self._condition:
+            while not self._queue:
+                if self._closed or (self._shards and self._completed == len(self._shards)):
+                    return None
+                self._condition.wait()
+            return self._queue.popleft()
+
+    def _requeue(self, shard_id: int):
+        with self._condition:
+            self.reassigned += 1
+            self._queue.appendleft(shard_id)
+            self._condition.notify()
+
+    def _serve(self, conn: socket.socket):
+        shard_id = None
+        try:
+            with conn.makefile('rb') as reader, conn.makefile('wb') as writer:
+                hello = _receive(reader)
+                if hello is None or hello['type'] != 'hello' or hello.get('version') != PROTOCOL_VERSION:
+                    return
+                _send(writer, {'type': 'scan', 'root': self.root_folder, 'extensions': self.video_extensions,
+                               'follow_symlinks': self.follow_symlinks, 'timeout': self.timeout,
+                               'retry_timeout': self.retry_timeout,
+                               'filters': None if self.filters is None else self.filters.to_dict()})
+                while True:
+                    shard_id = self._next_shard()
+                    if shard_id is None:
+                        _send(writer, {'type': 'exit'})
+                        return
+                    shard_path, recursive = self._shards[shard_id]
+                    _send(writer, {'type': 'shard', 'id': shard_id, 'path': shard_path, 'recursive': recursive})
+
+                    events: List[core.ScanEvent] = []
+                    while True:
+                        record = _receive(reader)
+                        if record is None:
+                            raise ConnectionResetError("worker disconnected")
+                        if record.get('shard') != shard_id:
+                            raise ProtocolError(f"record for shard {record.get('shard')!r}, expected {shard_id}")
+                        kind = record['type']
+                        if kind == 'folder':
+                            events.append(core.FolderFinished(_local(self.root_folder, record['path']),
+                                                              record['seconds'], record['videos'],
+                                                              record['unreadable'], record['duplicates'],
+                                                              record.get('retrying', ())))
+                        elif kind == 'retry':
+                            folder, _, name = record['path'].rpartition('/')
+                            events.append(core.FileRetried(_local(self.root_folder, folder or '.'), name,
+                                                           record['seconds'], record['source'], record['size']))
+                        elif kind == 'error':
+                            events.append(core.ScanError(_local(self.root_folder, record['path']),
+                                                         record['message']))
+                        elif kind == 'done':
+                            break
+                    self._results.put((shard_id, events, record.get('cache_hits'), record.get('cache_misses')))
+                    with self._condition:
+                        self._completed += 1
+                        self._condition.notify_all()
+                    shard_id = None
+        except (OSError, ProtocolError, KeyError, TypeError):
+            pass
+        finally:
+            with self._condition:
+                self._connections.discard(conn)
+            conn.close()
+            if shard_id is not None:
+                self._requeue(shard_id)
+
+    def iter_scan(self, cancel_check: Callable[[], bool] = lambda: False):
+        """Shard the root, wait for the workers and yield ScanEvent records in traversal order.
+
+        Every merged folder is reported as FolderStarted and FolderFinished
+        (no FileProbed: workers only send folder totals), then the
+        FileRetried of every file retried after timing out, followed by one
+        ScanFinished with the grand totals. Waits for workers as long as it
+        takes; cancel_check is polled while waiting.
+        """
+        errors: List[core.ScanError] = []
+
+        def onerror(e: OSError):
+            errors.append(core.ScanError(e.filename or self.root_folder,
+                                         f"Error scanning folder {e.filename}: {e}"))
+
+        shards = make_shards(self.root_folder, self.follow_symlinks, onerror, self.filters, self.min_shards)
+        yield from errors
+        with self._condition:
+            self._shards = shards
+            self._queue.extend(range(len(shards)))
+            self._condition.notify_all()
+
+        folder_count = 0
+        total_duration = 0.0
+        total_videos = 0
+        unreadable = 0
+        duplicate_count = 0
+        # FileRetried events, each preceded by its ScanError if it failed again.
+        retries: List[core.ScanEvent] = []
+        cache_hits = cache_misses = None
+        finished: Dict[int, List[core.ScanEvent]] = {}
+        next_shard = 0
+        cancelled = False
+        try:
+            while next_shard < len(shards):
+                if cancel_check():
+                    cancelled = True
+                    break
+                try:
+                    shard_id, events, hits, misses = self._results.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                finished[shard_id] = events
+                if hits is not None:
+                    cache_hits = (cache_hits or 0) + hits
+                    cache_misses = (cache_misses or 0) + misses
+
+                while next_shard in finished:
+                    events = finished.pop(next_shard)
+                    for i, event in enumerate(events):
+                        if isinstance(event, core.FileRetried) or (
+                                isinstance(event, core.ScanError) and i + 1 < len(events)
+                                and isinstance(events[i + 1], core.FileRetried) and events[i + 1].path == event.path):
+                            retries.append(event)
+                            continue
+                        if isinstance(event, core.FolderFinished):
+                            yield core.FolderStarted(event.path)
+                            folder_count += 1
+                            total_duration += event.duration
+                            total_videos += event.video_count
+                            unreadable += event.unreadable
+                            duplicate_count += event.duplicates
+                        yield event
+                    next_shard += 1
+        finally:
+            self.close()
+
+        retried = retry_failed = 0
+        if not cancelled:
+            for event in retries:
+                if not isinstance(event, core.FileRetried):
+                    pass
+                elif event.succeeded:
+                    retried += 1
+                    total_duration += event.duration
+                    total_videos += 1
+                else:
+                    retried += 1
+                    retry_failed += 1
+                    unreadable += 1
+                yield event
+        yield core.ScanFinished(folder_count, total_duration, total_videos, cancelled, cache_hits, cache_misses,
+                                unreadable, duplicate_count, retried, retry_failed)
+
+    def close(self):
+        """Stop listening and disconnect every worker (idle ones are told to exit first)."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+            connections = list(self._connections)
+        self._listener.close()
+        if self._unix_path:
+            try:
+                os.unlink(self._unix_path)
+            except OSError:
+                pass
+        for conn in connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def traverse_and_calculate_distributed(root_folder: str,
+                                       video_extensions: List[str],
+                                       address: str = DEFAULT_ADDRESS,
+                                       cancel_check: Callable[[], bool] = lambda: False,
+                                       logger: Callable = None,
+                                       follow_symlinks: bool = False,
+                                       timeout: float = 10,
+                                       tree=None,
+                                       filters: Optional[ScanFilter] = None) -> Tuple[List[Dict], float, int]:
+    """Like core.traverse_and_calculate, but scanned by the workers connecting to address.
+
+    Files that succeed on retry are added to their folder's summary and to tree.
+
+    Returns: (folder_summaries, grand_total_seconds, total_videos)
+    """
+    logger = logger or core._default_logger
+    report = core.ScanReport(tree)
+
+    core.log_scan_header(logger)
+    with Coordinator(root_folder, video_extensions, address, follow_symlinks, timeout,
+                     filters=filters) as coordinator:
+        logger(f"Waiting for workers on {coordinator.address}\n")
+        for event in coordinator.iter_scan(cancel_check):
+            core.log_event(event, logger)
+            report.add(event)
+
+    report.log_final_report(logger)
+    return report.folder_summaries, report.finished.total_duration, report.finished.total_videos
@@ -0,0 +1,94 @@
+import hashlib
+import os
+from typing import Dict, List, Optional, Tuple
+
+from calculator import rangeio
+
+
+# Bytes hashed at the head and at the tail of a file when matching by content.
+HASH_BYTES = 64 * 1024
+
+
+def partial_hash(file_path: str, size: int, hash_bytes: int = HASH_BYTES) -> Optional[bytes]:
+    """Return a digest of the size and the first and last hash_bytes of the file, or None if unreadable."""
+    digest = hashlib.blake2b(size.to_bytes(8, 'little'), digest_size=16)
+    try:
+        with rangeio.RangeReader(file_path, budget=2 * hash_bytes + 2 * rangeio.BLOCK_SIZE) as reader:
+            digest.update(reader.pread(0, hash_bytes))
+            if size > hash_bytes:
+                tail_start = max(hash_bytes, size - hash_bytes)
+                digest.update(reader.pread(tail_start, size - tail_start))
+    except OSError:
+        return None
+    return digest.digest()
+
+
+class DuplicateIndex:
+    """Recognises files already seen during one scan, so each is probed once.
+
+    Hardlinks (the same st_dev, st_ino) are always matched. With
+    match_content, separate copies are matched too, by size plus a
+    partial_hash(); a file is only hashed once another file of the same
+    size turns up. With exclude, duplicates add nothing to folder and scan
+    totals; otherwise they are counted like any other video. Every match is
+    kept in `duplicates` as (path, original_path).
+    """
+
+    def __init__(self, match_content: bool = False, exclude: bool = False, hash_bytes: int = HASH_BYTES):
+        self.match_content = match_content
+        self.exclude = exclude
+        self.hash_bytes = hash_bytes
+        self.duplicates: List[Tuple[str, str]] = []
+        self._by_inode: Dict[Tuple[Optional[int], int], str] = {}
+        # size -> files of that size not hashed yet (hashed when a second one turns up)
+        self._by_size: Dict[int, List[str]] = {}
+        self._by_hash: Dict[Tuple[int, bytes], str] = {}
+
+    def __len__(self) -> int:
+        return len(self.duplicates)
+
+    def _match_content(self, entry: os.DirEntry) -> Optional[str]:
+        try:
+            size = entry.stat().st_size
+        except OSError:
+            return None
+        if not size:
+            return None
+        unhashed = self._by_size.get(size)
+        if unhashed is None:
+            self._by_size[size] = [entry.path]
+            return None
+
+        for path in unhashed:
+            digest = partial_hash(path, size, self.hash_bytes)
+            if digest is not None:
+                self._by_hash.setdefault((size, digest), path)
+        unhashed.clear()
+
+        digest = partial_hash(entry.path, size, self.hash_bytes)
+        if digest is None:
+            return None
+        return self._by_hash.setdefault((size, digest), entry.path)
+
+    def check(self, entry: os.DirEntry, dev: Optional[int]) -> Optional[str]:
+        """Return the path of an earlier file identical to entry, or None if entry is the first.
+
+        dev is the st_dev of the folder entry was listed in. Files must be
+        checked in the order they are reported in.
+        """
+        try:
+            inode = entry.inode()
+        except OSError:
+            inode = 0
+        # Some filesystems (e.g. FAT on Windows) report no inode numbers.
+        key = (dev, inode) if inode else None
+        original = self._by_inode.get(key) if key else None
+        if original is None and self.match_content:
+            original = self._match_content(entry)
+            if original == entry.path:
+                original = None
+        if key:
+            self._by_inode.setdefault(key, original or entry.path)
+        if original is not None:
+            self.duplicates.append((entry.path, original))
+        return original
@@ -0,0 +1,247 @@
+"""Include/exclude rules for scans, compiled once into a fast matcher.
+
+The rules apply on top of the extension list:
+
+  exclude      patterns for folders and files to leave out; a folder that
+               matches is pruned before it is listed, with everything below it
+  include      if given, only files matching one of these patterns are scanned
+  min_size, max_size
+               file size limits in bytes (either may be None)
+  skip_hidden  leave out hidden files and folders: names starting with a dot
+               and, on Windows, those with the hidden attribute
+  max_depth    descend at most this many levels below the root (0: only the
+               root's own videos)
+
+Patterns are matched against the path relative to the scan root, with '/'
+separators. A glob without a '/' matches a name at any depth, like
+.gitignore ('node_modules', '*.part.mp4'); one with a '/' is anchored at the
+root ('Archive/2019/*'). '*' and '?' don't match '/', '**' does, and a
+trailing '/' makes a pattern match folders only ('Backup*/'). A pattern
+starting with 're:' is a regular expression searched for in the relative
+path, which ends with '/' for folders. Matching ignores case on Windows.
+"""
+import os
+import re
+import stat
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+# Folders that hold no videos worth counting but can hold millions of entries.
+COMMON_EXCLUDES = (
+    '.git/', '.hg/', '.svn/', 'node_modules/', '__pycache__/',
+    '.Trash-*/', '.Trashes/', '$RECYCLE.BIN/', 'System Volume Information/',
+    '@eaDir/', '.thumbnails/', '.cache/', '.snapshot/', '.snapshots/', '.zfs/', '#snapshot/', '#recycle/',
+)
+
+_FLAGS = re.DOTALL | (re.IGNORECASE if os.name == 'nt' else 0)
+_WINDOWS = os.name == 'nt'
+
+
+def _glob_regex(glob: str) -> str:
+    """Translate a glob into a regex for the whole relative path (see the module docstring)."""
+    anchored = '/' in glob
+    glob = glob.lstrip('/')
+    parts = [] if anchored else ['(?:.*/)?']
+    i, n = 0, len(glob)
+    while i < n:
+        c = glob[i]
+        if c == '*':
+            if glob.startswith('**', i):
+                i += 2
+                if i < n and glob[i] == '/':
+                    i += 1
+                    parts.append('(?:.*/)?')
+                else:
+                    parts.append('.*')
+                continue
+            parts.append('[^/]*')
+        elif c == '?':
+            parts.append('[^/]')
+        elif c == '[':
+            end = glob.find(']', i + 2 if glob[i + 1:i + 2] in ('!', ']') else i + 1)
+            if end < 0:
+                parts.append(re.escape(c))
+            else:
+                body = glob[i + 1:end].replace('\\', '\\\\')
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                parts.append(f'[{body}]')
+                i = end
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return ''.join(parts)
+
+
+def _compile(patterns: Iterable[str], suffix: str = '') -> Optional[Callable[[str], bool]]:
+    """Compile patterns into one predicate on a relative path, or None if there are none.
+
+    Globs are joined into a single regex; each 're:' pattern is searched
+    separately, in the relative path with suffix appended.
+    """
+    globs = []
+    regexes = []
+    for pattern in patterns:
+        if pattern.startswith('re:'):
+            try:
+                regexes.append(re.compile(pattern[3:], _FLAGS).search)
+            except re.error as e:
+                raise ValueError(f"bad regular expression {pattern[3:]!r}: {e}") from None
+        else:
+            globs.append(f'(?:{_glob_regex(pattern)})')
+    if not globs and not regexes:
+        return None
+    glob = re.compile('|'.join(globs), _FLAGS).fullmatch if globs else None
+    if not regexes:
+        return lambda relative: glob(relative) is not None
+    return lambda relative: ((glob is not None and glob(relative) is not None)
+                             or any(search(relative + suffix) is not None for search in regexes))
+
+
+def parse_size(text: str) -> int:
+    """Parse a size in bytes with an optional K, M, G or T suffix (powers of 1024), e.g. '500M'."""
+    number = text.strip().upper().rstrip('B').strip()
+    factor = 1
+    if number and number[-1] in 'KMGT':
+        factor = 1024 ** ('KMGT'.index(number[-1]) + 1)
+        number = number[:-1].strip()
+    try:
+        size = float(number) * factor
+    except ValueError:
+        raise ValueError(f"not a size: {text!r}") from None
+    if size < 0:
+        raise ValueError("a size can't be negative")
+    return int(size)
+
+
+def split_patterns(text: str) -> List[str]:
+    """Split a comma-separated pattern list, as typed into the GUI."""
+    return [pattern.strip() for pattern in text.split(',') if pattern.strip()]
+
+
+class ScanFilter:
+    """Compiled include/exclude rules for one scan; see the module docstring.
+
+    keep_dir() and keep_file() decide from the name and the relative path
+    alone, while the entries are listed; keep_stat() applies the rules that
+    need the entry's stat (sizes, and the hidden attribute on Windows) and
+    is only worth calling when stat_files or stat_dirs is set. key is equal
+    for filters with the same rules.
+    """
+
+    def __init__(self, include: Iterable[str] = (), exclude: Iterable[str] = (), min_size: int = None,
+                 max_size: int = None, skip_hidden: bool = False, max_depth: int = None):
+        self.include = tuple(include)
+        self.exclude = tuple(exclude)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.skip_hidden = skip_hidden
+        self.max_depth = max_depth
+        if max_depth is not None and max_depth < 0:
+            raise ValueError("max_depth can't be negative")
+        if min_size is not None and max_size is not None and min_size > max_size:
+            raise ValueError("min_size is larger than max_size")
+
+        self._include = _compile(self.include)
+        self._exclude_files = _compile(pattern for pattern in self.exclude if not pattern.endswith('/'))
+        self._exclude_dirs = _compile((pattern[:-1] if pattern.endswith('/') and not pattern.startswith('re:')
+                                       else pattern for pattern in self.exclude), suffix='/')
+        self.stat_files = min_size is not None or max_size is not None or (skip_hidden and _WINDOWS)
+        self.stat_dirs = skip_hidden and _WINDOWS
+
+    @property
+    def key(self):
+        return self.include, self.exclude, self.min_size, self.max_size, self.skip_hidden, self.max_depth
+
+    @property
+    def anchored(self) -> bool:
+        """True if the rules depend on where the scan root is (anchored globs, regexes or max_depth)."""
+        return self.max_depth is not None or any(pattern.startswith('re:') or '/' in pattern.rstrip('/')
+                                                 for pattern in self.include + self.exclude)
+
+    def __eq__(self, other):
+        return isinstance(other, ScanFilter) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        rules = ', '.join(f'{name}={value!r}' for name, value in self.to_dict().items())
+        return f'ScanFilter({rules})'
+
+    def keep_dir(self, name: str, relative: str) -> bool:
+        """Return True if the folder at relative (path below the root, '/'-separated) is to be scanned."""
+        if self.skip_hidden and name.startswith('.'):
+            return False
+        if self.max_depth is not None and relative.count('/') >= self.max_depth:
+            return False
+        return self._exclude_dirs is None or not self._exclude_dirs(relative)
+
+    def keep_file(self, name: str, relative: str) -> bool:
+        """Return True if the file at relative (path below the root, '/'-separated) is to be scanned."""
+        if self.skip_hidden and name.startswith('.'):
+            return False
+        if self._exclude_files is not None and self._exclude_files(relative):
+            return False
+        return self._include is None or self._include(relative)
+
+    def keep_stat(self, entry, is_dir: bool = False) -> bool:
+        """Apply the rules that need entry.stat(); entries that can't be stat'ed are kept."""
+        try:
+            st = entry.stat()
+        except OSError:
+            return True
+        if self.skip_hidden and getattr(st, 'st_file_attributes', 0) & stat.FILE_ATTRIBUTE_HIDDEN:
+            return False
+        if is_dir:
+            return True
+        if self.min_size is not None and st.st_size < self.min_size:
+            return False
+        return self.max_size is None or st.st_size <= self.max_size
+
+    def to_dict(self) -> Dict:
+        """Return the rules as a JSON-serialisable dict (see from_dict)."""
+        return {'include': list(self.include), 'exclude': list(self.exclude), 'min_size': self.min_size,
+                'max_size': self.max_size, 'skip_hidden': self.skip_hidden, 'max_depth': self.max_depth}
+
+    @classmethod
+    def from_dict(cls, rules: Optional[Dict]) -> Optional['ScanFilter']:
+        """Build a filter from to_dict() output, or None if it sets no rules; raises ValueError if invalid.
+
+        Other keys are ignored. Pattern lists may also be comma-separated
+        strings, and sizes strings such as '500M' (see parse_size).
+        """
+        if rules is None:
+            return None
+        if not isinstance(rules, dict):
+            raise ValueError("filter rules must be an object")
+        include, exclude = (_patterns(rules.get(name), name) for name in ('include', 'exclude'))
+        min_size, max_size = (_size(rules.get(name), name) for name in ('min_size', 'max_size'))
+        max_depth = rules.get('max_depth')
+        if max_depth is not None and (isinstance(max_depth, bool) or not isinstance(max_depth, int)):
+            raise ValueError("max_depth must be an integer")
+        skip_hidden = bool(rules.get('skip_hidden'))
+        if not include and not exclude and not skip_hidden and min_size is None and max_size is None \
+                and max_depth is None:
+            return None
+        return cls(include, exclude, min_size, max_size, skip_hidden, max_depth)
+
+
+def _patterns(value, name: str) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return split_patterns(value)
+    if not isinstance(value, (list, tuple)) or not all(isinstance(pattern, str) for pattern in value):
+        raise ValueError(f"{name} must be a list of patterns")
+    return [pattern for pattern in value if pattern]
+
+
+def _size(value, name: str) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return parse_size(value)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ValueError(f"{name} must be a size in bytes")
+    return int(value)
@@ -0,0 +1,126 @@
+import struct
+from typing import Optional, Tuple
+
+from calculator import rangeio
+
+
+EXTENSIONS = ('.flv',)
+
+# onMetaData is the first tag; keyframe tables can make it a few hundred KB.
+SCAN_BUDGET = 512 * 1024
+
+SCRIPT_DATA_TAG = 18
+
+_AMF_NUMBER = 0x00
+_AMF_BOOLEAN = 0x01
+_AMF_STRING = 0x02
+_AMF_OBJECT = 0x03
+_AMF_NULL = 0x05
+_AMF_UNDEFINED = 0x06
+_AMF_ECMA_ARRAY = 0x08
+_AMF_OBJECT_END = 0x09
+_AMF_STRICT_ARRAY = 0x0A
+_AMF_DATE = 0x0B
+_AMF_LONG_STRING = 0x0C
+
+
+class _AmfReader:
+    """Minimal AMF0 reader over a bytes buffer; raises IndexError/struct.error on truncation."""
+
+    def __init__(self, data: bytes, pos: int):
+        self.data = data
+        self.pos = pos
+
+    def _take(self, n: int) -> bytes:
+        chunk = self.data[self.pos:self.pos + n]
+        if len(chunk) < n:
+            raise IndexError('truncated AMF data')
+        self.pos += n
+        return chunk
+
+    def read_key(self) -> str:
+        length = struct.unpack('>H', self._take(2))[0]
+        return self._take(length).decode('utf-8', 'replace')
+
+    def read_value(self, depth: int = 0):
+        if depth > 16:
+            raise ValueError('AMF nesting too deep')
+        marker = self._take(1)[0]
+        if marker == _AMF_NUMBER:
+            return struct.unpack('>d', self._take(8))[0]
+        if marker == _AMF_BOOLEAN:
+            return bool(self._take(1)[0])
+        if marker == _AMF_STRING:
+            return self.read_key()
+        if marker == _AMF_LONG_STRING:
+            length = struct.unpack('>I', self._take(4))[0]
+            return self._take(length).decode('utf-8', 'replace')
+        if marker in (_AMF_NULL, _AMF_UNDEFINED):
+            return None
+        if marker == _AMF_DATE:
+            self._take(10)
+            return None
+        if marker in (_AMF_OBJECT, _AMF_ECMA_ARRAY):
+            if marker == _AMF_ECMA_ARRAY:
+                self._take(4)
+            return self.read_properties(depth)
+        if marker == _AMF_STRICT_ARRAY:
+            count = struct.unpack('>I', self._take(4))[0]
+            return [self.read_value(depth + 1) for _ in range(count)]
+        raise ValueError(f'unsupported AMF marker {marker:#x}')
+
+    def read_properties(self, depth: int) -> dict:
+        properties = {}
+        while True:
+            key = self.read_key()
+            if not key and self.data[self.pos:self.pos + 1] == bytes([_AMF_OBJECT_END]):
+                self.pos += 1
+                return properties
+            properties[key] = self.read_value(depth + 1)
+            # Duration is all we need; stop before walking large keyframe tables.
+            if key == 'duration' and depth == 0:
+                return properties
+
+
+def parse_duration(f: rangeio.RangeReader) -> Optional[Tuple[float, bool]]:
+    """Like read_duration, reading through an open RangeReader."""
+    try:
+        header = f.pread(0, 9)
+        if len(header) < 9 or header[:3] != b'FLV':
+            return None
+        header_size = struct.unpack_from('>I', header, 5)[0]
+        pos = header_size + 4  # skip PreviousTagSize0
+
+        tag = f.pread(pos, 11)
+        tag_type = tag[0] & 0x1F
+        if tag_type != SCRIPT_DATA_TAG:
+            return None
+        data_size = int.from_bytes(tag[1:4], 'big')
+        # Only the script tag itself is read, capped at SCAN_BUDGET.
+        data = f.pread(0, min(pos + 11 + data_size, SCAN_BUDGET))
+        reader = _AmfReader(data, pos + 11)
+
+        if reader.read_value() != 'onMetaData':
+            return None
+        metadata = reader.read_value()
+    except (IndexError, ValueError, struct.error, OSError):
+        return None
+
+    duration = metadata.get('duration') if isinstance(metadata, dict) else None
+    if not isinstance(duration, float) or not duration > 0:
+        return None
+    return duration, True
+
+
+def read_duration(file_path: str) -> Optional[Tuple[float, bool]]:
+    """Return the duration stored in the onMetaData script tag.
+
+    Only the header and the first tag are read, at most SCAN_BUDGET bytes.
+    Returns (seconds, exact) or None when the metadata is missing or reports
+    no duration (live streams).
+    """
+    try:
+        with rangeio.RangeReader(file_path) as f:
+            return parse_duration(f)
+    except OSError:
+        return None
@@ -0,0 +1,114 @@
+import bisect
+import collections
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List
+
+
+# Upper bounds (ms) of the per-file latency histogram buckets; the last bucket is open-ended.
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+# Phases in report order: directory listing, cache lookups, native header
+# reads, ffprobe process spawn, ffprobe runtime, ffprobe JSON parsing and the
+# consumer writing the report.
+PHASES = ('list', 'cache', 'native', 'spawn', 'ffprobe', 'parse', 'log')
+
+
+class ScanStats:
+    """Opt-in timers, counters and latency histograms for one scan.
+
+    Pass an instance as stats= to the scan functions. Code paths only check
+    `stats is not None`, so scans without it pay nothing beyond that check.
+    With trace=True every timed span is also kept for export in Chrome
+    trace-event format (chrome://tracing, Perfetto).
+    """
+
+    def __init__(self, trace: bool = False):
+        self.trace = trace
+        self.counters = collections.Counter()
+        self.phase_calls = collections.Counter()
+        self.phase_seconds = collections.defaultdict(float)
+        self.latency_histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.trace_events: List[Dict] = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, start: float, file_path: str = None) -> float:
+        """Record a span of phase from perf_counter() value start until now; returns now."""
+        end = time.perf_counter()
+        with self._lock:
+            self.phase_calls[phase] += 1
+            self.phase_seconds[phase] += end - start
+            if self.trace:
+                event = {'name': phase, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                         'ts': (start - self._origin) * 1e6, 'dur': (end - start) * 1e6}
+                if file_path is not None:
+                    event['args'] = {'file': file_path}
+                self.trace_events.append(event)
+        return end
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def observe_file(self, seconds: float):
+        """Add one file's end-to-end probe latency to the histogram."""
+        bucket = bisect.bisect_right(LATENCY_BUCKETS_MS, seconds * 1000)
+        with self._lock:
+            self.latency_histogram[bucket] += 1
+
+    def chrome_trace(self) -> Dict:
+        with self._lock:
+            events = list(self.trace_events)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, path: str):
+        """Write the recorded spans as a Chrome trace-event JSON file."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f)
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'phases': {phase: {'calls': self.phase_calls[phase], 'seconds': self.phase_seconds[phase]}
+                           for phase in self._phase_order()},
+                'latency_histogram_ms': {label: count for label, count
+                                         in zip(self._bucket_labels(), self.latency_histogram)},
+            }
+
+    def _phase_order(self) -> List[str]:
+        return [p for p in PHASES if p in self.phase_calls] + sorted(set(self.phase_calls) - set(PHASES))
+
+    @staticmethod
+    def _bucket_labels() -> List[str]:
+        labels = [f"<{bound}" for bound in LATENCY_BUCKETS_MS]
+        labels.append(f">={LATENCY_BUCKETS_MS[-1]}")
+        return labels
+
+    def log_summary(self, logger: Callable):
+        """Write the instrumentation block appended to the FINAL REPORT."""
+        data = self.as_dict()
+        logger("\n" + "-" * 80 + "\n", None)
+        logger("INSTRUMENTATION\n", None)
+        logger("-" * 80 + "\n", None)
+
+        for phase, values in data['phases'].items():
+            calls, seconds = values['calls'], values['seconds']
+            average_ms = seconds / calls * 1000 if calls else 0.0
+            logger(f"  {phase:<8} {calls:>9} calls {seconds:>10.3f} s  avg {average_ms:>9.3f} ms\n", None)
+
+        if data['counters']:
+            counters = ', '.join(f"{name}={value}" for name, value in sorted(data['counters'].items()))
+            logger(f"  counters: {counters}\n", None)
+
+        total = sum(self.latency_histogram)
+        if total:
+            logger("  per-file latency (ms):\n", None)
+            peak = max(self.latency_histogram)
+            for label, count in data['latency_histogram_ms'].items():
+                if count:
+                    bar = '#' * max(1, round(count / peak * 40))
+                    logger(f"    {label:>7} {count:>9} {bar}\n", None)
@@ -0,0 +1,185 @@
+"""Append-only on-disk journal for bulk folder renames.
+
+One JSON object per line:
+  {"type": "plan", "version": 1, "created": <unix time>, "count": N}
+  {"type": "op", "id": 0, "parent": "/a", "old": "B", "new": "B (5 min)"}
+  {"type": "begin"}
+  {"type": "done" | "error" | "reverted" | "revert_error", "id": 0, ...}
+  {"type": "end"} or {"type": "revert_end"}
+
+The plan is written and fsynced before the first rename ("begin"); a
+journal without it was never acted on. Status records are flushed as they
+are written and fsynced in batches, so after a crash the last few ops may
+have no record; they are resolved by checking which of the two names
+exists on disk. A record torn by a crash mid-write is ignored on load.
+"""
+import json
+import os
+import time
+from typing import Dict, List
+
+
+JOURNAL_VERSION = 1
+_SYNC_EVERY = 1000
+
+
+class JournalError(ValueError):
+    """The file isn't a rename journal."""
+
+
+class RenameOp:
+    """Rename parent/old_name to parent/new_name; id is its position in the plan."""
+
+    __slots__ = ('id', 'parent', 'old_name', 'new_name')
+
+    def __init__(self, op_id: int, parent: str, old_name: str, new_name: str):
+        self.id = op_id
+        self.parent = parent
+        self.old_name = old_name
+        self.new_name = new_name
+
+    @property
+    def old_path(self) -> str:
+        return os.path.join(self.parent, self.old_name)
+
+    @property
+    def new_path(self) -> str:
+        return os.path.join(self.parent, self.new_name)
+
+    @property
+    def depth(self) -> int:
+        return self.parent.count(os.sep)
+
+    def history_entry(self) -> Dict:
+        """Return the rename_history entry used by renamer.revert_renames."""
+        return {'old_path': self.old_path, 'new_path': self.new_path,
+                'old_name': self.old_name, 'new_name': self.new_name}
+
+    def __repr__(self):
+        return f"RenameOp({self.id!r}, {self.parent!r}, {self.old_name!r}, {self.new_name!r})"
+
+
+def default_journal_dir() -> str:
+    """Return the per-user folder rename journals are kept in (next to the duration cache)."""
+    from calculator import cache
+    return os.path.join(os.path.dirname(cache.default_cache_path()), 'journals')
+
+
+def new_journal_path(directory: str = None) -> str:
+    """Return an unused, timestamped journal path in directory (default: default_journal_dir())."""
+    directory = directory or default_journal_dir()
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, time.strftime('rename-%Y%m%d-%H%M%S'))
+    path = base + '.jsonl'
+    suffix = 1
+    while os.path.exists(path):
+        suffix += 1
+        path = f"{base}-{suffix}.jsonl"
+    return path
+
+
+class RenameJournal:
+    """An open rename journal: the planned ops, their last recorded status, and an append handle.
+
+    status maps op id to the type of its latest status record; ops that
+    have none are missing from it.
+    """
+
+    def __init__(self, path: str, ops: List[RenameOp], status: Dict[int, str], begun: bool, finished: bool):
+        self.path = path
+        self.ops = ops
+        self.status = status
+        self.begun = begun
+        self.finished = finished
+        self._file = open(path, 'a', encoding='utf-8')
+        self._unsynced = 0
+
+    @classmethod
+    def create(cls, path: str, ops: List[RenameOp]) -> 'RenameJournal':
+        """Write the plan for ops to a new journal at path and sync it to disk."""
+        with open(path, 'x', encoding='utf-8') as f:
+            f.write(json.dumps({'type': 'plan', 'version': JOURNAL_VERSION, 'created': time.time(),
+                                'count': len(ops)}) + '\n')
+            for op in ops:
+                f.write(json.dumps({'type': 'op', 'id': op.id, 'parent': op.parent, 'old': op.old_name,
+                                    'new': op.new_name}, ensure_ascii=False) + '\n')
+            f.write('{"type": "begin"}\n')
+            f.flush()
+            os.fsync(f.fileno())
+        return cls(path, ops, {}, begun=True, finished=False)
+
+    @classmethod
+    def load(cls, path: str) -> 'RenameJournal':
+        """Read the journal at path, skipping records torn by a crash."""
+        ops: List[RenameOp] = []
+        status: Dict[int, str] = {}
+        begun = finished = False
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().split('\n')
+
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                kind = record['type']
+            except (ValueError, KeyError, TypeError):
+                if number == 1:
+                    raise JournalError(f"{path}: not a rename journal")
+                continue
+
+            if number == 1:
+                if kind != 'plan' or record.get('version') != JOURNAL_VERSION:
+                    raise JournalError(f"{path}: not a version {JOURNAL_VERSION} rename journal")
+            elif kind == 'op':
+                ops.append(RenameOp(record['id'], record['parent'], record['old'], record['new']))
+            elif kind == 'begin':
+                begun = True
+            elif kind in ('end', 'revert_end'):
+                finished = kind == 'end'
+            else:
+                status[record['id']] = kind
+
+        if not ops and not begun:
+            raise JournalError(f"{path}: no rename plan found")
+        journal = cls(path, ops, status, begun, finished)
+        if lines[-1]:
+            # Terminate the partial line so later records start on their own.
+            journal._file.write('\n')
+        return journal
+
+    def record(self, kind: str, op: RenameOp, message: str = None):
+        """Append a status record for op; fsynced every _SYNC_EVERY records."""
+        record = {'type': kind, 'id': op.id}
+        if message:
+            record['message'] = message
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        self.status[op.id] = kind
+        self._unsynced += 1
+        if self._unsynced >= _SYNC_EVERY:
+            self.sync()
+
+    def mark(self, kind: str):
+        """Append an 'end' or 'revert_end' marker and sync."""
+        self._file.write(json.dumps({'type': kind}) + '\n')
+        self.finished = kind == 'end'
+        self.sync()
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
@@ -0,0 +1,172 @@
+import struct
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from calculator import rangeio
+
+
+EXTENSIONS = ('.mkv', '.webm', '.mka', '.mk3d')
+
+EBML_ID = 0x1A45DFA3
+SEGMENT_ID = 0x18538067
+SEEK_HEAD_ID = 0x114D9B74
+SEEK_ID = 0x4DBB
+SEEK_ENTRY_ID = 0x53AB
+SEEK_POSITION_ID = 0x53AC
+INFO_ID = 0x1549A966
+TIMECODE_SCALE_ID = 0x2AD7B1
+DURATION_ID = 0x4489
+CLUSTER_ID = 0x1F43B675
+
+DEFAULT_TIMECODE_SCALE = 1_000_000
+UNKNOWN_SIZE = -1
+
+_MAX_ELEMENTS = 4096
+
+
+def _read_vint(f: BinaryIO, keep_marker: bool) -> Optional[Tuple[int, int]]:
+    """Read an EBML variable-length integer. Returns (value, length) or None."""
+    first = f.read(1)
+    if not first:
+        return None
+    first = first[0]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        length += 1
+        mask >>= 1
+    if length > 8:
+        return None
+
+    rest = f.read(length - 1)
+    if len(rest) < length - 1:
+        return None
+
+    value = first if keep_marker else first & (mask - 1)
+    for byte in rest:
+        value = (value << 8) | byte
+    return value, length
+
+
+def _read_element_header(f: BinaryIO) -> Optional[Tuple[int, int, int]]:
+    """Read an element header. Returns (element_id, data_start, data_size).
+
+    data_size is UNKNOWN_SIZE for live-style elements that don't declare one.
+    """
+    element_id = _read_vint(f, keep_marker=True)
+    size = _read_vint(f, keep_marker=False)
+    if element_id is None or size is None:
+        return None
+    value, length = size
+    if value == (1 << (7 * length)) - 1:
+        value = UNKNOWN_SIZE
+    return element_id[0], f.tell(), value
+
+
+def _iter_children(f: BinaryIO, start: int, end: Optional[int]):
+    """Yield (element_id, data_start, data_size) for children in [start, end)."""
+    f.seek(start)
+    for _ in range(_MAX_ELEMENTS):
+        if end is not None and f.tell() >= end:
+            return
+        header = _read_element_header(f)
+        if header is None:
+            return
+        yield header
+        element_id, data_start, data_size = header
+        if data_size == UNKNOWN_SIZE:
+            return
+        f.seek(data_start + data_size)
+
+
+def _read_uint(f: BinaryIO, data_start: int, size: int) -> int:
+    f.seek(data_start)
+    return int.from_bytes(f.read(size), 'big')
+
+
+def _read_float(f: BinaryIO, data_start: int, size: int) -> Optional[float]:
+    f.seek(data_start)
+    data = f.read(size)
+    if size == 4 and len(data) == 4:
+        return struct.unpack('>f', data)[0]
+    if size == 8 and len(data) == 8:
+        return struct.unpack('>d', data)[0]
+    return None
+
+
+def _parse_info(f: BinaryIO, data_start: int, data_size: int) -> Optional[Tuple[float, bool]]:
+    timecode_scale = DEFAULT_TIMECODE_SCALE
+    duration = None
+    end = None if data_size == UNKNOWN_SIZE else data_start + data_size
+    for element_id, child_start, child_size in _iter_children(f, data_start, end):
+        if element_id == TIMECODE_SCALE_ID and 0 < child_size <= 8:
+            timecode_scale = _read_uint(f, child_start, child_size) or DEFAULT_TIMECODE_SCALE
+        elif element_id == DURATION_ID:
+            duration = _read_float(f, child_start, child_size)
+
+    if duration is None or not duration > 0:
+        return None
+    return duration * timecode_scale / 1e9, True
+
+
+def _parse_seek_head(f: BinaryIO, data_start: int, data_size: int) -> Dict[int, int]:
+    """Return {element_id: offset relative to the segment data} from a SeekHead."""
+    positions = {}
+    for element_id, seek_start, seek_size in _iter_children(f, data_start, data_start + data_size):
+        if element_id != SEEK_ID or seek_size == UNKNOWN_SIZE:
+            continue
+        target_id = target_pos = None
+        for child_id, child_start, child_size in _iter_children(f, seek_start, seek_start + seek_size):
+            if child_id == SEEK_ENTRY_ID and 0 < child_size <= 4:
+                target_id = _read_uint(f, child_start, child_size)
+            elif child_id == SEEK_POSITION_ID and 0 < child_size <= 8:
+                target_pos = _read_uint(f, child_start, child_size)
+        if target_id is not None and target_pos is not None:
+            positions[target_id] = target_pos
+    return positions
+
+
+def parse_duration(f: rangeio.RangeReader) -> Optional[Tuple[float, bool]]:
+    """Like read_duration, reading through an open RangeReader."""
+    try:
+        header = _read_element_header(f)
+        if header is None or header[0] != EBML_ID or header[2] == UNKNOWN_SIZE:
+            return None
+        f.seek(header[1] + header[2])
+
+        segment = _read_element_header(f)
+        if segment is None or segment[0] != SEGMENT_ID:
+            return None
+        _, segment_start, segment_size = segment
+        segment_end = None if segment_size == UNKNOWN_SIZE else segment_start + segment_size
+
+        seek_positions = {}
+        for element_id, data_start, data_size in _iter_children(f, segment_start, segment_end):
+            if element_id == INFO_ID:
+                return _parse_info(f, data_start, data_size)
+            if element_id == SEEK_HEAD_ID and data_size != UNKNOWN_SIZE:
+                seek_positions.update(_parse_seek_head(f, data_start, data_size))
+            elif element_id == CLUSTER_ID:
+                break
+
+        if INFO_ID in seek_positions:
+            f.seek(segment_start + seek_positions[INFO_ID])
+            info = _read_element_header(f)
+            if info is not None and info[0] == INFO_ID:
+                return _parse_info(f, info[1], info[2])
+        return None
+    except (OSError, struct.error, OverflowError, ValueError):
+        return None
+
+
+def read_duration(file_path: str) -> Optional[Tuple[float, bool]]:
+    """Return (seconds, exact) from Segment/Info/Duration, or None if it can't be read.
+
+    Only element headers, the SeekHead and the Info element are read; if
+    Clusters come before Info, the SeekHead is used to jump to it. Live-style
+    files without a Duration element return None.
+    """
+    try:
+        with rangeio.RangeReader(file_path) as f:
+            return parse_duration(f)
+    except OSError:
+        return None
@@ -0,0 +1,105 @@
+import struct
+from typing import BinaryIO, Optional, Tuple
+
+from calculator import rangeio
+
+
+EXTENSIONS = ('.mp4', '.m4v', '.mov', '.3gp')
+
+# Guard against corrupt files that would otherwise make us walk forever.
+_MAX_BOXES = 4096
+
+
+def _read_box_header(f: BinaryIO, end: int) -> Optional[Tuple[bytes, int, int]]:
+    """Read the box header at the current position.
+
+    Returns (box_type, payload_start, box_end) or None at the end of the range.
+    """
+    start = f.tell()
+    if start + 8 > end:
+        return None
+    header = f.read(8)
+    if len(header) < 8:
+        return None
+
+    size, box_type = struct.unpack('>I4s', header)
+    if size == 1:
+        largesize = f.read(8)
+        if len(largesize) < 8:
+            return None
+        size = struct.unpack('>Q', largesize)[0]
+        header_size = 16
+    elif size == 0:
+        size = end - start
+        header_size = 8
+    else:
+        header_size = 8
+
+    if size < header_size or start + size > end:
+        return None
+    return box_type, start + header_size, start + size
+
+
+def _find_box(f: BinaryIO, box_type: bytes, start: int, end: int) -> Optional[Tuple[int, int]]:
+    """Return (payload_start, box_end) of the first box_type child in [start, end)."""
+    f.seek(start)
+    for _ in range(_MAX_BOXES):
+        header = _read_box_header(f, end)
+        if header is None:
+            return None
+        found_type, payload_start, box_end = header
+        if found_type == box_type:
+            return payload_start, box_end
+        f.seek(box_end)
+    return None
+
+
+def _parse_mvhd(payload: bytes) -> Optional[float]:
+    if len(payload) < 4:
+        return None
+    version = payload[0]
+    if version == 1:
+        if len(payload) < 32:
+            return None
+        timescale, duration = struct.unpack_from('>IQ', payload, 20)
+        unknown = 0xFFFFFFFFFFFFFFFF
+    else:
+        if len(payload) < 20:
+            return None
+        timescale, duration = struct.unpack_from('>II', payload, 12)
+        unknown = 0xFFFFFFFF
+
+    # Fragmented files leave the movie duration at 0 (or all ones); those need ffprobe.
+    if timescale == 0 or duration == 0 or duration == unknown:
+        return None
+    return duration / timescale
+
+
+def parse_duration(f: rangeio.RangeReader) -> Optional[Tuple[float, bool]]:
+    """Like read_duration, reading through an open RangeReader."""
+    try:
+        moov = _find_box(f, b'moov', 0, f.size)
+        if moov is None:
+            return None
+        mvhd = _find_box(f, b'mvhd', *moov)
+        if mvhd is None:
+            return None
+        payload_start, box_end = mvhd
+        f.seek(payload_start)
+        duration = _parse_mvhd(f.read(min(box_end - payload_start, 32)))
+        return None if duration is None else (duration, True)
+    except (OSError, struct.error):
+        return None
+
+
+def read_duration(file_path: str) -> Optional[Tuple[float, bool]]:
+    """Return (seconds, exact) from moov/mvhd, or None if it can't be read.
+
+    Only box headers and the mvhd payload are read; mdat and other boxes are
+    skipped by seeking, so moov may sit anywhere in the file.
+    """
+    try:
+        with rangeio.RangeReader(file_path) as f:
+            return parse_duration(f)
+    except OSError:
+        return None
@@ -0,0 +1,133 @@
+from typing import Dict, Optional, Tuple
+
+from calculator import rangeio
+
+
+EXTENSIONS = ('.ts', '.m2ts', '.mts')
+
+# Bytes scanned at each end of the file; a PCR is normally sent every <100 ms.
+SCAN_BUDGET = 1 << 20
+
+SYNC_BYTE = 0x47
+CLOCK_HZ = 90_000
+_WRAP = 1 << 33
+
+
+def _is_synced(data: bytes, offset: int, packet_size: int, packets: int = 4) -> bool:
+    return all(offset + k * packet_size < len(data) and data[offset + k * packet_size] == SYNC_BYTE
+               for k in range(packets))
+
+
+def _find_layout(data: bytes) -> Optional[Tuple[int, int]]:
+    """Return (first_sync_offset, packet_size) for 188-byte TS or 192-byte M2TS."""
+    for packet_size, prefix in ((188, 0), (192, 4)):
+        for offset in range(prefix, min(len(data), packet_size + prefix)):
+            if _is_synced(data, offset, packet_size):
+                return offset, packet_size
+    return None
+
+
+def _resync(data: bytes, offset: int, packet_size: int) -> Optional[int]:
+    for candidate in range(offset, min(len(data), offset + packet_size * 8)):
+        if _is_synced(data, candidate, packet_size, packets=2):
+            return candidate
+    return None
+
+
+def _packet_times(data: bytes, offset: int, packet_size: int):
+    """Yield (pid, kind, ticks) for each PCR and PES PTS in the buffer.
+
+    kind is 'pcr' or 'pts'; ticks are 90 kHz clock values.
+    """
+    end = len(data) - 188
+    while offset <= end:
+        if data[offset] != SYNC_BYTE:
+            # Lost sync (e.g. a partial packet at the start of the tail): resync.
+            offset = _resync(data, offset + 1, packet_size)
+            if offset is None:
+                return
+            continue
+
+        pid = ((data[offset + 1] & 0x1F) << 8) | data[offset + 2]
+        payload_start = data[offset + 1] & 0x40
+        adaptation = (data[offset + 3] >> 4) & 0x3
+        pos = offset + 4
+
+        if adaptation & 0x2:
+            length = data[pos]
+            if length >= 7 and data[pos + 1] & 0x10:
+                b = data[pos + 2:pos + 7]
+                pcr = (b[0] << 25) | (b[1] << 17) | (b[2] << 9) | (b[3] << 1) | (b[4] >> 7)
+                yield pid, 'pcr', pcr
+            pos += 1 + length
+
+        if adaptation & 0x1 and payload_start and pos + 14 <= offset + 188:
+            if data[pos:pos + 3] == b'\x00\x00\x01' and data[pos + 7] & 0x80:
+                b = data[pos + 9:pos + 14]
+                pts = (((b[0] >> 1) & 0x7) << 30) | (b[1] << 22) | ((b[2] >> 1) << 15) | (b[3] << 7) | (b[4] >> 1)
+                yield pid, 'pts', pts
+
+        offset += packet_size
+
+
+def _first_times(data: bytes, offset: int, packet_size: int) -> Dict[Tuple[int, str], int]:
+    first = {}
+    for pid, kind, ticks in _packet_times(data, offset, packet_size):
+        first.setdefault((pid, kind), ticks)
+    return first
+
+
+def _last_times(data: bytes, offset: int, packet_size: int) -> Dict[Tuple[int, str], int]:
+    last = {}
+    for pid, kind, ticks in _packet_times(data, offset, packet_size):
+        last[(pid, kind)] = ticks
+    return last
+
+
+def parse_duration(f: rangeio.RangeReader) -> Optional[Tuple[float, bool]]:
+    """Like read_duration, reading through an open RangeReader."""
+    try:
+        head = f.pread(0, SCAN_BUDGET)
+        layout = _find_layout(head)
+        if layout is None:
+            return None
+        offset, packet_size = layout
+
+        if f.size <= 2 * SCAN_BUDGET:
+            tail = f.pread(0, f.size)
+            tail_offset = offset
+        else:
+            # Align the tail read to the packet grid established at the head.
+            tail_start = f.size - SCAN_BUDGET
+            tail_start -= (tail_start - offset) % packet_size
+            tail = f.pread(tail_start, f.size - tail_start)
+            tail_offset = 0
+    except OSError:
+        return None
+
+    first = _first_times(head, offset, packet_size)
+    last = _last_times(tail, tail_offset, packet_size)
+
+    # PCR is the system clock and preferred; PES PTS is the fallback.
+    for kind in ('pcr', 'pts'):
+        for key, start in first.items():
+            if key[1] != kind or key not in last:
+                continue
+            ticks = (last[key] - start) % _WRAP
+            if ticks > 0:
+                return ticks / CLOCK_HZ, False
+    return None
+
+
+def read_duration(file_path: str) -> Optional[Tuple[float, bool]]:
+    """Estimate duration from the first and last PCR (or PTS) of one PID.
+
+    Only SCAN_BUDGET bytes at the head and at the tail are read. Returns
+    (seconds, exact) with exact always False, or None if no usable
+    timestamps were found.
+    """
+    try:
+        with rangeio.RangeReader(file_path) as f:
+            return parse_duration(f)
+    except OSError:
+        return None
@@ -0,0 +1,149 @@
+"""Budgeted byte-range reads for the native container readers.
+
+RangeReader serves small header and tail ranges of a file without pulling
+the rest of it through the page cache:
+
+- reads go through os.pread (or mmap where pread is unavailable, or on
+  request), rounded out to BLOCK_SIZE blocks that are kept for the life of
+  the reader, so nearby reads (box and element headers) cost one syscall;
+  runs of missing blocks are fetched with a single read;
+- kernel readahead is switched off (POSIX_FADV_RANDOM / MADV_RANDOM), and
+  the fetched ranges are dropped from the page cache again on close
+  (POSIX_FADV_DONTNEED) unless drop_cache is False;
+- every file has a byte budget; exceeding it raises BudgetExceeded, an
+  OSError, which the readers treat like any other read failure;
+- bytes_read and syscalls count what was actually fetched.
+"""
+import mmap
+import os
+from typing import Dict, List, Tuple
+
+
+BLOCK_SIZE = 16 * 1024
+DEFAULT_BUDGET = 4 * 1024 * 1024
+
+
+class BudgetExceeded(OSError):
+    """A reader tried to fetch more than its byte budget from one file."""
+
+
+class RangeReader:
+    """Read-only, budgeted random access to one file.
+
+    Offers pread(offset, size) plus a minimal file-like cursor (seek, tell,
+    read) so parsers written against open(..., 'rb') work unchanged. Reads
+    past the end of the file return short results, like a file would.
+    """
+
+    def __init__(self, file_path: str, budget: int = DEFAULT_BUDGET, block_size: int = BLOCK_SIZE,
+                 use_mmap: bool = False, drop_cache: bool = True):
+        self.path = file_path
+        self.budget = budget
+        self.block_size = block_size
+        self.drop_cache = drop_cache
+        self.bytes_read = 0
+        self.syscalls = 0
+        self._blocks: Dict[int, bytes] = {}
+        self._spans: List[Tuple[int, int]] = []
+        self._pos = 0
+        self._mmap = None
+
+        self._fd = os.open(file_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            self.size = os.fstat(self._fd).st_size
+            if (use_mmap or not hasattr(os, 'pread')) and self.size:
+                try:
+                    self._mmap = mmap.mmap(self._fd, 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError):
+                    self._mmap = None
+                if self._mmap is not None and hasattr(self._mmap, 'madvise'):
+                    self._mmap.madvise(mmap.MADV_RANDOM)
+            if self._mmap is None and hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(self._fd, 0, 0, os.POSIX_FADV_RANDOM)
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    def _fetch(self, offset: int, size: int) -> bytes:
+        if self.bytes_read + size > self.budget:
+            raise BudgetExceeded(f"reading {size} bytes at {offset} would exceed the {self.budget}-byte budget",
+                                 self.path)
+        if self._mmap is not None:
+            data = self._mmap[offset:offset + size]
+        elif hasattr(os, 'pread'):
+            data = os.pread(self._fd, size, offset)
+        else:
+            os.lseek(self._fd, offset, os.SEEK_SET)
+            data = os.read(self._fd, size)
+        self.bytes_read += len(data)
+        self.syscalls += 1
+        self._spans.append((offset, len(data)))
+        return data
+
+    def pread(self, offset: int, size: int) -> bytes:
+        """Return up to size bytes starting at offset."""
+        end = min(offset + size, self.size)
+        if offset < 0 or offset >= end:
+            return b''
+
+        block_size = self.block_size
+        blocks = self._blocks
+        first, last = offset // block_size, (end - 1) // block_size
+
+        block = first
+        while block <= last:
+            if block in blocks:
+                block += 1
+                continue
+            run_end = block
+            while run_end < last and run_end + 1 not in blocks:
+                run_end += 1
+            data = self._fetch(block * block_size, (run_end - block + 1) * block_size)
+            for index in range(block, run_end + 1):
+                start = (index - block) * block_size
+                blocks[index] = data[start:start + block_size]
+            block = run_end + 1
+
+        start = offset - first * block_size
+        if first == last:
+            return blocks[first][start:start + end - offset]
+        return b''.join(blocks[index] for index in range(first, last + 1))[start:start + end - offset]
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = max(0, self.size - self._pos)
+        data = self.pread(self._pos, size)
+        self._pos += len(data)
+        return data
+
+    def close(self):
+        if self._fd is None:
+            return
+        try:
+            if self._mmap is not None:
+                self._mmap.close()
+            elif self.drop_cache and hasattr(os, 'posix_fadvise'):
+                for offset, length in self._spans:
+                    if length:
+                        os.posix_fadvise(self._fd, offset, length, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
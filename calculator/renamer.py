@@ -1,72 +1,289 @@
+import errno
 import os
 import re
-from typing import Callable, List, Dict, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
+
+from calculator.journal import RenameJournal, RenameOp
+
+
+_DURATION_SUFFIX = re.compile(r'\(\d+(\.\d+)?\s*min\)')
 
 
 def _default_logger(text: str, tag=None):
     print(text, end='')
 
 
-def rename_folders_with_duration(folder_summaries: List[Dict], logger: Callable = None) -> Tuple[List[Dict], Dict]:
-    """Rename folders by appending "(NN min)". Returns (rename_history, summary_counts)."""
-    logger = logger or _default_logger
+class _DirRenamer:
+    """Renames entries of one parent directory at a time.
 
-    rename_history = []
-    renamed_count = 0
-    skipped_count = 0
-    error_count = 0
+    Where the platform supports it, the parent is opened once and renames go
+    through renameat() on that descriptor, so long paths aren't re-resolved
+    for every folder. Existing targets are never replaced (POSIX rename()
+    would silently replace an empty directory).
+    """
 
-    logger("\n" + "=" * 80 + "\n", None)
-    logger("RENAMING FOLDERS\n", None)
-    logger("=" * 80 + "\n\n", None)
+    def __init__(self):
+        self.use_fds = os.rename in os.supports_dir_fd and hasattr(os, 'O_DIRECTORY')
+        self.parent = None
+        self.fd = None
 
-    for folder_data in folder_summaries:
-        old_path = folder_data['path']
-        old_name = folder_data['name']
-        minutes = folder_data['minutes']
+    def _parent_fd(self, parent: str) -> int:
+        if parent != self.parent:
+            self.close()
+            self.fd = os.open(parent, os.O_RDONLY | os.O_DIRECTORY)
+            self.parent = parent
+        return self.fd
+
+    def exists(self, parent: str, name: str) -> bool:
+        if not self.use_fds:
+            return os.path.lexists(os.path.join(parent, name))
+        try:
+            os.stat(name, dir_fd=self._parent_fd(parent), follow_symlinks=False)
+        except FileNotFoundError:
+            return False
+        return True
 
-        if re.search(r'\(\d+(\.\d+)?\s*min\)', old_name):
-            logger(f"⏭ Skipped (already has duration): {old_name}\n", None)
-            skipped_count += 1
+    def rename(self, parent: str, old_name: str, new_name: str):
+        if self.exists(parent, new_name):
+            raise FileExistsError(errno.EEXIST, "Target already exists", os.path.join(parent, new_name))
+        if self.use_fds:
+            fd = self._parent_fd(parent)
+            os.rename(old_name, new_name, src_dir_fd=fd, dst_dir_fd=fd)
+        else:
+            os.rename(os.path.join(parent, old_name), os.path.join(parent, new_name))
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+            self.parent = None
+
+
+def plan_renames(folder_summaries: List[Dict]) -> Tuple[List[RenameOp], List[Dict]]:
+    """Return (ops, skipped) for appending "(NN min)" to each summarised folder.
+
+    ops are ordered deepest first and grouped by parent, so every folder is
+    renamed before any of its ancestors and the planned paths stay valid
+    while the plan is applied. skipped holds the summaries of folders that
+    already carry a duration.
+    """
+    planned = []
+    skipped = []
+    for folder_data in folder_summaries:
+        parent, old_name = os.path.split(os.path.normpath(folder_data['path']))
+        if not old_name or _DURATION_SUFFIX.search(old_name):
+            skipped.append(folder_data)
             continue
+        planned.append((parent, old_name, f"{old_name} ({folder_data['minutes']:.0f} min)"))
 
-        new_name = f"{old_name} ({minutes:.0f} min)"
-        parent_dir = os.path.dirname(old_path)
-        new_path = os.path.join(parent_dir, new_name)
+    planned.sort(key=lambda op: (-op[0].count(os.sep), op[0], op[1]))
+    return [RenameOp(i, *op) for i, op in enumerate(planned)], skipped
 
-        try:
-            os.rename(old_path, new_path)
-            rename_history.append({
-                'old_path': old_path,
-                'new_path': new_path,
-                'old_name': old_name,
-                'new_name': new_name
-            })
-            logger(f"✓ Renamed: {old_name}\n", None)
-            logger(f"       → {new_name}\n\n", None)
-            renamed_count += 1
-        except Exception as e:
-            logger(f"❌ Error renaming {old_name}: {str(e)}\n\n", None)
-            error_count += 1
 
+def _log_summary(logger: Callable, title: str, done_label: str, done: int, skipped: int, errors: int):
     logger("-" * 80 + "\n", None)
-    logger("RENAME SUMMARY:\n", None)
-    logger(f"✓ Successfully renamed: {renamed_count}\n", None)
-    if skipped_count > 0:
-        logger(f"⏭ Skipped: {skipped_count}\n", None)
-    if error_count > 0:
-        logger(f"❌ Errors: {error_count}\n", None)
+    logger(f"{title} SUMMARY:\n", None)
+    logger(f"✓ {done_label}: {done}\n", None)
+    if skipped > 0:
+        logger(f"⏭ Skipped: {skipped}\n", None)
+    if errors > 0:
+        logger(f"❌ Errors: {errors}\n", None)
     logger("=" * 80 + "\n", None)
 
+
+def apply_plan(ops: List[RenameOp], logger: Callable = None, journal: RenameJournal = None,
+               dry_run: bool = False) -> Tuple[List[Dict], int, int]:
+    """Apply ops in order; returns (rename_history, renamed_count, error_count).
+
+    With a journal, a 'done' or 'error' record is appended for every op.
+    A failed op is logged and skipped; it doesn't stop the others.
+    """
+    logger = logger or _default_logger
+    history = []
+    errors = 0
+    renamer = _DirRenamer()
+    try:
+        for op in ops:
+            if dry_run:
+                logger(f"• Would rename: {op.old_path}\n", None)
+                logger(f"       → {op.new_name}\n\n", None)
+                continue
+            try:
+                renamer.rename(op.parent, op.old_name, op.new_name)
+            except OSError as e:
+                if journal is not None:
+                    journal.record('error', op, str(e))
+                logger(f"❌ Error renaming {op.old_name}: {str(e)}\n\n", None)
+                errors += 1
+                continue
+            if journal is not None:
+                journal.record('done', op)
+            history.append(op.history_entry())
+            logger(f"✓ Renamed: {op.old_name}\n", None)
+            logger(f"       → {op.new_name}\n\n", None)
+    finally:
+        renamer.close()
+    return history, len(history), errors
+
+
+def rename_folders_with_duration(folder_summaries: List[Dict], logger: Callable = None,
+                                 journal_path: str = None, dry_run: bool = False) -> Tuple[List[Dict], Dict]:
+    """Rename folders by appending "(NN min)". Returns (rename_history, summary_counts).
+
+    The whole plan is computed first (see plan_renames) and applied deepest
+    first, so nested folders are renamed correctly. If journal_path is given,
+    the plan and the outcome of every rename are written there before and as
+    they happen, so replay_journal or revert_journal can finish or undo the
+    run later, even after a crash. With dry_run nothing is renamed or written;
+    the planned renames are only logged. summary_counts has 'renamed',
+    'skipped', 'errors' and 'planned', plus 'journal' when one was written.
+    """
+    logger = logger or _default_logger
+
+    logger("\n" + "=" * 80 + "\n", None)
+    logger("RENAMING FOLDERS (dry run)\n" if dry_run else "RENAMING FOLDERS\n", None)
+    logger("=" * 80 + "\n\n", None)
+
+    ops, skipped = plan_renames(folder_summaries)
+    for folder_data in skipped:
+        logger(f"⏭ Skipped (already has duration): {folder_data['name']}\n", None)
+
+    journal = None
+    if journal_path and ops and not dry_run:
+        journal = RenameJournal.create(journal_path, ops)
+    try:
+        rename_history, renamed_count, error_count = apply_plan(ops, logger, journal=journal, dry_run=dry_run)
+        if journal is not None:
+            journal.mark('end')
+    finally:
+        if journal is not None:
+            journal.close()
+
     summary = {
         'renamed': renamed_count,
-        'skipped': skipped_count,
-        'errors': error_count
+        'skipped': len(skipped),
+        'errors': error_count,
+        'planned': len(ops)
     }
+    if journal is not None:
+        summary['journal'] = journal_path
+    if dry_run:
+        _log_summary(logger, "RENAME", "Would rename", len(ops), len(skipped), 0)
+    else:
+        _log_summary(logger, "RENAME", "Successfully renamed", renamed_count, len(skipped), error_count)
 
     return rename_history, summary
 
 
+def _journal_state(renamer: _DirRenamer, op: RenameOp) -> Optional[str]:
+    """Return 'old' or 'new' for whichever name of op exists on its own, else None."""
+    old_exists = renamer.exists(op.parent, op.old_name)
+    new_exists = renamer.exists(op.parent, op.new_name)
+    if old_exists != new_exists:
+        return 'old' if old_exists else 'new'
+    return None
+
+
+def replay_journal(journal_path: str, logger: Callable = None) -> Dict:
+    """Finish an interrupted rename from its journal.
+
+    Ops without a recorded outcome are renamed if the folder still has its
+    old name, or recorded as done if the rename happened before the crash.
+    Ops recorded as failed are left alone. Returns counts like
+    rename_folders_with_duration.
+    """
+    logger = logger or _default_logger
+    journal = RenameJournal.load(journal_path)
+
+    logger("\n" + "=" * 80 + "\n", None)
+    logger("REPLAYING RENAME JOURNAL\n", None)
+    logger("=" * 80 + "\n\n", None)
+
+    renamed = skipped = errors = 0
+    renamer = _DirRenamer()
+    with journal:
+        try:
+            for op in journal.ops:
+                if not journal.begun or op.id in journal.status:
+                    skipped += 1
+                    continue
+                try:
+                    state = _journal_state(renamer, op)
+                    if state == 'old':
+                        renamer.rename(op.parent, op.old_name, op.new_name)
+                        logger(f"✓ Renamed: {op.old_name}\n", None)
+                        logger(f"       → {op.new_name}\n\n", None)
+                        renamed += 1
+                    elif state is None:
+                        raise FileNotFoundError(errno.ENOENT, "Old and new names both exist or both are missing",
+                                                op.old_path)
+                    else:
+                        skipped += 1
+                    journal.record('done', op)
+                except OSError as e:
+                    journal.record('error', op, str(e))
+                    logger(f"❌ Error renaming {op.old_name}: {str(e)}\n\n", None)
+                    errors += 1
+            if journal.begun:
+                journal.mark('end')
+        finally:
+            renamer.close()
+
+    _log_summary(logger, "REPLAY", "Successfully renamed", renamed, skipped, errors)
+    return {'renamed': renamed, 'skipped': skipped, 'errors': errors}
+
+
+def revert_journal(journal_path: str, logger: Callable = None) -> Dict:
+    """Undo the renames recorded in a journal, newest first.
+
+    Also undoes renames that happened just before a crash and weren't
+    recorded yet. Each revert is journaled, so running it again after an
+    interruption picks up where it stopped. Returns counts like
+    revert_renames.
+    """
+    logger = logger or _default_logger
+    journal = RenameJournal.load(journal_path)
+
+    logger("\n" + "=" * 80 + "\n", None)
+    logger("REVERTING RENAMES\n", None)
+    logger("=" * 80 + "\n\n", None)
+
+    reverted = skipped = errors = 0
+    renamer = _DirRenamer()
+    with journal:
+        try:
+            for op in reversed(journal.ops):
+                status = journal.status.get(op.id)
+                if status in ('error', 'reverted') or not journal.begun:
+                    continue
+                try:
+                    state = _journal_state(renamer, op)
+                    if state == 'new':
+                        renamer.rename(op.parent, op.new_name, op.old_name)
+                        journal.record('reverted', op)
+                        logger(f"✓ Reverted: {op.new_name}\n", None)
+                        logger(f"       → {op.old_name}\n\n", None)
+                        reverted += 1
+                    elif state == 'old':
+                        if status is None:
+                            # Never renamed; nothing to undo.
+                            continue
+                        logger(f"⏭ Skipped (original exists): {op.old_name}\n", None)
+                        skipped += 1
+                    else:
+                        raise FileNotFoundError(errno.ENOENT, "cannot revert", op.new_path)
+                except OSError as e:
+                    journal.record('revert_error', op, str(e))
+                    logger(f"❌ Error reverting {op.new_name}: {str(e)}\n\n", None)
+                    errors += 1
+            journal.mark('revert_end')
+        finally:
+            renamer.close()
+
+    _log_summary(logger, "REVERT", "Successfully reverted", reverted, skipped, errors)
+    return {'reverted': reverted, 'skipped': skipped, 'errors': errors}
+
+
 def revert_renames(rename_history: List[Dict], logger: Callable = None) -> Dict:
     logger = logger or _default_logger
 
@@ -100,13 +317,5 @@ def revert_renames(rename_history: List[Dict], logger: Callable = None) -> Dict:
             logger(f"⚠ Missing: {new_name} (cannot revert)\n", None)
             errors += 1
 
-    logger("-" * 80 + "\n", None)
-    logger("REVERT SUMMARY:\n", None)
-    logger(f"✓ Successfully reverted: {reverted}\n", None)
-    if skipped > 0:
-        logger(f"⏭ Skipped: {skipped}\n", None)
-    if errors > 0:
-        logger(f"❌ Errors: {errors}\n", None)
-    logger("=" * 80 + "\n", None)
-
+    _log_summary(logger, "REVERT", "Successfully reverted", reverted, skipped, errors)
     return {'reverted': reverted, 'skipped': skipped, 'errors': errors}
@@ -0,0 +1,278 @@
+"""Columnar store of per-file scan results.
+
+One row per probed file, kept in array.array columns so appending during a
+scan is cheap. Queries run vectorized on NumPy views of the same buffers
+when NumPy is installed and fall back to plain Python otherwise; both
+paths return the same rows in the same order.
+"""
+import bisect
+import heapq
+import json
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Status codes stored in the 'status' column, one per probe_video source.
+# New statuses are only ever appended, so older files still load.
+STATUSES = ('ffprobe', 'native', 'estimate', 'cache', 'error', 'ffprobe-streams', 'ffprobe-packets')
+_STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+# Column name -> array typecode, in the order they are written to disk.
+COLUMNS = (
+    ('path_id', 'i'),    # index into names
+    ('folder_id', 'i'),  # index into folders
+    ('size', 'q'),       # bytes, -1 if unknown
+    ('duration', 'd'),   # seconds
+    ('extension', 'H'),  # index into extensions
+    ('status', 'B'),     # index into STATUSES
+)
+
+_MAGIC = b'VDCRES1\0'
+_HEADER = struct.Struct('<8sQQ')
+
+
+class ResultStore:
+    """Per-file scan results with filter, top-k, group-by and histogram queries.
+
+    Folder paths, file names and extensions are interned into tables, so a
+    row costs 27 bytes however long its path is. Query methods take an
+    optional `rows` selection (as returned by filter()) and return row
+    indices or plain Python values.
+    """
+
+    def __init__(self):
+        self.folders: List[str] = []
+        self.names: List[str] = []
+        self.extensions: List[str] = []
+        self._ids: Tuple[Dict[str, int], Dict[str, int], Dict[str, int]] = ({}, {}, {})
+        self.columns: Dict[str, array] = {name: array(code) for name, code in COLUMNS}
+
+    def __len__(self) -> int:
+        return len(self.columns['duration'])
+
+    @staticmethod
+    def _intern(table: List[str], ids: Dict[str, int], value: str) -> int:
+        index = ids.get(value)
+        if index is None:
+            index = ids[value] = len(table)
+            table.append(value)
+        return index
+
+    def add(self, folder: str, name: str, duration: float, source: str, size: Optional[int] = None):
+        folder_ids, name_ids, extension_ids = self._ids
+        columns = self.columns
+        columns['path_id'].append(self._intern(self.names, name_ids, name))
+        columns['folder_id'].append(self._intern(self.folders, folder_ids, folder))
+        columns['size'].append(-1 if size is None else size)
+        columns['duration'].append(duration)
+        columns['extension'].append(self._intern(self.extensions, extension_ids, os.path.splitext(name)[1].lower()))
+        columns['status'].append(_STATUS_CODES[source])
+
+    def add_event(self, event):
+        """Add a core.FileProbed or core.FileRetried event."""
+        self.add(event.folder, event.name, event.duration, event.source, event.size)
+
+    def path(self, row: int) -> str:
+        return os.path.join(self.folders[self.columns['folder_id'][row]], self.names[self.columns['path_id'][row]])
+
+    def record(self, row: int) -> Dict:
+        """Return one row as a dict: path, size, seconds, extension, source."""
+        columns = self.columns
+        size = columns['size'][row]
+        return {'path': self.path(row), 'size': None if size < 0 else size, 'seconds': columns['duration'][row],
+                'extension': self.extensions[columns['extension'][row]], 'source': STATUSES[columns['status'][row]]}
+
+    def column(self, name: str):
+        """Return a copy of a column (a NumPy array if NumPy is installed)."""
+        data = self.columns[name]
+        return np.array(data, dtype=data.typecode) if np is not None else array(data.typecode, data)
+
+    def _view(self, name: str, rows=None):
+        # Zero-copy views must not outlive the query: an array exporting its
+        # buffer can't grow.
+        data = self.columns[name]
+        view = np.frombuffer(data, dtype=data.typecode) if len(data) else np.empty(0, dtype=data.typecode)
+        return view if rows is None else view[rows]
+
+    def filter(self, min_duration: float = None, max_duration: float = None, extensions: Iterable[str] = None,
+               statuses: Iterable[str] = None, min_size: int = None, max_size: int = None,
+               folder: str = None) -> Sequence[int]:
+        """Return the indices of rows matching every given condition, in row order."""
+        extension_codes = None
+        if extensions is not None:
+            extension_codes = [self._ids[2][e.lower()] for e in extensions if e.lower() in self._ids[2]]
+        status_codes = None if statuses is None else [_STATUS_CODES[s] for s in statuses]
+        folder_code = None if folder is None else self._ids[0].get(folder, -1)
+
+        if np is not None:
+            mask = np.ones(len(self), dtype=bool)
+            duration = self._view('duration')
+            if min_duration is not None:
+                mask &= duration >= min_duration
+            if max_duration is not None:
+                mask &= duration <= max_duration
+            if min_size is not None or max_size is not None:
+                size = self._view('size')
+                if min_size is not None:
+                    mask &= size >= min_size
+                if max_size is not None:
+                    mask &= (size <= max_size) & (size >= 0)
+            if extension_codes is not None:
+                mask &= np.isin(self._view('extension'), extension_codes)
+            if status_codes is not None:
+                mask &= np.isin(self._view('status'), status_codes)
+            if folder_code is not None:
+                mask &= self._view('folder_id') == folder_code
+            return np.flatnonzero(mask)
+
+        columns = self.columns
+        conditions = []
+        if min_duration is not None:
+            conditions.append(lambda i, d=columns['duration']: d[i] >= min_duration)
+        if max_duration is not None:
+            conditions.append(lambda i, d=columns['duration']: d[i] <= max_duration)
+        if min_size is not None:
+            conditions.append(lambda i, s=columns['size']: s[i] >= min_size)
+        if max_size is not None:
+            conditions.append(lambda i, s=columns['size']: 0 <= s[i] <= max_size)
+        if extension_codes is not None:
+            conditions.append(lambda i, e=columns['extension'], codes=frozenset(extension_codes): e[i] in codes)
+        if status_codes is not None:
+            conditions.append(lambda i, s=columns['status'], codes=frozenset(status_codes): s[i] in codes)
+        if folder_code is not None:
+            conditions.append(lambda i, f=columns['folder_id']: f[i] == folder_code)
+        return [i for i in range(len(self)) if all(condition(i) for condition in conditions)]
+
+    def failures(self) -> Sequence[int]:
+        """Return rows that failed to probe or came back with a zero duration."""
+        if np is not None:
+            mask = (self._view('status') == _STATUS_CODES['error']) | (self._view('duration') <= 0)
+            return np.flatnonzero(mask)
+        status, duration = self.columns['status'], self.columns['duration']
+        error = _STATUS_CODES['error']
+        return [i for i in range(len(self)) if status[i] == error or duration[i] <= 0]
+
+    def top_k(self, k: int, column: str = 'duration', largest: bool = True, rows: Sequence[int] = None) -> List[int]:
+        """Return the rows with the k largest (or smallest) values of column, best first."""
+        if np is not None:
+            values = self._view(column, rows)
+            k = min(k, len(values))
+            if k <= 0:
+                return []
+            keys = -values.astype('d') if largest else values
+            # Keep every row tied with the k-th value, then stable-sort, so
+            # ties come out in row order as in the fallback.
+            threshold = keys[np.argpartition(keys, k - 1)[k - 1]]
+            best = np.flatnonzero(keys <= threshold)
+            best = best[np.argsort(keys[best], kind='stable')][:k]
+            if rows is not None:
+                best = np.asarray(rows)[best]
+            return best.tolist()
+
+        data = self.columns[column]
+        candidates = range(len(self)) if rows is None else rows
+        select = heapq.nlargest if largest else heapq.nsmallest
+        return select(k, candidates, key=data.__getitem__)
+
+    def folder_totals(self, rows: Sequence[int] = None) -> Dict[str, Tuple[float, int]]:
+        """Group by folder: return {folder: (total_seconds, file_count)} in first-seen order."""
+        if np is not None:
+            folder_id = self._view('folder_id', rows)
+            seconds = np.bincount(folder_id, weights=self._view('duration', rows), minlength=len(self.folders))
+            counts = np.bincount(folder_id, minlength=len(self.folders))
+            present = np.flatnonzero(counts)
+            return {self.folders[i]: (float(seconds[i]), int(counts[i])) for i in present}
+
+        seconds = [0.0] * len(self.folders)
+        counts = [0] * len(self.folders)
+        folder_id, duration = self.columns['folder_id'], self.columns['duration']
+        for i in (range(len(self)) if rows is None else rows):
+            seconds[folder_id[i]] += duration[i]
+            counts[folder_id[i]] += 1
+        return {self.folders[i]: (seconds[i], counts[i]) for i in range(len(self.folders)) if counts[i]}
+
+    def _edges(self, bins: int, values) -> List[float]:
+        low = min(values) if len(values) else 0.0
+        high = max(values) if len(values) else 1.0
+        if high <= low:
+            high = low + 1.0
+        step = (high - low) / bins
+        return [low + step * i for i in range(bins)] + [high]
+
+    def histogram(self, bins=20, rows: Sequence[int] = None) -> Tuple[List[int], List[float]]:
+        """Return (counts, edges) of the duration distribution, like numpy.histogram.
+
+        bins is a bin count (equal widths over the data range) or a list of edges.
+        """
+        if np is not None:
+            counts, edges = np.histogram(self._view('duration', rows), bins=bins)
+            return counts.tolist(), edges.tolist()
+
+        duration = self.columns['duration']
+        values = [duration[i] for i in (range(len(self)) if rows is None else rows)]
+        edges = list(bins) if not isinstance(bins, int) else self._edges(bins, values)
+        counts = [0] * (len(edges) - 1)
+        last = len(counts) - 1
+        for value in values:
+            if edges[0] <= value <= edges[-1]:
+                # The last bin includes its right edge, as in numpy.
+                counts[min(bisect.bisect_right(edges, value) - 1, last)] += 1
+        return counts, edges
+
+    def histogram_by_extension(self, bins=20) -> Tuple[Dict[str, List[int]], List[float]]:
+        """Return ({extension: counts}, edges), with the same edges for every extension."""
+        _, edges = self.histogram(bins)
+        result = {}
+        for extension in self.extensions:
+            rows = self.filter(extensions=[extension])
+            result[extension] = self.histogram(edges, rows)[0]
+        return result, edges
+
+    def save(self, path: str):
+        """Write the store to a compact binary file (little-endian columns plus JSON tables)."""
+        tables = json.dumps({'folders': self.folders, 'names': self.names, 'extensions': self.extensions,
+                             'statuses': list(STATUSES),
+                             'itemsizes': [self.columns[name].itemsize for name, _ in COLUMNS]},
+                            ensure_ascii=False).encode('utf-8')
+        with open(path, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, len(self), len(tables)))
+            f.write(tables)
+            for name, _ in COLUMNS:
+                data = self.columns[name]
+                if sys.byteorder == 'big':
+                    data = array(data.typecode, data)
+                    data.byteswap()
+                data.tofile(f)
+
+    @classmethod
+    def load(cls, path: str) -> 'ResultStore':
+        with open(path, 'rb') as f:
+            magic, count, tables_size = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError(f"{path} is not a result store file")
+            tables = json.loads(f.read(tables_size).decode('utf-8'))
+            if tables['statuses'] != list(STATUSES[:len(tables['statuses'])]):
+                raise ValueError(f"{path} uses unknown status codes")
+
+            store = cls()
+            for (name, code), itemsize in zip(COLUMNS, tables['itemsizes']):
+                data = array(code)
+                if data.itemsize != itemsize:
+                    raise ValueError(f"{path}: column {name} has {itemsize}-byte items, expected {data.itemsize}")
+                data.fromfile(f, count)
+                if sys.byteorder == 'big':
+                    data.byteswap()
+                store.columns[name] = data
+
+        store.folders, store.names, store.extensions = tables['folders'], tables['names'], tables['extensions']
+        store._ids = tuple({value: i for i, value in enumerate(table)}
+                           for table in (store.folders, store.names, store.extensions))
+        return store
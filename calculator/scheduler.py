@@ -0,0 +1,105 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+
+# Probes in flight per spinning disk: one reading while the next spawns,
+# without making the heads seek between many files.
+ROTATIONAL_JOBS = 2
+
+
+def is_rotational(st_dev: int) -> Optional[bool]:
+    """Return True for a spinning disk, False for SSD/NVMe, None if unknown.
+
+    Read from /sys/dev/block/MAJOR:MINOR (Linux only); partitions use the
+    queue settings of their parent disk. Network and virtual filesystems
+    have no block device and report None.
+    """
+    try:
+        device = os.path.realpath(f"/sys/dev/block/{os.major(st_dev)}:{os.minor(st_dev)}")
+    except (AttributeError, ValueError, OverflowError):
+        return None
+    for candidate in (device, os.path.dirname(device)):
+        try:
+            with open(os.path.join(candidate, 'queue', 'rotational')) as f:
+                return f.read().strip() == '1'
+        except OSError:
+            continue
+    return None
+
+
+class DeviceScheduler:
+    """Runs probes on one bounded thread pool per storage device (st_dev).
+
+    Each non-rotational or unknown device gets `jobs` workers and each
+    spinning disk `rotational_jobs`, so several disks are read in parallel
+    without any single one thrashing. device_jobs overrides the limit for
+    specific st_dev values. Use as a context manager, like ThreadPoolExecutor.
+    """
+
+    def __init__(self, jobs: int, rotational_jobs: int = ROTATIONAL_JOBS, device_jobs: Dict[int, int] = None):
+        self.jobs = jobs
+        self.rotational_jobs = min(jobs, rotational_jobs)
+        self.device_jobs = dict(device_jobs or {})
+        self._rotational: Dict[Optional[int], Optional[bool]] = {}
+        self._pools: Dict[Optional[int], ThreadPoolExecutor] = {}
+        self._workers = 0
+        self._lock = threading.Lock()
+
+    def device_of(self, path: str) -> Optional[int]:
+        """Return st_dev of path, or None if it can't be stat'ed."""
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            return None
+
+    def rotational(self, dev: Optional[int]) -> Optional[bool]:
+        if dev not in self._rotational:
+            self._rotational[dev] = None if dev is None else is_rotational(dev)
+        return self._rotational[dev]
+
+    def limit(self, dev: Optional[int]) -> int:
+        """Return the number of concurrent probes allowed on dev."""
+        if dev in self.device_jobs:
+            return self.device_jobs[dev]
+        return self.rotational_jobs if self.rotational(dev) else self.jobs
+
+    def capacity(self) -> int:
+        """Return the total number of workers across the devices seen so far (at least jobs)."""
+        return max(self.jobs, self._workers)
+
+    def order(self, dev: Optional[int], entries: List[os.DirEntry]) -> List[os.DirEntry]:
+        """Return entries in the order they should be read from dev.
+
+        On spinning disks files are read in inode order, which follows the
+        on-disk layout of most filesystems more closely than name order.
+        """
+        if not self.rotational(dev):
+            return entries
+        try:
+            return sorted(entries, key=lambda entry: entry.inode())
+        except OSError:
+            return entries
+
+    def submit(self, dev: Optional[int], fn: Callable, *args) -> Future:
+        with self._lock:
+            pool = self._pools.get(dev)
+            if pool is None:
+                workers = self.limit(dev)
+                pool = self._pools[dev] = ThreadPoolExecutor(max_workers=workers)
+                self._workers += workers
+        return pool.submit(fn, *args)
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown(wait=True)
+        return False
@@ -0,0 +1,133 @@
+"""Sorted, filtered row order over a tree.FolderTree, for the GUI results table.
+
+Only the order is kept here: the tree indices of the visible rows and their
+sort keys. Names, durations and counts stay in the tree and are read when a
+row is shown, so a table of 200,000 folders costs a few MB and showing a
+page of it is O(page size). The order is a list of sorted blocks of about
+_BLOCK_SIZE rows, so a folder added during a scan is inserted at its
+sorted position in O(sqrt n) instead of shifting the whole table.
+"""
+import bisect
+from array import array
+from itertools import accumulate
+from typing import List, Optional
+
+
+_BLOCK_SIZE = 1000
+
+
+class FolderTable:
+    """The folders of a tree.FolderTree that had videos, sorted and filtered for display.
+
+    Rows are tree indices. Without a sort column they are in scan order;
+    descending order is the ascending one read backwards, so flipping it is
+    free. The filter keeps rows whose folder name contains the text,
+    ignoring case.
+    """
+
+    COLUMNS = ('name', 'videos', 'duration', 'path')
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.sort_column = None
+        self.descending = False
+        self.filter_text = ''
+        self.rows = array('i')
+        self._length = 0
+        self._blocks: List[List[int]] = []
+        self._keys: List[List] = []
+        self._maxes: List = []
+        self._offsets: Optional[List[int]] = None
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, position: int) -> int:
+        """Return the tree index of the row shown at position."""
+        if not 0 <= position < self._length:
+            raise IndexError(position)
+        if self.descending:
+            position = self._length - 1 - position
+        if self._offsets is None:
+            self._offsets = list(accumulate(len(block) for block in self._blocks))
+        block = bisect.bisect_right(self._offsets, position)
+        return self._blocks[block][position - (self._offsets[block - 1] if block else 0)]
+
+    def _key(self, index: int, serial: int):
+        column = self.sort_column
+        if column is None:
+            return serial
+        if column == 'name':
+            return self.tree.name(index).casefold()
+        if column == 'videos':
+            return self.tree.own_videos[index]
+        if column == 'duration':
+            return self.tree.own_seconds[index]
+        return self.tree.path(index).casefold()
+
+    def _matches(self, index: int) -> bool:
+        return not self.filter_text or self.filter_text in self.tree.name(index).casefold()
+
+    def add(self, index: int):
+        """Add the folder at tree index (once its totals are final)."""
+        self.rows.append(index)
+        if self._matches(index):
+            self._insert(self._key(index, len(self.rows) - 1), index)
+
+    def _insert(self, key, index: int):
+        self._length += 1
+        self._offsets = None
+        if not self._blocks:
+            self._blocks.append([index])
+            self._keys.append([key])
+            self._maxes.append(key)
+            return
+
+        # The first block with a larger key, so equal keys keep their order.
+        block = min(bisect.bisect_right(self._maxes, key), len(self._maxes) - 1)
+        keys = self._keys[block]
+        position = bisect.bisect_right(keys, key)
+        keys.insert(position, key)
+        self._blocks[block].insert(position, index)
+        self._maxes[block] = keys[-1]
+
+        if len(keys) > 2 * _BLOCK_SIZE:
+            rows = self._blocks[block]
+            self._keys[block:block + 1] = [keys[:_BLOCK_SIZE], keys[_BLOCK_SIZE:]]
+            self._blocks[block:block + 1] = [rows[:_BLOCK_SIZE], rows[_BLOCK_SIZE:]]
+            self._maxes[block:block + 1] = [keys[_BLOCK_SIZE - 1], keys[-1]]
+
+    def update(self):
+        """Re-sort after the totals of folders already added changed (a file succeeded on retry)."""
+        if self.sort_column in ('videos', 'duration'):
+            self._rebuild()
+
+    def sort(self, column: str = None, descending: bool = False):
+        """Sort by one of COLUMNS, or by scan order if column is None."""
+        if column is not None and column not in self.COLUMNS:
+            raise ValueError(f"unknown column: {column}")
+        if column != self.sort_column:
+            self.sort_column = column
+            self._rebuild()
+        self.descending = descending
+
+    def set_filter(self, text: str):
+        text = text.strip().casefold()
+        if text != self.filter_text:
+            self.filter_text = text
+            self._rebuild()
+
+    def _rebuild(self):
+        matched = [(serial, index) for serial, index in enumerate(self.rows) if self._matches(index)]
+        indices = [index for _, index in matched]
+        keys = [self._key(index, serial) for serial, index in matched]
+        if self.sort_column is not None:
+            ranks = sorted(range(len(indices)), key=keys.__getitem__)
+            indices = [indices[rank] for rank in ranks]
+            keys = [keys[rank] for rank in ranks]
+
+        self._blocks = [indices[i:i + _BLOCK_SIZE] for i in range(0, len(indices), _BLOCK_SIZE)]
+        self._keys = [keys[i:i + _BLOCK_SIZE] for i in range(0, len(keys), _BLOCK_SIZE)]
+        self._maxes = [block[-1] for block in self._keys]
+        self._length = len(indices)
+        self._offsets = None
@@ -0,0 +1,72 @@
+"""Per-file ffprobe deadlines that follow file size and the observed probe speed.
+
+A scan starts out giving every ffprobe run the configured timeout. Once
+WARMUP runs have finished, a file's deadline is SAFETY times what recent
+runs suggest it needs: the larger of an exponentially weighted moving
+average (EWMA) of seconds per run and the file size divided by an EWMA of
+bytes per second, clamped between min_timeout and the configured timeout.
+A tiny clip that hangs is given up on after a couple of seconds instead of
+blocking a worker for the full timeout.
+
+Only the first ffprobe tier, which reads the container header, is timed
+and learned from. The later tiers (see core.FFPROBE_SOURCES) may demux
+the whole file, so they always get the configured timeout and their
+runtimes are kept out of the averages.
+
+The configured timeout stays the longest any file waits in the main pass,
+which keeps tail latency down; files that run out of time are retried
+after the main pass with retry_timeout (see core.iter_scan), so a huge
+capture on a busy disk still gets its duration.
+"""
+import threading
+from typing import Optional
+
+
+MIN_TIMEOUT = 2.0
+SAFETY = 4.0
+EWMA_ALPHA = 0.2
+WARMUP = 8
+# Retries get this many times the configured timeout.
+RETRY_FACTOR = 6
+
+
+class AdaptiveTimeout:
+    """Deadlines for the ffprobe runs of one scan, learned from the runs that finish.
+
+    retry_timeout is the deadline for the retry pass (0 disables retries:
+    timed-out files are then reported as unreadable straight away). With
+    min_timeout equal to timeout every run gets the fixed timeout, as before.
+    Thread-safe.
+    """
+
+    def __init__(self, timeout: float = 10, min_timeout: float = MIN_TIMEOUT, retry_timeout: float = None):
+        self.timeout = timeout
+        self.min_timeout = min(min_timeout, timeout)
+        self.retry_timeout = timeout * RETRY_FACTOR if retry_timeout is None else retry_timeout
+        self.samples = 0
+        self.seconds = 0.0
+        self.throughput = 0.0
+        self._lock = threading.Lock()
+
+    def deadline(self, size: Optional[int], tier: int = 0) -> float:
+        """Return the timeout for one ffprobe run of tier on a file of size bytes (None if unknown)."""
+        if tier > 0 or self.samples < WARMUP or size is None:
+            return self.timeout
+        expected = self.seconds
+        if self.throughput > 0:
+            expected = max(expected, size / self.throughput)
+        return min(self.timeout, max(self.min_timeout, SAFETY * expected))
+
+    def observe(self, size: Optional[int], elapsed: float, tier: int = 0):
+        """Record an ffprobe run of tier on a file of size bytes that finished in elapsed seconds."""
+        if tier > 0 or elapsed <= 0:
+            return
+        with self._lock:
+            if self.samples == 0:
+                self.seconds = elapsed
+            else:
+                self.seconds += EWMA_ALPHA * (elapsed - self.seconds)
+            if size:
+                rate = size / elapsed
+                self.throughput = rate if self.throughput == 0 else self.throughput + EWMA_ALPHA * (rate - self.throughput)
+            self.samples += 1
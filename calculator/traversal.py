@@ -0,0 +1,257 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from calculator.filters import ScanFilter
+
+
+DEFAULT_MAX_LISTINGS = 200_000
+# Listings of directories modified this recently aren't kept: a change in the
+# same mtime tick would go unnoticed.
+_RACY_NS = 2_000_000_000
+
+
+class ExtensionMatcher:
+    """Case-insensitive filename suffix matcher built once per scan.
+
+    Plain extensions ('.mp4') are looked up in a set; anything with more than
+    one dot ('.part.mp4') falls back to an endswith check.
+    """
+
+    __slots__ = ('simple', 'compound')
+
+    def __init__(self, video_extensions: Iterable[str]):
+        extensions = {ext.lower() for ext in video_extensions if ext}
+        self.simple = frozenset(ext for ext in extensions if ext.startswith('.') and ext.count('.') == 1)
+        self.compound = tuple(extensions - self.simple)
+
+    def __call__(self, filename: str) -> bool:
+        dot = filename.rfind('.')
+        if dot >= 0 and filename[dot:].lower() in self.simple:
+            return True
+        return bool(self.compound) and filename.lower().endswith(self.compound)
+
+    @property
+    def key(self):
+        """A hashable value equal for matchers that match the same names (see ListingCache)."""
+        return self.simple, frozenset(self.compound)
+
+
+def _relative(path: str, start: int) -> str:
+    """Return what follows the first start characters of path (the root and a separator), '/'-separated."""
+    relative = path[start:]
+    return relative if os.sep == '/' else relative.replace(os.sep, '/')
+
+
+def _scan(dirpath: str, matches: Callable[[str], bool], follow_symlinks: bool,
+          filters: Optional[ScanFilter] = None, start: int = 0) -> Tuple[List[os.DirEntry], List[os.DirEntry]]:
+    """List dirpath once; return (subdirectory entries, matching file entries).
+
+    With filters, entries are also checked against its name and path rules
+    (keep_dir, keep_file), relative to the root whose path is start characters
+    long; excluded subdirectories are never listed.
+    """
+    subdirs = []
+    videos = []
+    with os.scandir(dirpath) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=follow_symlinks):
+                    if filters is None or filters.keep_dir(entry.name, _relative(entry.path, start)):
+                        subdirs.append(entry)
+                elif matches(entry.name) and entry.is_file():
+                    if filters is None or filters.keep_file(entry.name, _relative(entry.path, start)):
+                        videos.append(entry)
+            except OSError:
+                continue
+    return subdirs, videos
+
+
+def _root_length(root_folder: str) -> int:
+    """Return the length of root_folder with a trailing separator, as entries below it start."""
+    return len(os.path.join(root_folder, ''))
+
+
+def _stat_filter(filters: Optional[ScanFilter], subdirs: List, videos: List) -> Tuple[List, List]:
+    """Apply the rules of filters that need a stat (see ScanFilter.keep_stat)."""
+    if filters is not None:
+        if filters.stat_dirs:
+            subdirs = [entry for entry in subdirs if filters.keep_stat(entry, is_dir=True)]
+        if filters.stat_files:
+            videos = [entry for entry in videos if filters.keep_stat(entry)]
+    return subdirs, videos
+
+
+class CachedEntry:
+    """Stands in for the os.DirEntry of a listing kept by ListingCache.
+
+    stat() is called afresh on each CachedEntry (and then remembered), so a
+    file changed in place is seen with its new size and mtime.
+    """
+
+    __slots__ = ('name', 'path', '_stat')
+
+    def __init__(self, dirpath: str, name: str):
+        self.name = name
+        self.path = os.path.join(dirpath, name)
+        self._stat = None
+
+    def stat(self, follow_symlinks: bool = True) -> os.stat_result:
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    def inode(self) -> int:
+        return self.stat().st_ino
+
+    def __repr__(self):
+        return f"<CachedEntry {self.name!r}>"
+
+
+class ListingCache:
+    """Directory listings kept between scans, revalidated by the directory's mtime.
+
+    Only the subdirectories and the matching files of a directory are kept,
+    so listing it again while it is unchanged costs one stat however many
+    other entries it holds. Listings are kept per matcher (see
+    ExtensionMatcher.key) and filter; matchers without a key are always
+    listed afresh.
+    The least recently used listings beyond max_listings are dropped.
+    Thread-safe.
+    """
+
+    def __init__(self, max_listings: int = DEFAULT_MAX_LISTINGS):
+        self.max_listings = max_listings
+        self.hits = 0
+        self.misses = 0
+        self._listings = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._listings)
+
+    def scan(self, dirpath: str, matches: Callable[[str], bool], follow_symlinks: bool,
+             filters: Optional[ScanFilter] = None, start: int = 0) -> Tuple[List, List]:
+        """Return (subdirectory entries, matching file entries) like _scan; raises OSError likewise."""
+        key = getattr(matches, 'key', None)
+        if key is None:
+            return _scan(dirpath, matches, follow_symlinks, filters, start)
+
+        st = os.stat(dirpath)
+        version = (st.st_dev, st.st_ino, st.st_mtime_ns)
+        # Where the root is only matters to filters with anchored rules.
+        cache_key = (dirpath, follow_symlinks, key,
+                     None if filters is None else (filters.key, start if filters.anchored else None))
+        with self._lock:
+            cached = self._listings.get(cache_key)
+            if cached is not None and cached[0] == version:
+                self._listings.move_to_end(cache_key)
+                self.hits += 1
+            else:
+                cached = None
+                self.misses += 1
+        if cached is not None:
+            return ([CachedEntry(dirpath, name) for name in cached[1]],
+                    [CachedEntry(dirpath, name) for name in cached[2]])
+
+        subdirs, videos = _scan(dirpath, matches, follow_symlinks, filters, start)
+        if time.time_ns() - st.st_mtime_ns > _RACY_NS:
+            with self._lock:
+                self._listings[cache_key] = (version, tuple(entry.name for entry in subdirs),
+                                             tuple(entry.name for entry in videos))
+                self._listings.move_to_end(cache_key)
+                while len(self._listings) > self.max_listings:
+                    self._listings.popitem(last=False)
+        return subdirs, videos
+
+    def clear(self):
+        with self._lock:
+            self._listings.clear()
+
+
+def list_folder(dirpath: str, matches: Callable[[str], bool], follow_symlinks: bool = False,
+                filters: Optional[ScanFilter] = None, filter_root: str = None,
+                listings: Optional[ListingCache] = None) -> Tuple[List, List]:
+    """List dirpath once; return (subdirectory entries, matching file entries) that filters keeps.
+
+    filters' path rules are relative to filter_root (default: dirpath). With
+    a ListingCache, an unchanged dirpath isn't listed again. Raises OSError
+    if dirpath can't be listed.
+    """
+    start = _root_length(dirpath if filter_root is None else filter_root)
+    if listings is not None:
+        subdirs, videos = listings.scan(dirpath, matches, follow_symlinks, filters, start)
+    else:
+        subdirs, videos = _scan(dirpath, matches, follow_symlinks, filters, start)
+    return _stat_filter(filters, subdirs, videos)
+
+
+def list_videos(folder_path: str, matches: Callable[[str], bool],
+                filters: Optional[ScanFilter] = None, filter_root: str = None,
+                listings: Optional[ListingCache] = None) -> List[os.DirEntry]:
+    """Return DirEntry objects for the matching files directly in folder_path (see list_folder)."""
+    return list_folder(folder_path, matches, False, filters, filter_root, listings)[1]
+
+
+def iter_video_folders(root_folder: str,
+                       matches: Callable[[str], bool],
+                       follow_symlinks: bool = False,
+                       onerror: Callable[[OSError], None] = None,
+                       stack: List[str] = None,
+                       listings: Optional[ListingCache] = None,
+                       filters: Optional[ScanFilter] = None,
+                       filter_root: str = None) -> Iterator[Tuple[str, List[os.DirEntry]]]:
+    """Yield (dirpath, video_entries) for every folder under root_folder with videos.
+
+    Folders are visited in the same top-down order as os.walk, but each one is
+    listed exactly once and the DirEntry type/stat information is reused. With
+    follow_symlinks, directory symlinks are descended into and each physical
+    directory (st_dev, st_ino) is visited at most once, so loops terminate.
+
+    stack, if given, is the list of directories still to visit (the last one
+    next) and is used in place instead of [root_folder]: whenever a folder
+    is yielded it holds exactly the directories left after it, so a copy
+    taken then lets a later traversal resume from that point.
+
+    With a ListingCache, directories unchanged since it listed them are
+    not listed again, and their entries are CachedEntry objects.
+
+    With a ScanFilter, excluded folders are dropped as their parent is
+    listed, so nothing below them is ever read, and only the files it keeps
+    are yielded. Its path rules and max_depth are relative to filter_root
+    (default: root_folder), for traversals that cover part of a larger scan.
+    """
+    visited = set()
+    if filter_root is None:
+        filter_root = root_folder
+    if stack is None:
+        stack = [root_folder]
+
+    while stack:
+        dirpath = stack.pop()
+
+        if follow_symlinks:
+            try:
+                st = os.stat(dirpath)
+            except OSError as e:
+                if onerror is not None:
+                    onerror(e)
+                continue
+            key = (st.st_dev, st.st_ino)
+            if key in visited:
+                continue
+            visited.add(key)
+
+        try:
+            subdirs, videos = list_folder(dirpath, matches, follow_symlinks, filters, filter_root, listings)
+        except OSError as e:
+            if onerror is not None:
+                onerror(e)
+            continue
+
+        stack.extend(entry.path for entry in reversed(subdirs))
+
+        if videos:
+            yield dirpath, videos
@@ -0,0 +1,138 @@
+import os
+import sys
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+
+class FolderTree:
+    """Compact index of a scanned folder tree with recursive subtree totals.
+
+    Folders are numbered in the order they are first seen; index 0 is the
+    root. Parent indices, own durations and video counts live in arrays,
+    and folder names are interned, so a folder costs a few dozen bytes
+    instead of a full path string. Folders without videos of their own are
+    added as the ancestors of folders that have some, so every course folder
+    has a recursive total even if its videos are all in subfolders.
+
+    Subtree totals are computed bottom-up in one pass the first time they
+    are needed after a change; after that total_seconds() is O(1).
+    """
+
+    ROOT = 0
+
+    def __init__(self, root_folder: str):
+        self.root_folder = root_folder
+        self._prefix = root_folder if root_folder.endswith(os.sep) else root_folder + os.sep
+        self._names: List[str] = [os.path.basename(root_folder) or root_folder]
+        self._children: Dict[Tuple[int, str], int] = {}
+        self.parents = array('i', [-1])
+        self.own_seconds = array('d', [0.0])
+        self.own_videos = array('i', [0])
+        self._total_seconds: Optional[array] = None
+        self._total_videos: Optional[array] = None
+
+    def __len__(self) -> int:
+        return len(self.parents)
+
+    def _components(self, path: str) -> List[str]:
+        if path == self.root_folder:
+            return []
+        if not path.startswith(self._prefix):
+            raise ValueError(f"{path} is not under {self.root_folder}")
+        return path[len(self._prefix):].split(os.sep)
+
+    def add_folder(self, path: str, duration: float, video_count: int) -> int:
+        """Add the own totals of the folder at path (as reported by a scan); returns its index."""
+        index = self.ROOT
+        for name in self._components(path):
+            child = self._children.get((index, name))
+            if child is None:
+                child = len(self.parents)
+                self._children[(index, sys.intern(name))] = child
+                self._names.append(sys.intern(name))
+                self.parents.append(index)
+                self.own_seconds.append(0.0)
+                self.own_videos.append(0)
+            index = child
+        self.own_seconds[index] += duration
+        self.own_videos[index] += video_count
+        self._total_seconds = self._total_videos = None
+        return index
+
+    def index_of(self, path: str) -> Optional[int]:
+        """Return the index of the folder at path, or None if it isn't in the tree."""
+        index = self.ROOT
+        try:
+            components = self._components(path)
+        except ValueError:
+            return None
+        for name in components:
+            index = self._children.get((index, name))
+            if index is None:
+                return None
+        return index
+
+    def name(self, index: int) -> str:
+        return self._names[index]
+
+    def path(self, index: int) -> str:
+        names = []
+        while index != self.ROOT:
+            names.append(self._names[index])
+            index = self.parents[index]
+        return os.path.join(self.root_folder, *reversed(names)) if names else self.root_folder
+
+    def _compute_totals(self):
+        # Children always have higher indices than their parents, so one
+        # backwards pass folds every subtree into its parent.
+        seconds = array('d', self.own_seconds)
+        videos = array('i', self.own_videos)
+        parents = self.parents
+        for index in range(len(parents) - 1, 0, -1):
+            parent = parents[index]
+            seconds[parent] += seconds[index]
+            videos[parent] += videos[index]
+        self._total_seconds, self._total_videos = seconds, videos
+
+    def total_seconds(self, index: int = ROOT) -> float:
+        """Return the duration of all videos in the folder and its subfolders."""
+        if self._total_seconds is None:
+            self._compute_totals()
+        return self._total_seconds[index]
+
+    def total_videos(self, index: int = ROOT) -> int:
+        if self._total_videos is None:
+            self._compute_totals()
+        return self._total_videos[index]
+
+    def total_under(self, path: str) -> float:
+        """Return the recursive duration under path, or 0.0 if it has no videos."""
+        index = self.index_of(path)
+        return 0.0 if index is None else self.total_seconds(index)
+
+    def summaries(self, recursive: bool = False) -> List[Dict]:
+        """Return folder_summaries dicts (path, name, minutes) in scan order.
+
+        With recursive=False only folders with videos of their own are listed,
+        with their own totals, exactly like traverse_and_calculate. With
+        recursive=True every folder with videos anywhere below it is listed
+        with its subtree total.
+        """
+        if recursive:
+            seconds, videos = self._total_seconds, self._total_videos
+            if seconds is None:
+                self._compute_totals()
+                seconds, videos = self._total_seconds, self._total_videos
+        else:
+            seconds, videos = self.own_seconds, self.own_videos
+
+        # Paths are built top-down, reusing each parent's path.
+        paths = [self.root_folder]
+        summaries = []
+        for index in range(len(self.parents)):
+            if index:
+                paths.append(os.path.join(paths[self.parents[index]], self._names[index]))
+            if videos[index]:
+                summaries.append({'path': paths[index], 'name': self._names[index],
+                                  'minutes': seconds[index] / 60})
+        return summaries
@@ -1,14 +1,186 @@
+import asyncio
+import collections
 import os
 import tkinter as tk
 from tkinter import ttk, filedialog
 from tkinter import scrolledtext
+import sqlite3
 import threading
 
+from calculator import aio
+from calculator import cache
+from calculator import checkpoint
 from calculator import core
+from calculator import duplicates
+from calculator import filters
+from calculator import journal
 from calculator import renamer
+from calculator import table
+from calculator import tree
+
+
+class ResultsTable:
+    """Folder results in a ttk.Treeview that only ever holds the rows on screen.
+
+    Rows come from a table.FolderTable; the Treeview has one item per visible
+    line, and scrolling, sorting and filtering rewrite those items in place,
+    so a redraw costs the same for 100 folders as for 200,000.
+    """
+
+    ROW_HEIGHT = 22
+    HEADING_HEIGHT = 26
+    WHEEL_ROWS = 3
+    HEADINGS = (('name', "Folder", 260, tk.W),
+                ('videos', "Videos", 70, tk.E),
+                ('duration', "Minutes", 90, tk.E),
+                ('path', "Path", 420, tk.W))
+
+    def __init__(self, parent, theme):
+        self.model = None
+        self.top = 0
+        self.visible_rows = 1
+        self.selected = None
+        self.sort_column = None
+        self.descending = False
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add('write', lambda *_: self.apply_filter())
+
+        self.frame = tk.Frame(parent, bg=theme['header_bg'])
+        self.style = ttk.Style(parent)
+        self.view = ttk.Treeview(self.frame, columns=[column for column, *_ in self.HEADINGS],
+                                 show='headings', selectmode='browse', style='Results.Treeview')
+        for column, text, width, anchor in self.HEADINGS:
+            self.view.heading(column, text=text, command=lambda c=column: self.sort_by(c))
+            self.view.column(column, width=width, anchor=anchor, stretch=column == 'path')
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.on_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.view.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.view.bind('<Configure>', self.on_resize)
+        self.view.bind('<<TreeviewSelect>>', self.on_select)
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.view.bind(sequence, self.on_wheel)
+        self.apply_theme(theme)
+
+    def apply_theme(self, theme):
+        self.frame.config(bg=theme['header_bg'])
+        self.style.configure('Results.Treeview', background=theme['input_bg'], fieldbackground=theme['input_bg'],
+                             foreground=theme['text'], rowheight=self.ROW_HEIGHT)
+        self.style.configure('Results.Treeview.Heading', font=("Helvetica", 10, "bold"))
+        self.style.map('Results.Treeview', background=[('selected', theme['secondary'])],
+                       foreground=[('selected', 'white')])
+
+    def set_model(self, model):
+        """Show model (a table.FolderTable) with the current sort and filter."""
+        self.model = model
+        self.top = 0
+        self.selected = None
+        model.sort(self.sort_column, self.descending)
+        model.set_filter(self.filter_var.get())
+        self.refresh()
+
+    def sort_by(self, column):
+        """Sort by column; clicking the sorted column again flips the direction"""
+        if column == self.sort_column:
+            self.descending = not self.descending
+        else:
+            # Numbers read best largest first, names A to Z.
+            self.sort_column, self.descending = column, column in ('videos', 'duration')
+        for name, text, _, _ in self.HEADINGS:
+            arrow = (" ▼" if self.descending else " ▲") if name == column else ""
+            self.view.heading(name, text=text + arrow)
+        if self.model is not None:
+            self.model.sort(self.sort_column, self.descending)
+            self.top = 0
+            self.refresh()
+
+    def apply_filter(self):
+        if self.model is not None:
+            self.model.set_filter(self.filter_var.get())
+            self.top = 0
+            self.refresh()
+
+    def on_resize(self, event):
+        rows = max(1, (event.height - self.HEADING_HEIGHT) // self.ROW_HEIGHT)
+        if rows != self.visible_rows:
+            self.visible_rows = rows
+            self.refresh()
+
+    def on_scroll(self, action, amount, unit=None):
+        total = len(self.model) if self.model is not None else 0
+        if action == 'moveto':
+            self.top = int(float(amount) * total)
+        elif action == 'scroll':
+            self.top += int(amount) * (self.visible_rows if unit == 'pages' else 1)
+        self.refresh()
+
+    def on_wheel(self, event):
+        up = event.num == 4 or getattr(event, 'delta', 0) > 0
+        self.top += -self.WHEEL_ROWS if up else self.WHEEL_ROWS
+        self.refresh()
+        return "break"
+
+    def on_select(self, event=None):
+        selection = self.view.selection()
+        if selection and self.model is not None:
+            position = self.top + int(selection[0])
+            if position < len(self.model):
+                self.selected = self.model[position]
+
+    def refresh(self):
+        """Rewrite the on-screen items from the model"""
+        model = self.model
+        total = len(model) if model is not None else 0
+        self.top = max(0, min(self.top, total - self.visible_rows))
+        count = min(self.visible_rows, total - self.top)
+
+        items = self.view.get_children()
+        if len(items) > count:
+            self.view.delete(*items[count:])
+        for slot in range(len(items), count):
+            self.view.insert('', tk.END, iid=str(slot))
+
+        selected_slot = None
+        folder_tree = model.tree if model is not None else None
+        for slot in range(count):
+            index = model[self.top + slot]
+            self.view.item(str(slot), values=(folder_tree.name(index), folder_tree.own_videos[index],
+                                              f"{folder_tree.own_seconds[index] / 60:.1f}",
+                                              os.path.relpath(folder_tree.path(index), folder_tree.root_folder)))
+            if index == self.selected:
+                selected_slot = str(slot)
+        if selected_slot is not None:
+            self.view.selection_set(selected_slot)
+        elif self.view.selection():
+            self.view.selection_remove(*self.view.selection())
+
+        if total:
+            self.scrollbar.set(self.top / total, (self.top + count) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+
+class QueuedTree:
+    """Stands in for the scan's tree.FolderTree on the worker thread.
+
+    core.ScanReport calls add_folder() here; the totals are queued for the
+    Tk thread, the only one that touches the real tree.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def add_folder(self, path, duration, video_count):
+        self.queue.append((path, duration, video_count))
 
 
 class VideoDurationCalculatorGUI:
+    # Log lines queued by the worker are written to the results widget in one
+    # batch per frame; older lines are dropped once the widget exceeds the cap.
+    LOG_FLUSH_MS = 50
+    LOG_BATCH_LIMIT = 20000
+    MAX_RESULT_LINES = 200000
+
     def __init__(self, root):
         self.root = root
         self.root.title("Video Duration Calculator")
@@ -22,8 +194,32 @@ class VideoDurationCalculatorGUI:
         self.cancel_processing = False
         self.selected_folder = tk.StringVar()
         self.extensions_var = tk.StringVar(value=', '.join(self.video_extensions))
+        self.scan_filter = None
+        self.exclude_var = tk.StringVar()
+        self.exclude_common = tk.BooleanVar(value=False)
+        self.include_var = tk.StringVar()
+        self.min_size_var = tk.StringVar()
+        self.max_size_var = tk.StringVar()
+        self.max_depth_var = tk.StringVar()
+        self.skip_hidden = tk.BooleanVar(value=False)
         self.folder_summaries = []  
         self.rename_history = []  
+        self.rename_journal = None
+        self.folder_tree = None
+        self.folder_table = None
+        self.recursive_totals = tk.BooleanVar(value=False)
+        self.exclude_duplicates = tk.BooleanVar(value=False)
+        self.duplicate_index = None
+        self.scan_checkpoint = None
+        self.duration_cache = self.open_duration_cache()
+        self.log_queue = collections.deque()
+        # (path, seconds, videos) totals queued by the worker (see QueuedTree); only
+        # the Tk thread adds them to folder_tree and the results table.
+        self.row_queue = collections.deque()
+        self.shown_rows = set()
+        self.scan_report = None
+        self.shown_folder_count = 0
+        self.themed_widgets = None
 
         self.is_dark_mode = False
         self.themes = {
@@ -50,6 +246,7 @@ class VideoDurationCalculatorGUI:
         }
 
         self.setup_ui()
+        self.root.after(self.LOG_FLUSH_MS, self.flush_log_queue)
 
     def setup_ui(self):
         theme = self.themes['dark' if self.is_dark_mode else 'light']
@@ -115,6 +312,40 @@ class VideoDurationCalculatorGUI:
         tk.Label(extensions_frame,
                 text="Separate extensions with commas (e.g., .mp4, .avi, .mkv)",
                 font=("Helvetica", 9, "italic"),
+                bg=theme['header_bg'], fg=theme['muted']).pack(anchor=tk.W, padx=10, pady=(0, 5))
+
+        for label, variable in (("Exclude:", self.exclude_var), ("Only include:", self.include_var)):
+            pattern_frame = tk.Frame(extensions_frame, bg=theme['header_bg'])
+            pattern_frame.pack(fill=tk.X, padx=10, pady=(0, 5))
+            tk.Label(pattern_frame, text=label, width=12, anchor=tk.W,
+                    font=("Helvetica", 10), bg=theme['header_bg'], fg=theme['text']).pack(side=tk.LEFT)
+            tk.Entry(pattern_frame, textvariable=variable,
+                     font=("Helvetica", 10),
+                     bg=theme['input_bg'], fg=theme['text'],
+                     insertbackground=theme['text']).pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+        limits_frame = tk.Frame(extensions_frame, bg=theme['header_bg'])
+        limits_frame.pack(fill=tk.X, padx=10, pady=(0, 5))
+        for label, variable, width in (("Min size:", self.min_size_var, 8), ("Max size:", self.max_size_var, 8),
+                                       ("Max depth:", self.max_depth_var, 4)):
+            tk.Label(limits_frame, text=label,
+                    font=("Helvetica", 10), bg=theme['header_bg'], fg=theme['text']).pack(side=tk.LEFT, padx=(0, 5))
+            tk.Entry(limits_frame, textvariable=variable, width=width,
+                     font=("Helvetica", 10),
+                     bg=theme['input_bg'], fg=theme['text'],
+                     insertbackground=theme['text']).pack(side=tk.LEFT, padx=(0, 15))
+        for text, variable in (("Skip hidden", self.skip_hidden),
+                               ("Skip VCS/trash/snapshot folders", self.exclude_common)):
+            tk.Checkbutton(limits_frame, text=text, variable=variable,
+                           font=("Helvetica", 10),
+                           bg=theme['header_bg'], fg=theme['text'],
+                           selectcolor=theme['input_bg'],
+                           activebackground=theme['header_bg']).pack(side=tk.LEFT, padx=(0, 10))
+
+        tk.Label(extensions_frame,
+                text="Patterns are comma-separated globs relative to the folder (a trailing / matches folders, "
+                     "re: for a regex); sizes like 10M or 2G; applied when processing starts",
+                font=("Helvetica", 9, "italic"),
                 bg=theme['header_bg'], fg=theme['muted']).pack(anchor=tk.W, padx=10, pady=(0, 10))
 
         button_frame = tk.Frame(self.root, bg=theme['bg'])
@@ -165,6 +396,22 @@ class VideoDurationCalculatorGUI:
                                            relief=tk.FLAT, state=tk.DISABLED)
         self.cancel_rename_btn.pack(side=tk.LEFT, padx=5)
 
+        self.recursive_check = tk.Checkbutton(button_frame, text="Include subfolders",
+                                              variable=self.recursive_totals,
+                                              font=("Helvetica", 10),
+                                              bg=theme['bg'], fg=theme['text'],
+                                              selectcolor=theme['input_bg'],
+                                              activebackground=theme['bg'])
+        self.recursive_check.pack(side=tk.LEFT, padx=5)
+
+        self.duplicates_check = tk.Checkbutton(button_frame, text="Skip duplicates",
+                                               variable=self.exclude_duplicates,
+                                               font=("Helvetica", 10),
+                                               bg=theme['bg'], fg=theme['text'],
+                                               selectcolor=theme['input_bg'],
+                                               activebackground=theme['bg'])
+        self.duplicates_check.pack(side=tk.LEFT, padx=5)
+
         self.progress = ttk.Progressbar(self.root, mode='indeterminate', length=860)
         self.progress.pack(padx=20, pady=10)
 
@@ -176,17 +423,36 @@ class VideoDurationCalculatorGUI:
         results_frame = tk.Frame(self.root, bg=theme['header_bg'])
         results_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
 
-        tk.Label(results_frame, text="Results:",
+        results_header = tk.Frame(results_frame, bg=theme['header_bg'])
+        results_header.pack(fill=tk.X, padx=10, pady=(10, 5))
+
+        tk.Label(results_header, text="Results:",
                 font=("Helvetica", 12, "bold"),
-                bg=theme['header_bg'], fg=theme['text']).pack(anchor=tk.W, padx=10, pady=(10, 5))
+                bg=theme['header_bg'], fg=theme['text']).pack(side=tk.LEFT)
+
+        results_panes = tk.PanedWindow(results_frame, orient=tk.VERTICAL, bg=theme['header_bg'],
+                                       sashwidth=6, relief=tk.FLAT)
+        results_panes.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+
+        self.results_table = ResultsTable(results_panes, theme)
+        results_panes.add(self.results_table.frame, minsize=120, height=260)
 
-        self.results_text = scrolledtext.ScrolledText(results_frame,
+        self.filter_entry = tk.Entry(results_header, textvariable=self.results_table.filter_var,
+                                     font=("Helvetica", 10), width=30,
+                                     bg=theme['input_bg'], fg=theme['text'],
+                                     insertbackground=theme['text'])
+        self.filter_entry.pack(side=tk.RIGHT)
+        tk.Label(results_header, text="Filter folders:",
+                font=("Helvetica", 10),
+                bg=theme['header_bg'], fg=theme['text']).pack(side=tk.RIGHT, padx=(0, 5))
+
+        self.results_text = scrolledtext.ScrolledText(results_panes,
                                                       font=("Courier", 10),
                                                       bg=theme['input_bg'], fg=theme['text'],
                                                       insertbackground=theme['text'],
                                                       relief=tk.FLAT,
                                                       wrap=tk.WORD)
-        self.results_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        results_panes.add(self.results_text.frame, minsize=80)
 
         self.update_text_tags()
 
@@ -212,13 +478,25 @@ class VideoDurationCalculatorGUI:
         self.theme_btn.config(text="☀" if self.is_dark_mode else "🌙",
                              bg=theme['secondary'])
 
-        for widget in self.root.winfo_children():
+        # The widget tree doesn't change after setup_ui, so it is walked once;
+        # parents come before their children, whose labels copy their bg.
+        if self.themed_widgets is None:
+            self.themed_widgets = []
+            pending = list(reversed(self.root.winfo_children()))
+            while pending:
+                widget = pending.pop()
+                self.themed_widgets.append(widget)
+                if widget is not self.results_table.frame:
+                    pending.extend(reversed(widget.winfo_children()))
+
+        for widget in self.themed_widgets:
             self.update_widget_theme(widget, theme)
+        self.results_table.apply_theme(theme)
 
         self.update_text_tags()
 
     def update_widget_theme(self, widget, theme):
-        """Recursively update widget colors"""
+        """Update the colors of one widget"""
         widget_type = widget.winfo_class()
 
         if widget_type == 'Frame':
@@ -249,6 +527,9 @@ class VideoDurationCalculatorGUI:
                 widget.config(bg="#059669", activebackground="#047857")
             elif widget == getattr(self, 'cancel_rename_btn', None):
                 widget.config(bg="#b45309", activebackground="#92400e")
+        elif widget_type == 'Checkbutton':
+            widget.config(bg=widget.master.cget('bg'), fg=theme['text'], selectcolor=theme['input_bg'],
+                          activebackground=widget.master.cget('bg'))
         elif widget_type == 'Entry':
             widget.config(bg=theme['input_bg'], fg=theme['text'],
                          insertbackground=theme['text'])
@@ -257,9 +538,46 @@ class VideoDurationCalculatorGUI:
         elif widget_type == 'Text':
             widget.config(bg=theme['input_bg'], fg=theme['text'],
                          insertbackground=theme['text'])
+        elif widget_type == 'Panedwindow':
+            widget.config(bg=theme['header_bg'])
+
+    def open_duration_cache(self):
+        """Open the persistent duration cache, or run without one if it is unavailable"""
+        try:
+            return cache.DurationCache()
+        except (sqlite3.Error, OSError):
+            return None
 
-        for child in widget.winfo_children():
-            self.update_widget_theme(child, theme)
+    def open_scan_checkpoint(self, folder):
+        """Open the checkpoint for folder, offering to resume an interrupted scan; None if unavailable"""
+        try:
+            path = checkpoint.default_checkpoint_path(folder)
+            try:
+                scan_checkpoint = checkpoint.ScanCheckpoint.open(path, folder, self.video_extensions,
+                                                                 filters=self.scan_filter)
+            except checkpoint.CheckpointInUse:
+                raise
+            except checkpoint.CheckpointError:
+                # Left by a scan with other extensions or filters: start over.
+                return checkpoint.ScanCheckpoint.create(path, folder, self.video_extensions,
+                                                        filters=self.scan_filter)
+            if scan_checkpoint.pending is None:
+                return scan_checkpoint
+
+            from tkinter import messagebox
+            resume = messagebox.askyesno(
+                "Resume Scan",
+                f"An earlier scan of this folder was interrupted after {len(scan_checkpoint.resumed)} folders.\n\n"
+                "Resume it? Choose No to start over."
+            )
+            if resume:
+                return scan_checkpoint
+            return scan_checkpoint.restart(filters=self.scan_filter)
+        except checkpoint.CheckpointInUse:
+            self.log_result("⚠ Another scan of this folder is running; this one won't be resumable\n\n", "total")
+            return None
+        except OSError:
+            return None
 
     def select_folder(self):
         folder = filedialog.askdirectory(title="Select Folder Containing Videos")
@@ -288,18 +606,84 @@ class VideoDurationCalculatorGUI:
                 self.extensions_var.set(', '.join(self.video_extensions))
                 self.status_label.config(text=f"✓ Extensions updated: {len(self.video_extensions)} formats")
                 self.log_result(f"\n✓ Video extensions updated: {', '.join(self.video_extensions)}\n\n", "total")
+                self.update_filters()
             else:
                 self.status_label.config(text="⚠ Please enter at least one extension")
         except Exception as e:
             self.status_label.config(text=f"⚠ Error updating extensions: {str(e)}")
 
+    def read_filters(self):
+        """Compile the include/exclude patterns, size limits and depth as the panel shows them now.
+
+        Returns None if no rules are set; raises ValueError if any is invalid.
+        """
+        max_depth = self.max_depth_var.get().strip()
+        if max_depth and not max_depth.isdigit():
+            raise ValueError("max depth must be a whole number")
+        exclude = filters.split_patterns(self.exclude_var.get())
+        if self.exclude_common.get():
+            exclude += filters.COMMON_EXCLUDES
+        return filters.ScanFilter.from_dict({
+            'include': self.include_var.get(),
+            'exclude': exclude,
+            'min_size': self.min_size_var.get().strip() or None,
+            'max_size': self.max_size_var.get().strip() or None,
+            'skip_hidden': self.skip_hidden.get(),
+            'max_depth': int(max_depth) if max_depth else None,
+        })
+
+    def update_filters(self):
+        """Compile the filter panel and report the rules in the results"""
+        try:
+            self.scan_filter = self.read_filters()
+        except ValueError as e:
+            self.status_label.config(text=f"⚠ Invalid filter: {e}")
+            return
+        if self.scan_filter is not None:
+            self.log_result(f"✓ Filters updated: {self.describe_filter()}\n\n", "total")
+        else:
+            self.log_result("✓ Filters cleared: every folder and file is scanned\n\n", "total")
+
+    def describe_filter(self):
+        rules = []
+        if self.scan_filter.exclude:
+            rules.append(f"{len(self.scan_filter.exclude)} exclude patterns")
+        if self.scan_filter.include:
+            rules.append(f"only {', '.join(self.scan_filter.include)}")
+        if self.scan_filter.min_size is not None:
+            rules.append(f"at least {self.scan_filter.min_size / 1024 ** 2:.1f} MB")
+        if self.scan_filter.max_size is not None:
+            rules.append(f"at most {self.scan_filter.max_size / 1024 ** 2:.1f} MB")
+        if self.scan_filter.max_depth is not None:
+            rules.append(f"{self.scan_filter.max_depth} levels deep")
+        if self.scan_filter.skip_hidden:
+            rules.append("hidden items skipped")
+        return ', '.join(rules)
+
     def start_processing(self):
         if not self.selected_folder.get():
             return
+        # Use the panel as it is now, whether or not Update was pressed after editing it.
+        try:
+            self.scan_filter = self.read_filters()
+        except ValueError as e:
+            self.status_label.config(text=f"⚠ Invalid filter: {e}")
+            return
 
         self.is_processing = True
         self.cancel_processing = False
-        self.folder_summaries.clear()
+        self.folder_tree = tree.FolderTree(self.selected_folder.get())
+        self.folder_table = table.FolderTable(self.folder_tree)
+        self.row_queue.clear()
+        self.shown_rows = set()
+        self.scan_report = core.ScanReport(QueuedTree(self.row_queue))
+        self.folder_summaries = self.scan_report.folder_summaries
+        self.results_table.set_model(self.folder_table)
+        # Hardlinked videos are always probed once; "Skip duplicates" also leaves them out of the totals.
+        self.duplicate_index = duplicates.DuplicateIndex(exclude=self.exclude_duplicates.get())
+        # Folders finished by a resumed scan are reported again, but not their files.
+        self.scan_checkpoint = self.open_scan_checkpoint(self.selected_folder.get())
+        self.shown_folder_count = 0
         self.select_btn.config(state=tk.DISABLED)
         self.process_btn.config(state=tk.DISABLED)
         self.cancel_btn.config(state=tk.NORMAL)
@@ -317,20 +701,33 @@ class VideoDurationCalculatorGUI:
 
     def process_videos(self):
         try:
-            folder_summaries, grand_total, total_videos = core.traverse_and_calculate(
-                self.selected_folder.get(),
-                self.video_extensions,
-                cancel_check=lambda: self.cancel_processing,
-                logger=self.log_result
-            )
-            self.folder_summaries = folder_summaries
+            asyncio.run(self.scan_folder())
+        except core.FFprobeNotFoundError:
+            core.log_ffprobe_missing(self.log_result)
         except Exception as e:
             if not self.cancel_processing:
                 self.log_result(f"\n❌ Error: {str(e)}\n", "header")
         finally:
+            if self.scan_checkpoint is not None:
+                self.scan_checkpoint.close()
             self.root.after(0, self.processing_complete)
 
+    async def scan_folder(self):
+        """Run the async scan engine so Cancel kills in-flight ffprobe processes at once"""
+        core.log_scan_header(self.log_result)
+        async for event in aio.aiter_scan(self.selected_folder.get(),
+                                          self.video_extensions,
+                                          cancel_check=lambda: self.cancel_processing,
+                                          cache=self.duration_cache,
+                                          duplicates=self.duplicate_index,
+                                          checkpoint=self.scan_checkpoint,
+                                          filters=self.scan_filter):
+            core.log_event(event, self.log_result)
+            self.scan_report.add(event)
+        self.scan_report.log_final_report(self.log_result, duplicates=self.duplicate_index)
+
     def processing_complete(self):
+        self.apply_queued_rows()
         self.is_processing = False
         self.cancel_processing = False
         self.progress.stop()
@@ -346,22 +743,70 @@ class VideoDurationCalculatorGUI:
                 self.rename_btn.config(state=tk.NORMAL)
 
     def log_result(self, text, tag=None):
-        def update():
-            self.results_text.insert(tk.END, text, tag)
-            self.results_text.see(tk.END)
-            self.results_text.update_idletasks()
+        """Queue a line for the results widget; safe to call from any thread"""
+        self.log_queue.append((text, tag))
 
-        self.root.after(0, update)
+    def flush_log_queue(self):
+        """Write queued log lines with a single insert, then reschedule"""
+        try:
+            batch = []
+            for _ in range(min(len(self.log_queue), self.LOG_BATCH_LIMIT)):
+                text, tag = self.log_queue.popleft()
+                tag = tag or ()
+                if batch and batch[-1] == tag:
+                    batch[-2] += text
+                else:
+                    batch.extend((text, tag))
+
+            if batch:
+                self.results_text.insert(tk.END, *batch)
+                if self.MAX_RESULT_LINES:
+                    line_count = int(self.results_text.index('end-1c').split('.')[0])
+                    if line_count > self.MAX_RESULT_LINES:
+                        self.results_text.delete('1.0', f'{line_count - self.MAX_RESULT_LINES + 1}.0')
+                self.results_text.see(tk.END)
+
+            self.apply_queued_rows()
+
+            folder_count = len(self.folder_summaries)
+            if self.is_processing and not self.cancel_processing and folder_count != self.shown_folder_count:
+                self.shown_folder_count = folder_count
+                self.status_label.config(text=f"Processing videos... {folder_count} folders done")
+        finally:
+            self.root.after(self.LOG_FLUSH_MS, self.flush_log_queue)
+
+    def apply_queued_rows(self):
+        """Add the totals queued by the worker to the folder tree and the results table (Tk thread only)"""
+        if not self.row_queue or self.folder_table is None:
+            return
+        retried = False
+        for _ in range(len(self.row_queue)):
+            index = self.folder_tree.add_folder(*self.row_queue.popleft())
+            if index in self.shown_rows:
+                # A file that timed out counts towards a row that is already shown.
+                retried = True
+            else:
+                self.shown_rows.add(index)
+                self.folder_table.add(index)
+        if retried:
+            self.folder_table.update()
+        self.results_table.refresh()
 
     def rename_folders_with_duration(self):
         if not self.folder_summaries:
             self.status_label.config(text="No folders to rename")
             return
 
+        # With "Include subfolders", every folder gets the total of its whole subtree.
+        if self.recursive_totals.get() and self.folder_tree is not None:
+            folder_summaries = self.folder_tree.summaries(recursive=True)
+        else:
+            folder_summaries = self.folder_summaries
+
         from tkinter import messagebox
         confirm = messagebox.askyesno(
             "Confirm Rename",
-            f"This will rename {len(self.folder_summaries)} folders by adding duration.\n\n"
+            f"This will rename {len(folder_summaries)} folders by adding duration.\n\n"
             "Example:\n"
             "  '01. Introduction' → '01. Introduction (33 min)'\n\n"
             "Continue?"
@@ -370,8 +815,18 @@ class VideoDurationCalculatorGUI:
         if not confirm:
             return
 
-        rename_history, summary = renamer.rename_folders_with_duration(self.folder_summaries, logger=self.log_result)
+        try:
+            journal_path = journal.new_journal_path()
+        except OSError as e:
+            self.log_result(f"⚠ Rename journal unavailable ({e}); renames can only be reverted from this window\n")
+            journal_path = None
+
+        rename_history, summary = renamer.rename_folders_with_duration(folder_summaries, logger=self.log_result,
+                                                                       journal_path=journal_path)
         self.rename_history = rename_history
+        self.rename_journal = summary.get('journal')
+        if self.rename_journal:
+            self.log_result(f"Journal: {self.rename_journal}\n", None)
 
         self.status_label.config(text=f"Renamed {summary.get('renamed', 0)} folders")
 
@@ -392,11 +847,15 @@ class VideoDurationCalculatorGUI:
         if not confirm:
             return
 
-        result = renamer.revert_renames(self.rename_history, logger=self.log_result)
+        if self.rename_journal:
+            result = renamer.revert_journal(self.rename_journal, logger=self.log_result)
+        else:
+            result = renamer.revert_renames(self.rename_history, logger=self.log_result)
         self.status_label.config(text=f"Reverted {result.get('reverted', 0)} renames")
 
         if result.get('reverted', 0) > 0:
             self.rename_btn.config(state=tk.NORMAL)
         self.cancel_rename_btn.config(state=tk.DISABLED)
         self.rename_history = []
+        self.rename_journal = None
 
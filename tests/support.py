@@ -0,0 +1,43 @@
+"""Synthetic trees and the stub ffprobe from benchmarks/synth.py, set up once per test class."""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+sys.path.insert(0, os.path.join(REPO, 'benchmarks'))
+
+import synth  # noqa: E402
+
+EXTENSIONS = list(synth.KINDS)
+
+
+def final_report(lines):
+    """Return the FINAL REPORT block from logged text, or None if there is none."""
+    text = ''.join(lines)
+    start = text.find('FINAL REPORT')
+    return None if start < 0 else text[start:]
+
+
+class SynthTreeTestCase(unittest.TestCase):
+    """Creates a synthetic tree in self.root and puts a stub ffprobe first on PATH."""
+
+    DEPTH = 2
+    FANOUT = 3
+    FILES = 4
+    LATENCY = 0.01
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp(prefix='vdc-test-')
+        cls.root = os.path.join(cls.tmp, 'tree')
+        cls.counts = synth.make_tree(cls.root, cls.DEPTH, cls.FANOUT, cls.FILES)
+        cls._path = os.environ.get('PATH', '')
+        synth.install_stub_ffprobe(os.path.join(cls.tmp, 'bin'), cls.LATENCY)
+
+    @classmethod
+    def tearDownClass(cls):
+        os.environ['PATH'] = cls._path
+        shutil.rmtree(cls.tmp, ignore_errors=True)
@@ -0,0 +1,75 @@
+import asyncio
+import contextlib
+import io
+import os
+import unittest
+
+from tests.support import EXTENSIONS, SynthTreeTestCase, final_report
+
+from calculator import aio, checkpoint, cli, core
+
+
+def _sync_scan(root, logger, cancel_check, scan_checkpoint):
+    return core.traverse_and_calculate(root, EXTENSIONS, cancel_check=cancel_check, logger=logger,
+                                       checkpoint=scan_checkpoint)
+
+
+def _async_scan(root, logger, cancel_check, scan_checkpoint):
+    return asyncio.run(aio.traverse_and_calculate_async(root, EXTENSIONS, cancel_check=cancel_check, logger=logger,
+                                                        checkpoint=scan_checkpoint))
+
+
+class ResumeTest(SynthTreeTestCase):
+    """A scan cancelled part-way and resumed from its checkpoint reports what an uninterrupted one does."""
+
+    def checkpoint_path(self, name):
+        return os.path.join(self.tmp, name + '.jsonl')
+
+    def test_cancel_then_resume_gives_the_same_final_report(self):
+        for name, scan in (('sync', _sync_scan), ('async', _async_scan)):
+            with self.subTest(engine=name):
+                expected = []
+                scan(self.root, lambda text, tag=None: expected.append(text), lambda: False, None)
+                self.assertIsNotNone(final_report(expected))
+
+                path = self.checkpoint_path(name)
+                folders = []
+
+                def count_folders(text, tag=None):
+                    if text.startswith('\n📁'):
+                        folders.append(text)
+
+                with checkpoint.ScanCheckpoint.open(path, self.root, EXTENSIONS, resume=False) as first:
+                    scan(self.root, count_folders, lambda: len(folders) >= 4, first)
+
+                resumed_lines = []
+                with checkpoint.ScanCheckpoint.open(path, self.root, EXTENSIONS, resume=True) as resumed:
+                    self.assertTrue(0 < len(resumed.resumed) < self.counts['folders'])
+                    self.assertIsNotNone(resumed.pending)
+                    scan(self.root, lambda text, tag=None: resumed_lines.append(text), lambda: False, resumed)
+                self.assertEqual(final_report(resumed_lines), final_report(expected))
+
+                with checkpoint.ScanCheckpoint.open(path, self.root, EXTENSIONS, resume=True) as done:
+                    self.assertEqual(done.resumed, [])  # finished: the next scan starts over
+
+    def test_scan_runs_unchecked_when_the_checkpoint_is_in_use(self):
+        path = self.checkpoint_path('locked')
+        with checkpoint.ScanCheckpoint.open(path, self.root, EXTENSIONS, resume=False):
+            with self.assertRaises(checkpoint.CheckpointInUse):
+                checkpoint.ScanCheckpoint.open(path, self.root, EXTENSIONS)
+
+            stderr = io.StringIO()
+            output = os.path.join(self.tmp, 'locked.json')
+            with contextlib.redirect_stderr(stderr):
+                code = cli.main(['scan', self.root, '--resume', '--checkpoint', path, '--no-cache',
+                                 '-e', ','.join(EXTENSIONS), '-o', output])
+        self.assertEqual(code, cli.EXIT_OK)
+        self.assertIn('continuing without a checkpoint', stderr.getvalue())
+
+    def test_scans_are_not_checkpointed_unless_asked(self):
+        args = cli.build_parser().parse_args(['scan', self.root])
+        self.assertIsNone(cli._open_checkpoint(args, EXTENSIONS))
+
+
+if __name__ == '__main__':
+    unittest.main()
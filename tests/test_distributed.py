@@ -0,0 +1,87 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+from tests.support import EXTENSIONS, REPO, SynthTreeTestCase, synth
+
+from calculator import core, distributed
+
+TIMEOUT = 60
+
+
+def _folders_and_totals(events):
+    folders = [(e.path, e.duration, e.video_count) for e in events if isinstance(e, core.FolderFinished)]
+    finished = [e for e in events if isinstance(e, core.ScanFinished)]
+    assert len(finished) == 1, finished
+    totals = (finished[0].folder_count, finished[0].total_duration, finished[0].total_videos,
+              finished[0].unreadable, finished[0].cancelled)
+    return folders, totals
+
+
+@unittest.skipIf(sys.platform == 'win32', 'kills the worker process group')
+class CoordinatorTest(SynthTreeTestCase):
+    """Workers on localhost, one of them killed mid-shard, merge to what a local scan reports."""
+
+    LATENCY = 0.02
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.expected = _folders_and_totals(list(core.iter_scan(cls.root, EXTENSIONS, timeout=TIMEOUT)))
+        # The stub this worker runs never answers within the timeout, so it is always killed mid-shard.
+        path = os.environ['PATH']
+        synth.install_stub_ffprobe(os.path.join(cls.tmp, 'hang'), 3600)
+        cls.hanging_path = os.environ['PATH']
+        os.environ['PATH'] = path
+
+    def start_worker(self, address, path):
+        env = dict(os.environ, PATH=path, PYTHONPATH=REPO + os.pathsep + os.environ.get('PYTHONPATH', ''))
+        worker = subprocess.Popen([sys.executable, '-m', 'calculator', 'worker', address, '--no-cache', '-j', '1',
+                                   '-v'], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                  text=True, start_new_session=True)
+        self.addCleanup(self.stop, worker)
+        return worker
+
+    @staticmethod
+    def stop(worker):
+        if worker.poll() is None:
+            os.killpg(worker.pid, signal.SIGKILL)
+        worker.wait()
+        worker.stderr.close()
+
+    def scan(self, address):
+        with distributed.Coordinator(self.root, EXTENSIONS, address=address, timeout=TIMEOUT) as coordinator:
+            events = []
+            merging = threading.Thread(target=lambda: events.extend(coordinator.iter_scan()), daemon=True)
+            merging.start()
+
+            victim = self.start_worker(coordinator.address, self.hanging_path)
+            self.assertIn('▶ Shard', victim.stderr.readline())
+            time.sleep(0.2)  # let it hand the shard to its ffprobe
+            os.killpg(victim.pid, signal.SIGKILL)
+
+            for _ in range(2):
+                self.start_worker(coordinator.address, os.environ['PATH'])  # the later one may find the scan already done
+            merging.join(TIMEOUT)
+            self.assertFalse(merging.is_alive(), 'the scan did not finish')
+            return coordinator.reassigned, events
+
+    def test_tcp(self):
+        reassigned, events = self.scan('127.0.0.1:0')
+        self.assertGreater(reassigned, 0)
+        self.assertEqual(_folders_and_totals(events), self.expected)
+
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'no unix sockets')
+    def test_unix_socket(self):
+        reassigned, events = self.scan('unix:' + os.path.join(self.tmp, 'coordinator.sock'))
+        self.assertGreater(reassigned, 0)
+        self.assertEqual(_folders_and_totals(events), self.expected)
+
+
+if __name__ == '__main__':
+    unittest.main()